@@ -1,8 +1,43 @@
 """CreateExpediente package
 
 Exposes generate_diagram(output_dir) which creates the PNG and DOCX and returns their paths.
-Also provides generate_png_only() and generate_word_only() for separate generation.
+Also provides generate_png_only() and generate_word_only() for separate generation,
+render_png_image() / render_png_bytes() / render_svg_bytes() / render_word_bytes() for
+in-memory rendering, render_variants() for theme / language / resolution variants,
+import_openapi() to build the flow model from (large) OpenAPI specifications,
+and warm_fonts() / invalidate_font_cache() to manage the process-wide font cache.
+
+The public names are resolved lazily (PEP 562): importing the package loads neither
+Pillow nor python-docx, and python-docx is only imported when a DOCX is generated.
 """
-from .diagrama import generate_diagram, generate_png_only, generate_word_only, main
+import importlib
+
+_EXPORTS = {
+    "generate_diagram": "diagrama",
+    "generate_png_only": "diagrama",
+    "generate_word_only": "diagrama",
+    "main": "diagrama",
+    "render_png_image": "diagrama",
+    "render_png_bytes": "diagrama",
+    "render_svg_bytes": "diagrama",
+    "render_word_bytes": "diagrama",
+    "render_variants": "variantes",
+    "import_openapi": "openapi",
+    "warm_fonts": "fuentes",
+    "invalidate_font_cache": "fuentes",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # las siguientes búsquedas no pasan por aquí
+    return value
+
 
-__all__ = ["generate_diagram", "generate_png_only", "generate_word_only", "main"]
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""Capas precalculadas del render PNG.
+
+Todo lo que no depende de las cajas ni de las flechas (fondo, título con su
+sombra, línea decorativa y panel de leyenda) se dibuja una vez y se guarda como
+imagen lista para copiar. Las cajas redondeadas con su sombra se guardan como
+sprites RGBA con clave (w, h, relleno, borde, radio) y se pegan con su canal
+alfa, en lugar de volver a rasterizar dos rectángulos redondeados por caja.
+
+El texto se rasteriza una vez como máscara (clave: fuente, texto y posición
+subpíxel) y se pinta de cualquier color pegando la máscara: los temas de un mismo
+diagrama y los renders sucesivos comparten las máscaras.
+
+Los colores salen del tema (`temas`) y las medidas se multiplican por `scale`: las
+coordenadas que se reciben son las del layout y la imagen mide `scale` veces más.
+
+Funciones públicas:
+- static_layer(width, height, title, legend, legend_y, fonts, theme, scale, box): capa
+  estática (copia, o sólo el recorte `box`)
+- box_sprite(w, h, fill, outline, radius, shadow, ...): sprite de caja con sombra
+- paste_box(img, x, y, w, h, fill, outline, radius, shadow, scale): pega el sprite en la imagen
+- paste_text(img, x, y, text, font, fill): como `ImageDraw.text`, con la máscara cacheada
+- clear_layer_cache(), layer_cache_info(): gestión de las cachés
+"""
+from collections import OrderedDict
+import math
+import threading
+
+from PIL import Image, ImageDraw
+
+from .layout import LEGEND_ITEM_WIDTH, legend_width
+from .metricas import font_key
+from .temas import LIGHT
+
+BG_COLOR = LIGHT.background
+BORDER_COLOR = LIGHT.border
+SHADOW_COLOR = LIGHT.shadow
+SHADOW_OFFSET = 4
+BOX_RADIUS = 15
+BOX_OUTLINE_WIDTH = 3
+LEGEND_BOX_SIZE = 28
+
+
+class _LRUCache:
+    """Caché LRU mínima y segura entre hilos."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        # Se crea fuera del candado: dos hilos pueden crear el mismo valor, pero
+        # el resultado es idéntico y no se bloquea al resto mientras se dibuja
+        value = factory()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "currsize": len(self._items), "maxsize": self.maxsize}
+
+
+_static_layers = _LRUCache(16)
+_box_sprites = _LRUCache(512)
+_text_masks = _LRUCache(4096)
+
+
+def scaled(value, scale):
+    """Medida del layout en píxeles de la imagen (escala 1: sin cambios)."""
+    return value if scale == 1 else int(round(value * scale))
+
+
+def line_width(width, scale):
+    """Grosor de trazo escalado (al menos 1 píxel)."""
+    return max(1, scaled(width, scale))
+
+
+def _draw_static_layer(width, height, title, legend, legend_y, font_title, font_small,
+                       theme, scale):
+    s = lambda value: scaled(value, scale)
+    img = Image.new("RGB", (s(width), s(height)), theme.background)
+    draw = ImageDraw.Draw(img)
+
+    # Draw title with better styling (centrado sobre el lienzo)
+    title_bbox = draw.textbbox((0, 0), title, font=font_title)
+    title_x = (s(width) - (title_bbox[2] - title_bbox[0])) // 2
+    # Dibujar sombra del título
+    if theme.title_shadow is not None:
+        draw.text((title_x + s(2), s(22)), title, font=font_title, fill=theme.title_shadow)
+    # Dibujar título principal
+    draw.text((title_x, s(20)), title, font=font_title, fill=theme.title)
+
+    # Agregar línea decorativa bajo el título
+    draw.line((s(width) // 2 - s(350), s(70), s(width) // 2 + s(350), s(70)), fill=theme.rule,
+              width=line_width(2, scale))
+
+    # Add legends at bottom with better styling
+    # Fondo para la leyenda
+    draw.rectangle([s(60), s(legend_y - 15), s(legend_width(len(legend))), s(legend_y + 50)],
+                   fill=theme.legend_fill, outline=theme.legend_outline, width=line_width(2, scale))
+    for i, (name, color) in enumerate(legend):
+        legend_x = 80 + LEGEND_ITEM_WIDTH * i
+        draw.rectangle([s(legend_x), s(legend_y), s(legend_x + LEGEND_BOX_SIZE),
+                        s(legend_y + LEGEND_BOX_SIZE)],
+                       fill=color, outline=theme.border, width=line_width(2, scale))
+        draw.text((s(legend_x + 40), s(legend_y + 2)), name, font=font_small,
+                  fill=theme.legend_text)
+    return img
+
+
+def static_layer(width, height, title, legend, legend_y, font_title, font_small,
+                 theme=LIGHT, scale=1, box=None):
+    """Fondo, título, línea decorativa y leyenda, listos para dibujar encima.
+
+    Args:
+        width, height, legend_y: medidas del layout (sin escalar)
+        legend (list): pares (nombre, color RGB) de la leyenda, en orden.
+        font_title, font_small: fuentes ya escaladas
+        theme (temas.Theme): colores
+        scale (float): píxeles de imagen por unidad del layout
+        box (tuple): (x0, y0, x1, y1) en píxeles para obtener sólo ese recorte
+
+    Returns:
+        PIL.Image.Image: copia RGB que el llamador puede modificar libremente
+    """
+    legend = tuple((name, tuple(color)) for name, color in legend)
+    key = (width, height, title, legend, legend_y, font_key(font_title), font_key(font_small),
+           theme, scale)
+    layer = _static_layers.get_or_create(
+        key, lambda: _draw_static_layer(width, height, title, legend, legend_y,
+                                        font_title, font_small, theme, scale))
+    return layer.copy() if box is None else layer.crop(box)
+
+
+def _draw_box_sprite(w, h, fill, outline, radius, shadow, shadow_offset, outline_width):
+    sprite = Image.new("RGBA", (w + shadow_offset + 1, h + shadow_offset + 1), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    # Dibujar sombra
+    if shadow is not None:
+        draw.rounded_rectangle([shadow_offset, shadow_offset, w + shadow_offset, h + shadow_offset],
+                               radius=radius, fill=shadow, outline=None)
+    # outer rect
+    draw.rounded_rectangle([0, 0, w, h], radius=radius, fill=fill, outline=outline,
+                           width=outline_width)
+    return sprite
+
+
+def box_sprite(w, h, fill, outline=BORDER_COLOR, radius=BOX_RADIUS, shadow=SHADOW_COLOR,
+               shadow_offset=SHADOW_OFFSET, outline_width=BOX_OUTLINE_WIDTH):
+    """Sprite RGBA de una caja redondeada con su sombra (compartido, no modificar).
+
+    Con `shadow=None` la caja se dibuja sin sombra.
+    """
+    key = (w, h, tuple(fill), tuple(outline), radius, shadow and tuple(shadow), shadow_offset,
+           outline_width)
+    return _box_sprites.get_or_create(
+        key, lambda: _draw_box_sprite(w, h, fill, outline, radius, shadow, shadow_offset,
+                                      outline_width))
+
+
+def paste_box(img, x, y, w, h, fill, outline=BORDER_COLOR, radius=BOX_RADIUS,
+              shadow=SHADOW_COLOR, scale=1, offset=(0, 0)):
+    """Pega en `img` la caja con sombra cuya esquina superior izquierda es (x, y).
+
+    Las medidas son del layout; el sprite se dibuja `scale` veces más grande. Si
+    `img` es un recorte de la imagen, `offset` es la posición en píxeles de su origen.
+    """
+    sprite = box_sprite(int(round(w * scale)), int(round(h * scale)), fill, outline,
+                        scaled(radius, scale), shadow, scaled(SHADOW_OFFSET, scale),
+                        line_width(BOX_OUTLINE_WIDTH, scale))
+    img.paste(sprite, (int(round(x * scale)) - offset[0], int(round(y * scale)) - offset[1]),
+              sprite)
+
+
+def _draw_text_mask(text, font, start):
+    # Se dibuja con el mismo desplazamiento subpíxel que tendría en la imagen y con
+    # un margen entero para los glifos que empiezan antes del origen
+    x0, y0, x1, y1 = font.getbbox(text)
+    margin = max(2, 2 - x0, 2 - y0)
+    mask = Image.new("L", (x1 + 2 * margin, y1 + 2 * margin), 0)
+    ImageDraw.Draw(mask).text((margin + start[0], margin + start[1]), text, font=font, fill=255)
+    bbox = mask.getbbox()
+    if bbox is None:
+        return None
+    return mask.crop(bbox), (bbox[0] - margin, bbox[1] - margin)
+
+
+def paste_text(img, x, y, text, font, fill):
+    """Dibuja `text` en (x, y) igual que `ImageDraw.Draw(img).text`, pegando una máscara cacheada."""
+    start = (math.modf(x)[0], math.modf(y)[0])
+    key = (font_key(font), text, start)
+    entry = _text_masks.get_or_create(key, lambda: _draw_text_mask(text, font, start) or False)
+    if entry:
+        mask, (dx, dy) = entry
+        img.paste(fill, (int(x) + dx, int(y) + dy), mask)
+
+
+def clear_layer_cache():
+    """Vacía las cachés de capa estática, de sprites y de máscaras de texto."""
+    _static_layers.clear()
+    _box_sprites.clear()
+    _text_masks.clear()
+
+
+def layer_cache_info():
+    """Estadísticas de las cachés: {"static": {...}, "sprites": {...}, "text": {...}}."""
+    return {"static": _static_layers.info(), "sprites": _box_sprites.info(),
+            "text": _text_masks.info()}
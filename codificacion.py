@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""Codificación de la imagen del diagrama con perfiles (presets) con nombre.
+
+El diagrama usa una docena de colores planos más los bordes suavizados de texto y
+cajas, así que un PNG RGB de 24 bits desperdicia espacio. Cada perfil decide:
+
+- si se cuantiza a paleta (los colores planos se conservan exactos y los píxeles
+  suavizados se aproximan al color de la paleta más cercano, sin tramado),
+- el nivel de compresión zlib y su estrategia, y si se optimiza el resultado,
+- el formato de salida (PNG o, si Pillow lo soporta, WebP).
+
+Perfiles incluidos:
+- default: PNG RGB con los valores por defecto de Pillow (el comportamiento anterior)
+- fast: paleta y compresión mínima; el más rápido de codificar
+- small: paleta, compresión máxima y optimización; el más pequeño en PNG
+- print: PNG RGB sin pérdida de suavizado y con 300 ppp en los metadatos
+- webp: WebP sin pérdida
+
+Funciones públicas:
+- get_preset(preset): perfil por nombre (o el propio `Preset`)
+- quantize(img, colors, exact_colors): imagen en modo paleta sin tramado
+- encode(img, preset, exact_colors): bytes codificados
+- IncrementalEncoder(preset): codificaciones sucesivas que sólo recuantizan lo que cambia
+- encode_report(img, presets): tiempo y tamaño de cada perfil
+"""
+from collections import namedtuple
+import io
+import itertools
+import time
+
+from PIL import Image, ImageChops, features
+
+# Estrategias de zlib (`compress_type` del codificador PNG de Pillow)
+Z_DEFAULT_STRATEGY = -1
+Z_FILTERED = 1
+Z_RLE = 3
+
+Preset = namedtuple(
+    "Preset", "name format palette compress_level compress_type optimize lossless quality dpi")
+
+PRESETS = {
+    "default": Preset("default", "PNG", 0, 6, Z_DEFAULT_STRATEGY, False, True, None, None),
+    "fast": Preset("fast", "PNG", 256, 1, Z_RLE, False, True, None, None),
+    "small": Preset("small", "PNG", 256, 9, Z_DEFAULT_STRATEGY, True, True, None, None),
+    "print": Preset("print", "PNG", 0, 6, Z_FILTERED, False, True, None, (300, 300)),
+    "webp": Preset("webp", "WEBP", 0, None, None, False, True, 100, None),
+}
+
+DEFAULT_PRESET = "small"
+
+EXTENSIONS = {"PNG": ".png", "WEBP": ".webp"}
+
+# Paso del muestreo de colores: las zonas planas ocupan mucho más que esto
+_SAMPLE_STEP = 4
+
+# Fracción mínima de la muestra para considerar un color "plano" (siempre entra)
+_FLAT_FRACTION = 0.001
+
+# Pillow asigna el color de paleta por celdas de 4x4x4 niveles: dos colores de la
+# paleta más cercanos que esto podrían robarse píxeles, así que los colores
+# suavizados demasiado próximos a otro ya elegido se descartan
+_MIN_DISTANCE = 16
+_NEIGHBOUR_CELLS = list(itertools.product((-1, 0, 1), repeat=3))
+
+
+def get_preset(preset=None):
+    """Devuelve el perfil `preset` (nombre o `Preset`); None es `DEFAULT_PRESET`.
+
+    Raises:
+        ValueError: si el perfil no existe o su formato no está disponible.
+    """
+    if preset is None:
+        preset = DEFAULT_PRESET
+    if not isinstance(preset, Preset):
+        try:
+            preset = PRESETS[preset]
+        except KeyError:
+            raise ValueError(f"perfil de codificación desconocido: {preset!r} "
+                             f"(disponibles: {sorted(PRESETS)})")
+    if preset.format == "WEBP" and not features.check("webp"):
+        raise ValueError("esta instalación de Pillow no soporta WebP")
+    return preset
+
+
+def extension(preset=None):
+    """Extensión de fichero ('.png' o '.webp') del perfil."""
+    return EXTENSIONS[get_preset(preset).format]
+
+
+def _palette_colors(img, colors, exact_colors):
+    """Colores de la paleta: primero los exactos y planos, luego los suavizados.
+
+    Returns:
+        tuple: (colores de la paleta, cuántos de los primeros deben ser exactos)
+    """
+    width, height = img.size
+    sample = img
+    if width >= 2 * _SAMPLE_STEP and height >= 2 * _SAMPLE_STEP:
+        sample = img.resize((width // _SAMPLE_STEP, height // _SAMPLE_STEP), Image.NEAREST)
+    counts = sample.getcolors(sample.size[0] * sample.size[1])
+    palette = []
+    # Rejilla de celdas de _MIN_DISTANCE niveles: un color de la paleta a menos de
+    # esa distancia de otro sólo puede estar en su misma celda o en una vecina
+    grid = {}
+
+    def add(color):
+        palette.append(color)
+        grid.setdefault(tuple(value // _MIN_DISTANCE for value in color), []).append(color)
+
+    def is_far(color):
+        r, g, b = (value // _MIN_DISTANCE for value in color)
+        return all(max(abs(x - y) for x, y in zip(color, chosen)) >= _MIN_DISTANCE
+                   for dr, dg, db in _NEIGHBOUR_CELLS
+                   for chosen in grid.get((r + dr, g + dg, b + db), ()))
+
+    for color in dict.fromkeys(tuple(color[:3]) for color in exact_colors):
+        add(color)
+    n_exact = len(palette)
+    flat_count = _FLAT_FRACTION * sample.size[0] * sample.size[1]
+    for count, color in sorted(counts, key=lambda item: item[0], reverse=True):
+        if len(palette) >= colors:
+            break
+        if color in grid.get(tuple(value // _MIN_DISTANCE for value in color), ()):
+            continue
+        if count >= flat_count:
+            add(color)
+            n_exact = len(palette)
+        elif is_far(color):
+            add(color)
+    return palette[:colors], min(n_exact, colors)
+
+
+def _restore_exact(img, quantized, palette, palette_img, n_exact):
+    """Repinta los colores exactos que la búsqueda por celdas de Pillow ha desviado.
+
+    Dos colores planos muy próximos (p. ej. blanco y el fondo) pueden caer en la
+    misma celda de la caché de Pillow; sólo para esos se calcula una máscara exacta.
+    """
+    probe = Image.new("RGB", (n_exact, 1))
+    probe.putdata(palette[:n_exact])
+    # Una imagen "P" de una fila: sus bytes son directamente los índices de paleta
+    mapped = probe.quantize(palette=palette_img, dither=Image.Dither.NONE).tobytes()
+    for index, color in enumerate(palette[:n_exact]):
+        if mapped[index] == index:
+            continue
+        # Máscara de los píxeles exactamente iguales a `color`: 255 en cada banda
+        # que coincide y el mínimo de las tres bandas
+        lut = [255 if value == color[band] else 0 for band in range(3) for value in range(256)]
+        r, g, b = img.point(lut).split()
+        quantized.paste(index, mask=ImageChops.darker(ImageChops.darker(r, g), b))
+    return quantized
+
+
+def _palette(img, colors, exact_colors):
+    """Paleta para cuantizar `img`: (colores, imagen de paleta, cuántos son exactos)."""
+    exact = img.getcolors(colors)
+    if exact is not None:
+        palette = [color for _, color in exact]
+        n_exact = len(palette)
+    else:
+        palette, n_exact = _palette_colors(img, colors, exact_colors)
+    palette_img = Image.new("P", (1, 1))
+    palette_img.putpalette([value for color in palette for value in color[:3]])
+    return palette, palette_img, n_exact
+
+
+def _map_to_palette(img, palette):
+    """Asigna a cada píxel su color de la paleta (sin tramado: píxel a píxel)."""
+    colors, palette_img, n_exact = palette
+    quantized = img.quantize(palette=palette_img, dither=Image.Dither.NONE)
+    return _restore_exact(img, quantized, colors, palette_img, n_exact)
+
+
+def quantize(img, colors=256, exact_colors=()):
+    """Convierte una imagen RGB a modo paleta sin tramado.
+
+    Los colores de `exact_colors` y los más frecuentes de la imagen (las zonas
+    planas) entran tal cual en la paleta; el resto de píxeles toma el color de la
+    paleta más cercano. Si la imagen tiene `colors` colores o menos, la conversión
+    es exacta.
+
+    Args:
+        img (PIL.Image.Image): imagen RGB
+        colors (int): tamaño máximo de la paleta (2-256)
+        exact_colors (iterable): colores RGB que deben conservarse exactos
+
+    Returns:
+        PIL.Image.Image: imagen en modo 'P'
+    """
+    return _map_to_palette(img, _palette(img, colors, exact_colors))
+
+
+def _save(img, preset):
+    options = {"format": preset.format}
+    if preset.format == "PNG":
+        options.update(compress_level=preset.compress_level, optimize=preset.optimize)
+        if preset.compress_type != Z_DEFAULT_STRATEGY:
+            options["compress_type"] = preset.compress_type
+    else:
+        options.update(lossless=preset.lossless, quality=preset.quality)
+    if preset.dpi:
+        options["dpi"] = preset.dpi
+    buffer = io.BytesIO()
+    img.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def encode(img, preset=None, exact_colors=()):
+    """Codifica la imagen con el perfil `preset`.
+
+    Args:
+        img (PIL.Image.Image): imagen RGB del diagrama
+        preset (str | Preset): perfil de codificación. Si es None, `DEFAULT_PRESET`.
+        exact_colors (iterable): colores planos que la cuantización no debe alterar
+
+    Returns:
+        bytes: contenido del fichero codificado
+    """
+    preset = get_preset(preset)
+    if preset.palette:
+        img = quantize(img, preset.palette, exact_colors)
+    return _save(img, preset)
+
+
+class IncrementalEncoder:
+    """Codifica versiones sucesivas de una imagen recuantizando sólo lo que cambia.
+
+    La paleta se elige en la primera codificación (o en cualquier codificación sin
+    `regions`) y se conserva; las siguientes sólo asignan colores de esa paleta a
+    las zonas que han cambiado. Como la asignación es píxel a píxel, el resultado es
+    el mismo que cuantizar toda la imagen con esa paleta (ver `vigilancia`).
+
+    Args:
+        preset (str | Preset): perfil de codificación; sin paleta, cada codificación
+            es completa.
+    """
+
+    def __init__(self, preset=None):
+        self.preset = get_preset(preset)
+        self._palette = None
+        self._quantized = None
+
+    def encode(self, img, exact_colors=(), regions=None):
+        """Como `encode`, reutilizando la cuantización anterior fuera de `regions`.
+
+        Args:
+            img (PIL.Image.Image): imagen RGB completa
+            exact_colors (iterable): colores planos (se usan al elegir la paleta)
+            regions (list): zonas (x0, y0, x1, y1) en píxeles que han cambiado desde la
+                codificación anterior; None para cuantizar todo y elegir otra paleta
+
+        Returns:
+            bytes: contenido del fichero codificado
+        """
+        if not self.preset.palette:
+            return _save(img, self.preset)
+        if regions is None or self._quantized is None or self._quantized.size != img.size:
+            self._palette = _palette(img, self.preset.palette, exact_colors)
+            self._quantized = _map_to_palette(img, self._palette)
+        else:
+            for box in regions:
+                self._quantized.paste(_map_to_palette(img.crop(box), self._palette), box[:2])
+        return _save(self._quantized, self.preset)
+
+
+def encode_report(img, presets=None, exact_colors=(), repeat=3):
+    """Mide el tiempo de codificación y el tamaño de cada perfil.
+
+    Args:
+        img (PIL.Image.Image): imagen a codificar
+        presets (iterable): nombres de perfil. Si es None, todos los disponibles.
+        repeat (int): repeticiones por perfil; se informa del mejor tiempo.
+
+    Returns:
+        list: dicts con preset, format, bytes y seconds, en el orden de `presets`
+    """
+    if presets is None:
+        presets = [name for name, preset in PRESETS.items()
+                   if preset.format != "WEBP" or features.check("webp")]
+    report = []
+    for name in presets:
+        preset = get_preset(name)
+        best = None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            data = encode(img, preset, exact_colors)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        report.append({"preset": preset.name, "format": preset.format,
+                       "bytes": len(data), "seconds": best})
+    return report
+
+
+def print_report(report):
+    """Imprime el informe de `encode_report` como tabla."""
+    print(f"{'perfil':<10} {'formato':<7} {'bytes':>10} {'ms':>9}")
+    for row in report:
+        print(f"{row['preset']:<10} {row['format']:<7} {row['bytes']:>10} "
+              f"{row['seconds'] * 1000:>9.1f}")
@@ -2,60 +2,108 @@
 """Módulo para generar el diagrama y documento Word con los flujos.
 
 Funciones públicas:
-- generate_diagram(output_dir=None): genera PNG y DOCX en output_dir y devuelve (img_path, doc_path)
-- main(): ejecuta generate_diagram() usando el directorio de salida por defecto
+- generate_diagram(output_dir=None, incremental=False): genera PNG y DOCX en output_dir y
+  devuelve (img_path, doc_path)
+- render_png_image(), render_png_bytes(), render_svg_bytes(), render_word_bytes(image=None):
+  generación en memoria, sin pasar por disco
+- main(argv=None): CLI; ejecuta generate_diagram() (por defecto en el directorio `output`)
+  o, con el subcomando `batch`, un lote de trabajos en paralelo (ver `lote`); el
+  subcomando `presets` informa del coste de cada perfil de codificación, `bench`
+  ejecuta los benchmarks (ver `rendimiento`), `variants` genera variantes de tema,
+  idioma y resolución (ver `variantes`), `watch` regenera al editar el modelo (ver
+  `vigilancia`), `openapi` genera el diagrama a partir de especificaciones OpenAPI
+  (ver `openapi`) y `serve` arranca el servicio residente (ver `servidor`)
 """
-from PIL import Image, ImageDraw, ImageFont
-from docx import Document
-from docx.shared import Inches
+import argparse
+import io
+import json
+import logging
+import math
 import os
+import sys
 
+from .codificacion import DEFAULT_PRESET, PRESETS, encode, extension, get_preset
+from .fuentes import get_registry
+from .instrumentacion import count, enabled, profile, span, traced
+from .incremental import (BuildManifest, build_artifact, fingerprint, font_signature,
+                          sha256_of, source_of)
+from .layout import compute_layout
+from .lienzos import BACKENDS, SVGCanvas, arrow_head, get_backend
+from .metricas import get_metrics
+from .capas import SHADOW_OFFSET, scaled
+from . import capas as _capas_module
+from . import codificacion as _codificacion_module
+from . import layout as _layout_module
+from . import lienzos as _lienzos_module
+from . import metricas as _metricas_module
+from . import modos as _modos_module
+from . import plantilla as _plantilla_module
+from . import temas as _temas_module
+from .modelo import FlowModel, plantuml_code, resolve_flow
+from .modos import MODES, canvas_factory, downsample, encoding_preset, get_mode, pixel_step
+from .temas import get_theme, system_colors, text_color
+from .plantilla import Picture, bold, build_docx, heading, is_png, paragraph, render_docx
 
+logger = logging.getLogger(__name__)
+
+# Fuentes candidatas por orden de preferencia (buen soporte Unicode)
+_FONT_CANDIDATES = [
+    # Windows fonts
+    "arial.ttf", "calibri.ttf", "segoeui.ttf", "tahoma.ttf",
+    # Cross-platform fonts
+    "DejaVuSans-Bold.ttf", "liberation-sans-bold.ttf",
+    # Fallback fonts
+    "NotoSans-Bold.ttf", "OpenSans-Bold.ttf"
+]
+
+
+# Margen interior entre el borde de una caja y su texto
+BOX_TEXT_PADDING = 12
+
+
+@traced("fonts")
 def _load_fonts():
-    """Carga las fuentes con mejor soporte para caracteres especiales y acentos."""
+    """Carga las fuentes con mejor soporte para caracteres especiales y acentos.
+
+    Las rutas se resuelven con el índice de `fuentes` y los objetos cargados se
+    reutilizan entre llamadas, así que sólo la primera llamada toca el disco.
+    """
+    registry = get_registry()
     try:
-        # Intentar fuentes del sistema con buen soporte Unicode
-        font_candidates = [
-            # Windows fonts
-            "arial.ttf", "calibri.ttf", "segoeui.ttf", "tahoma.ttf",
-            # Cross-platform fonts
-            "DejaVuSans-Bold.ttf", "liberation-sans-bold.ttf",
-            # Fallback fonts
-            "NotoSans-Bold.ttf", "OpenSans-Bold.ttf"
-        ]
-        
         font_title = None
         font_box = None
         font_small = None
         
         # Buscar fuentes disponibles
-        for font_name in font_candidates:
+        for font_name in _FONT_CANDIDATES:
             try:
-                font_title = ImageFont.truetype(font_name, 26)  # Reducir de 28 a 26
-                font_box = ImageFont.truetype(font_name.replace("-Bold", ""), 16)  # Reducir de 18 a 16
-                font_small = ImageFont.truetype(font_name.replace("-Bold", ""), 12)  # Reducir de 14 a 12
-                print(f"Usando fuente: {font_name}")
+                font_title = registry.truetype(font_name, 26)  # Reducir de 28 a 26
+                font_box = registry.truetype(font_name.replace("-Bold", ""), 16)  # Reducir de 18 a 16
+                font_small = registry.truetype(font_name.replace("-Bold", ""), 12)  # Reducir de 14 a 12
+                logger.debug("Usando fuente: %s", font_name)
                 break
             except (OSError, IOError):
+                font_title = None
                 continue
         
         # Si no se encuentra ninguna fuente específica, usar fuentes del sistema
         if font_title is None:
             try:
                 # Intentar fuentes del sistema Windows
-                font_title = ImageFont.truetype("arial.ttf", 26)  # Reducir tamaño
-                font_box = ImageFont.truetype("arial.ttf", 16)    # Reducir tamaño
-                font_small = ImageFont.truetype("arial.ttf", 12)  # Reducir tamaño
-                print("Usando fuente del sistema: Arial")
+                font_title = registry.truetype("arial.ttf", 26)  # Reducir tamaño
+                font_box = registry.truetype("arial.ttf", 16)    # Reducir tamaño
+                font_small = registry.truetype("arial.ttf", 12)  # Reducir tamaño
+                logger.info("Usando fuente del sistema: Arial")
             except (OSError, IOError):
                 # Último recurso: fuente por defecto de PIL (pero mejorada)
-                font_title = ImageFont.load_default()
-                font_box = ImageFont.load_default()
-                font_small = ImageFont.load_default()
-                print("Usando fuente por defecto de PIL")
+                font_title = registry.load_default()
+                font_box = registry.load_default()
+                font_small = registry.load_default()
+                logger.warning("Usando fuente por defecto de PIL")
                 
     except Exception as e:
-        print(f"Error cargando fuentes: {e}")
+        logger.warning("Error cargando fuentes: %s", e)
+        from PIL import ImageFont
         # Fallback seguro
         font_title = ImageFont.load_default()
         font_box = ImageFont.load_default()  
@@ -64,361 +112,984 @@ def _load_fonts():
     return font_title, font_box, font_small
 
 
-def _generate_png_diagram(img_path):
-    """Genera únicamente la imagen PNG del diagrama.
-    
+def _box_lines(model, font_box):
+    """Texto de cada caja ajustado a su ancho y medido: {id: [(línea, (w, h))]}."""
+    metrics = get_metrics()
+    box_lines = {}
+    for node in model.nodes():
+        w, _ = model.system(node.system).box_size
+        lines = metrics.wrap(font_box, node.text, w - 2 * BOX_TEXT_PADDING)
+        box_lines[node.id] = [(line, metrics.size(font_box, line)) for line in lines]
+    return box_lines
+
+
+def _node_sizes(model, box_lines, line_height):
+    """Tamaño de cada caja: el de su sistema, más alta si el texto no cabe."""
+    sizes = {}
+    for node in model.nodes():
+        w, h = model.system(node.system).box_size
+        sizes[node.id] = (w, max(h, len(box_lines[node.id]) * line_height
+                                 + 2 * BOX_TEXT_PADDING))
+    return sizes
+
+
+def _geometry(model, font_box):
+    """Medidas de texto y layout del modelo: (layout, box_lines).
+
+    Sólo depende del texto de las cajas y de la estructura del modelo; el tema, las
+    etiquetas de las flechas y la escala no cambian la geometría.
+    """
+    box_lines = _box_lines(model, font_box)
+    sizes = _node_sizes(model, box_lines, get_metrics().line_height(font_box))
+    return compute_layout(model, lambda node: sizes[node.id]), box_lines
+
+
+# Holgura de los rectángulos que ocupa cada elemento: suavizado y trazos gruesos
+_BOUNDS_MARGIN = 4
+
+
+def _label_box(metrics, font_small, label_pos, text):
+    """Posición del texto de una flecha y rectángulo de su fondo: (x, y, rect)."""
+    # Texto centrado sobre el punto medio del primer tramo
+    x0, y0, x1, y1 = metrics.bbox(font_small, text)
+    text_x = label_pos[0] - (x1 - x0) / 2
+    text_y = label_pos[1] - 20
+    padding = 6  # Más padding para texto más pequeño
+    rect = [text_x + x0 - padding, text_y + y0 - padding,
+            text_x + x1 + padding, text_y + y1 + padding]
+    return text_x, text_y, rect
+
+
+def _box_bounds(box, lines):
+    """Rectángulo que ocupa una caja con su sombra y su texto (aunque desborde)."""
+    x, y, w, h = box
+    text_w = max((tw for _, (tw, _) in lines), default=0)
+    overflow = max(0, (text_w - w) / 2)
+    return (x - overflow - _BOUNDS_MARGIN, y - _BOUNDS_MARGIN,
+            x + w + max(SHADOW_OFFSET, overflow) + _BOUNDS_MARGIN,
+            y + h + SHADOW_OFFSET + _BOUNDS_MARGIN)
+
+
+def _route_bounds(points, label_rect, width_line=5):
+    """Rectángulo que ocupa una flecha con su punta y el fondo de su etiqueta."""
+    xs, ys = zip(*(list(points) + arrow_head(points)))
+    margin = width_line / 2 + _BOUNDS_MARGIN
+    bounds = (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+    if label_rect is None:
+        return bounds
+    return _union(bounds, [label_rect[0] - 2, label_rect[1] - 2,
+                           label_rect[2] + 2, label_rect[3] + 2])
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _drawn_items(model, geometry, theme=None):
+    """Elementos que dibuja `_draw_diagram`, en orden: [(firma, rectángulo)].
+
+    La firma resume todo lo que determina sus píxeles (posición, colores, texto y,
+    en las flechas, el orden de dibujo, porque las etiquetas tapan a las anteriores):
+    dos renders con la misma firma pintan igual ese elemento.
+    """
+    _, _, font_small = _load_fonts()
+    metrics = get_metrics()
+    layout, box_lines = geometry
+    theme = get_theme(theme)
+    colors = system_colors(theme, model)
+    items = []
+    for node in model.nodes():
+        box = layout.boxes[node.id]
+        fill = colors[node.system]
+        lines = tuple(box_lines[node.id])
+        items.append((("box", tuple(box), fill, lines), _box_bounds(box, lines)))
+    for position, route in enumerate(layout.routes):
+        text = model.edges[route.index].label
+        label_rect = _label_box(metrics, font_small, route.label_pos, text)[2] if text else None
+        items.append((("arrow", position, tuple(route.points), route.label_pos, text),
+                      _route_bounds(route.points, label_rect)))
+    return items
+
+
+def _chrome_signature(model, geometry, theme=None):
+    """Lo que determina la capa estática: si cambia, hay que redibujar todo."""
+    layout = geometry[0]
+    colors = system_colors(get_theme(theme), model)
+    legend = tuple((system.name, colors[system.key]) for system in model.systems)
+    return layout.width, layout.height, model.title, legend, layout.legend_y
+
+
+@traced("draw")
+def _draw_diagram(model, make_canvas, geometry=None, region=None):
+    """Dibuja el diagrama con el backend que devuelva `make_canvas(width, height)`.
+
     Args:
-        img_path (str): ruta completa donde guardar la imagen PNG
-        
+        model (FlowModel): flujos a dibujar
+        make_canvas (callable): recibe el tamaño del lienzo y devuelve un `lienzos.Canvas`
+        geometry (tuple): (layout, box_lines) ya calculados (ver `_geometry`); si es
+            None se calculan. Las rutas se emparejan con `model.edges` por índice, así
+            que sirven los de otro modelo con la misma estructura (p. ej. traducido).
+        region (tuple): (x0, y0, x1, y1) en unidades del layout; si se indica sólo se
+            dibujan las cajas y flechas que la tocan (el lienzo debe recortarse a ella).
+
     Returns:
-        str: ruta de la imagen generada
+        lo que devuelva `canvas.finish()` (imagen PIL, flujo SVG...)
     """
-    # Create an image with PIL for clean boxes and arrows
-    width, height = 2000, 970  # Aumentar ancho para cajas verdes movidas hacia la derecha
-    bg_color = (248, 250, 252)  # Fondo gris muy claro para mejor contraste
-    img = Image.new("RGB", (width, height), bg_color)
-    draw = ImageDraw.Draw(img)
-
     font_title, font_box, font_small = _load_fonts()
+    metrics = get_metrics()
+    measured = metrics.cache_info() if enabled() else None
 
-    # Colors (user specified) - Mejorados para mejor contraste
-    color_gestor = (14, 82, 160)       # dark blue for GestorMapeos
-    color_erp = (54, 126, 223)         # medium blue for ERP Académico
-    color_expedientes = (76, 175, 80)  # green for Expedientes - más vibrante
-    border_color = (30, 50, 80)
-    shadow_color = (200, 200, 200)     # Color para sombras
-
-    # Positions for boxes - Mejor distribución y espaciado con cajas ajustadas
-    x_gestor, y_gestor = 100, 280
-    w_box_gestor, h_box_gestor = 340, 100  # Reducir GestorMapeos de 380x110 a 350x100
-    w_box, h_box = 450, 100  # Tamaño para cajas azules (ERP) - más pequeñas
-    w_box_green, h_box_green = 590, 140  # Cajas verdes un pelín más grandes
-
-    x_api, y_api = 600, 150
-    x_api_ampliacion, y_api_ampliacion = 600, 540  # Ajustar por cajas más altas
-
-    # Three green boxes stacked vertically on the right with better spacing
-    x_expe_post1, y_expe_post1 = 1200, 150  # Mover hacia la derecha de 1150 a 1200
-    x_expe_post2, y_expe_post2 = 1200, 330  # POST /api/v1/expedientes-alumnos (más separación)
-    x_expe_post3, y_expe_post3 = 1200, 510  # POST /api/v1/expedientes-alumnos/matricula-realizada
-
-    # Draw title with better styling
-    title_text = "Flujos: GestorMapeos - ERP Académico - Expedientes"
-    # Dibujar sombra del título
-    draw.text((width // 2 - 218, 22), title_text, font=font_title, fill=(180,180,180))
-    # Dibujar título principal
-    draw.text((width // 2 - 220, 20), title_text, font=font_title, fill=(20,20,20))
-    
-    # Agregar línea decorativa bajo el título
-    draw.line((width // 2 - 350, 70, width // 2 + 350, 70), fill=(100,100,100), width=2)
+    # Posiciones, rutas y tamaño del lienzo calculados por el motor de layout
+    if geometry is None:
+        with span("layout"):
+            geometry = _geometry(model, font_box)
+    layout, box_lines = geometry
+
+    with span("chrome"):
+        canvas = make_canvas(layout.width, layout.height)
+        theme = canvas.theme
+        colors = system_colors(theme, model)
+        legend = [(system.name, colors[system.key]) for system in model.systems]
+        canvas.chrome(model.title, legend, layout.legend_y, font_title, font_small)
 
     # Helper to draw rounded rectangle with text and shadow
-    def draw_box(x, y, w, h, fill, text, font, outline=(30,50,80)):
-        radius = 15
-        # Dibujar sombra
-        shadow_offset = 4
-        draw.rounded_rectangle([x+shadow_offset, y+shadow_offset, x+w+shadow_offset, y+h+shadow_offset], 
-                              radius=radius, fill=shadow_color, outline=None)
-        # outer rect
-        draw.rounded_rectangle([x, y, x+w, y+h], radius=radius, fill=fill, outline=outline, width=3)
-        # center text (multilínea)
-        lines = text.split("\n")
-        line_sizes = []
-        for line in lines:
-            if line.strip() == "":
-                bbox = draw.textbbox((0, 0), "A", font=font)
-            else:
-                bbox = draw.textbbox((0, 0), line, font=font)
-            tw = bbox[2] - bbox[0]
-            th = bbox[3] - bbox[1]
-            line_sizes.append((tw, th))
-
-        total_h = sum(hgt for _, hgt in line_sizes)
-        start_y = y + (h - total_h) / 2
-        y_offset = 0
-        for (line, (tw, th)) in zip(lines, line_sizes):
-            draw.text((x + (w - tw) / 2, start_y + y_offset), line, font=font,
-                      fill=(255,255,255) if sum(fill[:3]) < 400 else (0,0,0))
-            y_offset += th
+    def draw_box(x, y, w, h, fill, lines, font):
+        canvas.box(x, y, w, h, fill)
+        # center text (multilínea, ya medida y ajustada al ancho); las líneas avanzan
+        # el alto de línea de la fuente, no el de su tinta
+        line_height = metrics.line_height(font)
+        start_y = y + (h - len(lines) * line_height) / 2
+        for i, (line, (tw, _)) in enumerate(lines):
+            canvas.text(x + (w - tw) / 2, start_y + i * line_height, line, font,
+                        text_color(theme, fill))
 
     # Draw boxes
-    draw_box(x_gestor, y_gestor, w_box_gestor, h_box_gestor, color_gestor, "GestorMapeos", font_box)
-    draw_box(x_api, y_api, w_box, h_box, color_erp,
-             "API Primera Matrícula\n\nPOST https://erpacademico.unir.net/api/v1/migrar\n\n",
-             font_box)
-    draw_box(x_api_ampliacion, y_api_ampliacion, w_box, h_box, color_erp,
-             "API Ampliación\n\nPOST https://erpacademico.unir.net/api/v1/migrar/ampliacion\n\n",
-             font_box)
-    # Three green boxes stacked vertically with larger size
-    draw_box(x_expe_post1, y_expe_post1, w_box_green, h_box_green, color_expedientes, 
-             "POST\n\napi/v1/expedientes-alumnos", font_box)
-    draw_box(x_expe_post2, y_expe_post2, w_box_green, h_box_green, color_expedientes, 
-             "PUT\n\napi/v1/expedientes-alumnos/{id}/por-integracion", font_box)
-    draw_box(x_expe_post3, y_expe_post3, w_box_green, h_box_green, color_expedientes, 
-             "POST\n\napi/v1/expedientes-alumnos/matricula-realizada", font_box)
-
-    # Draw arrows (lines with triangles) - Improved
-    def draw_arrow(x1, y1, x2, y2, fill=(40,40,40), width_line=5):
-        draw.line((x1, y1, x2, y2), fill=fill, width=width_line)
-        # draw triangle head
-        import math
-        angle = math.atan2(y2 - y1, x2 - x1)
-        head_len = 16
-        left = (x2 - head_len * math.cos(angle) + head_len/2 * math.sin(angle),
-                y2 - head_len * math.sin(angle) - head_len/2 * math.cos(angle))
-        right = (x2 - head_len * math.cos(angle) - head_len/2 * math.sin(angle),
-                 y2 - head_len * math.sin(angle) + head_len/2 * math.cos(angle))
-        draw.polygon([ (x2,y2), left, right ], fill=fill)
+    with span("boxes"):
+        for node in model.nodes():
+            x, y, w, h = layout.boxes[node.id]
+            if region is not None and not _intersects(
+                    _box_bounds((x, y, w, h), box_lines[node.id]), region):
+                continue
+            draw_box(x, y, w, h, colors[node.system], box_lines[node.id], font_box)
+
+    # Draw arrows (polilíneas con la punta en el último tramo)
+    def draw_arrow(points, fill, width_line=5):
+        canvas.polyline(points, fill, width_line)
+        canvas.polygon(arrow_head(points), fill)
 
     # Function to draw text on arrows with better background
-    def draw_arrow_with_text(x1, y1, x2, y2, text, fill=(40,40,40), width_line=5):
-        draw_arrow(x1, y1, x2, y2, fill, width_line)
-        # Calculate text position (middle of the arrow)
-        text_x = (x1 + x2) // 2 - 50  # Ajustar para cajas más grandes
-        text_y = (y1 + y2) // 2 - 20  # Mantener posición vertical
+    def draw_arrow_with_text(points, label_pos, text, fill, width_line=5):
+        label = _label_box(metrics, font_small, label_pos, text) if text else None
+        if region is not None and not _intersects(
+                _route_bounds(points, label and label[2], width_line), region):
+            return
+        draw_arrow(points, fill, width_line)
+        if not text:
+            return
         # Fondo blanco con borde para el texto
-        bbox = draw.textbbox((text_x, text_y), text, font=font_small)
-        padding = 6  # Más padding para texto más pequeño
-        draw.rectangle([bbox[0]-padding, bbox[1]-padding, bbox[2]+padding, bbox[3]+padding], 
-                      fill=(255,255,255), outline=(150,150,150), width=2)
-        draw.text((text_x, text_y), text, font=font_small, fill=fill)
-
-    # Flow 1: GestorMapeos -> API Primera Matrícula -> Two green boxes (not matricula-realizada)
-    draw_arrow_with_text(x_gestor + w_box_gestor, y_gestor + h_box_gestor/2, 
-                         x_api, y_api + h_box/2, 
-                         "Primera Matrícula")
-    
-    # From API Primera Matrícula to only the first two green boxes
-    draw_arrow_with_text(x_api + w_box, y_api + h_box/2, 
-                         x_expe_post1, y_expe_post1 + h_box_green/2, 
-                         "Crear Expediente")
-    
-    draw_arrow_with_text(x_api + w_box, y_api + h_box/2 + 10, 
-                         x_expe_post2, y_expe_post2 + h_box_green/2, 
-                         "Actualizar Expediente")
-
-    # Flow 2: GestorMapeos -> API Ampliación -> Last green box only
-    draw_arrow_with_text(x_gestor + w_box_gestor, y_gestor + h_box_gestor/2 + 40, 
-                         x_api_ampliacion, y_api_ampliacion + h_box/2, 
-                         "Ampliación")
-    
-    draw_arrow_with_text(x_api_ampliacion + w_box, y_api_ampliacion + h_box/2, 
-                         x_expe_post3, y_expe_post3 + h_box_green/2, 
-                         "Matrícula Realizada")
+        text_x, text_y, rect = label
+        canvas.rectangle(rect, theme.label_fill, theme.label_outline, 2)
+        canvas.text(text_x, text_y, text, font_small, fill)
 
-    # Add legends at bottom with better styling
-    legend_y = 820  # Ajustar para cajas más altas
-    legend_box_size = 28
-    
-    # Fondo para la leyenda
-    draw.rectangle([60, legend_y-15, 720, legend_y+50], fill=(255,255,255), outline=(180,180,180), width=2)
-    
-    draw.rectangle([80, legend_y, 80+legend_box_size, legend_y+legend_box_size], 
-                   fill=color_gestor, outline=border_color, width=2)
-    draw.text((120, legend_y+2), "GestorMapeos", font=font_small, fill=(0,0,0))
-    
-    draw.rectangle([280, legend_y, 280+legend_box_size, legend_y+legend_box_size], 
-                   fill=color_erp, outline=border_color, width=2)
-    draw.text((320, legend_y+2), "ERP Académico", font=font_small, fill=(0,0,0))
-    
-    draw.rectangle([480, legend_y, 480+legend_box_size, legend_y+legend_box_size], 
-                   fill=color_expedientes, outline=border_color, width=2)
-    draw.text((520, legend_y+2), "Expedientes", font=font_small, fill=(0,0,0))
+    with span("arrows"):
+        for route in layout.routes:
+            draw_arrow_with_text(route.points, route.label_pos, model.edges[route.index].label,
+                                 theme.arrow)
 
-    # Save image
-    img.save(img_path)
-    return img_path
+    if measured is not None:
+        after = metrics.cache_info()
+        count("boxes", len(layout.boxes))
+        count("arrows", len(layout.routes))
+        count("text_measurements", after["hits"] + after["misses"]
+              - measured["hits"] - measured["misses"])
+        count("text_measurement_misses", after["misses"] - measured["misses"])
+    with span("finish"):
+        return canvas.finish()
 
 
-def _generate_word_document(doc_path, img_path):
-    """Genera únicamente el documento Word con documentación detallada.
+def _render_png_image(model=None, mode=None, geometry=None):
+    """Dibuja el diagrama en memoria a partir del modelo de flujos.
+
+    Args:
+        model (FlowModel): flujos a dibujar. Si es None se usa `default_flow()`.
+        mode (str): modo de render: 'draft', 'normal', 'hq' o 'hq4' (ver `modos`).
+        geometry (tuple): (layout, box_lines) ya calculados (ver `_geometry`).
+
+    Returns:
+        PIL.Image.Image: imagen RGB del diagrama
+    """
+    mode = get_mode(mode)
+    return downsample(_draw_diagram(resolve_flow(model), canvas_factory(mode), geometry), mode)
+
+
+def _render_png_region(model, geometry, region, mode=None, items=None):
+    """Redibuja sólo una zona de la imagen de `_render_png_image` (ver `vigilancia`).
+
+    Args:
+        model (FlowModel): flujos a dibujar
+        geometry (tuple): (layout, box_lines) del modelo (ver `_geometry`)
+        region (tuple): (x0, y0, x1, y1) en unidades del layout, con las esquinas en
+            múltiplos de `modos.pixel_step(mode)`
+        mode (str): modo de render (ver `modos`)
+        items (list): `_drawn_items(model, geometry)` si ya se han calculado
+
+    Returns:
+        tuple: (recorte de la imagen final, (x, y) donde pegarlo), idéntico a esa zona
+        de la imagen completa
+    """
+    mode = get_mode(mode)
+    layout = geometry[0]
+    step = pixel_step(mode)
+    # El lienzo se amplía hacia arriba y a la izquierda hasta contener enteros los
+    # elementos que tocan la zona: PIL trunca hacia cero las coordenadas negativas,
+    # así que un elemento cortado por ese borde no saldría igual que en la imagen
+    left, top = region[:2]
+    for _, bounds in items if items is not None else _drawn_items(model, geometry):
+        if _intersects(bounds, region):
+            left, top = min(left, bounds[0]), min(top, bounds[1])
+    left = max(0, math.floor(left / step) * step)
+    top = max(0, math.floor(top / step) * step)
+
+    scale = mode.scale * mode.supersample
+    box = (int(round(left * scale)), int(round(top * scale)),
+           min(int(round(region[2] * scale)), scaled(layout.width, scale)),
+           min(int(round(region[3] * scale)), scaled(layout.height, scale)))
+    img = downsample(_draw_diagram(model, canvas_factory(mode, region=box), geometry, region),
+                     mode)
+    x0, y0 = int(round(region[0] * mode.scale)), int(round(region[1] * mode.scale))
+    origin = (box[0] // mode.supersample, box[1] // mode.supersample)
+    return img.crop((x0 - origin[0], y0 - origin[1], img.width, img.height)), (x0, y0)
+
+
+def _render_svg(stream, model=None):
+    """Escribe el diagrama como SVG en `stream` (flujo binario) sin crear un bitmap.
+
+    Returns:
+        el propio `stream`
+    """
+    return _draw_diagram(resolve_flow(model),
+                         lambda width, height: SVGCanvas(width, height, stream))
+
+
+def _flat_colors(model, theme=None):
+    """Colores planos del diagrama, que la cuantización a paleta conserva exactos."""
+    theme = get_theme(theme)
+    colors = [theme.background, theme.border, theme.shadow, theme.label_fill]
+    colors += system_colors(theme, resolve_flow(model)).values()
+    return [color for color in colors if color is not None]
+
+
+def _encode_png(img, preset=None, model=None, mode=None):
+    """Codifica la imagen con el perfil `preset` (ver `codificacion`) y devuelve los bytes.
+
+    Si `preset` es None se usa el del modo de render (ver `modos.encoding_preset`).
+    """
+    with span("encode"):
+        return encode(img, encoding_preset(mode, preset), _flat_colors(model))
+
+
+def _write_bytes(path, data):
+    with span("write"):
+        with open(path, "wb") as fh:
+            fh.write(data)
+    count("bytes_written", len(data))
+
+
+def _write_png(img_path, model=None, preset=None, mode=None):
+    """Renderiza, codifica y escribe la imagen raster en disco.
+
+    Returns:
+        bytes: contenido escrito (para reutilizarlo sin volver a leer el fichero)
+    """
+    data = _encode_png(_render_png_image(model, mode), preset, model, mode)
+    _write_bytes(img_path, data)
+    return data
+
+
+def _generate_png_diagram(img_path, model=None, preset=None, mode=None):
+    """Genera únicamente la imagen PNG del diagrama.
     
     Args:
-        doc_path (str): ruta completa donde guardar el documento DOCX
-        img_path (str): ruta de la imagen PNG para embeber en el documento
+        img_path (str | file-like): ruta completa o flujo binario donde guardar la imagen PNG
+        model (FlowModel): flujos a dibujar. Si es None se usa `default_flow()`.
+        preset (str): perfil de codificación (ver `codificacion`). Si es None, el del modo.
+        mode (str): modo de render (ver `modos`): 'draft' para previsualizar, 'hq'
+            o 'hq4' para imprimir. Si es None, 'normal'.
         
     Returns:
-        str: ruta del documento generado
+        str: ruta de la imagen generada (o el propio flujo)
     """
-    # Create Word doc and embed image and textual info
-    doc = Document()
-    
-    # Título principal
-    doc.add_heading('Esquema de Flujos: GestorMapeos - ERP Académico - Expedientes', level=1)
-    
+    data = _encode_png(_render_png_image(model, mode), preset, model, mode)
+    if isinstance(img_path, str):
+        _write_bytes(img_path, data)
+    else:
+        img_path.write(data)
+    return img_path
+
+
+def _join_names(names):
+    """['a', 'b', 'c'] -> 'a, b y c'."""
+    names = list(names)
+    if len(names) <= 1:
+        return "".join(names)
+    return ", ".join(names[:-1]) + " y " + names[-1]
+
+
+def _document_blocks(model):
+    """Contenido del documento Word como bloques de `plantilla` (párrafos e imagen)."""
+    blocks = [heading(f'Esquema de {model.title}', 1)]
+
     # Introducción
-    intro = doc.add_paragraph()
-    intro.add_run('Este documento describe los flujos de integración entre los sistemas GestorMapeos, ERP Académico y Expedientes. ').bold = True
-    doc.add_paragraph('El diagrama visual muestra los dos flujos principales: "Primera Matrícula" y "Ampliación", con colores diferenciados por sistema y URLs completas de los endpoints utilizados.')
-    
+    system_names = _join_names(system.name for system in model.systems)
+    blocks.append(paragraph(bold(f'Este documento describe los flujos de integración entre los sistemas {system_names}. ')))
+    if model.flows:
+        flow_names = _join_names(f'"{flow.name}"' for flow in model.flows)
+        blocks.append(paragraph(f'El diagrama visual muestra los flujos principales: {flow_names}, con colores diferenciados por sistema y URLs completas de los endpoints utilizados.'))
+
     # Imagen del diagrama al inicio
-    doc.add_heading('Diagrama Visual', level=2)
-    doc.add_picture(img_path, width=Inches(6.5))
-    doc.add_paragraph()  # Espacio
-
-    doc.add_heading('Descripción de Sistemas', level=2)
-    systems_para = doc.add_paragraph()
-    systems_para.add_run('• GestorMapeos: ').bold = True
-    systems_para.add_run('Sistema de gestión de mapeos de matrículas (azul oscuro)\n')
-    systems_para.add_run('• ERP Académico: ').bold = True
-    systems_para.add_run('Sistema de planificación de recursos académicos (azul medio)\n')
-    systems_para.add_run('• Expedientes: ').bold = True
-    systems_para.add_run('Sistema de gestión de expedientes académicos (verde)')
-
-    doc.add_heading('Endpoints de las APIs', level=2)
-    
-    # ERP Académico
-    doc.add_heading('ERP Académico', level=3)
-    doc.add_paragraph('• Primera migración (crear/actualizar expediente):', style='List Bullet')
-    doc.add_paragraph('  POST https://erpacademico.unir.net/api/v1/migrar', style='List Bullet 2')
-    doc.add_paragraph('• Ampliación (no primera matrícula):', style='List Bullet')
-    doc.add_paragraph('  POST https://erpacademico.unir.net/api/v1/migrar/ampliacion', style='List Bullet 2')
-    
-    # Expedientes
-    doc.add_heading('Expedientes', level=3)
-    doc.add_paragraph('• Crear expediente:', style='List Bullet')
-    doc.add_paragraph('  POST https://expedienteserp.unir.net/api/v1/expedientes-alumnos', style='List Bullet 2')
-    doc.add_paragraph('• Modificar expediente por integración:', style='List Bullet')
-    doc.add_paragraph('  PUT https://expedienteserp.unir.net/api/v1/expedientes-alumnos/{id}/por-integracion', style='List Bullet 2')
-    doc.add_paragraph('• Notificar matrícula realizada:', style='List Bullet')
-    doc.add_paragraph('  POST https://expedienteserp.unir.net/api/v1/expedientes-alumnos/matricula-realizada', style='List Bullet 2')
-
-    doc.add_heading('Descripción Detallada de los Flujos', level=2)
-    
-    # Flujo 1
-    doc.add_heading('Flujo 1 — Primera Matrícula', level=3)
-    flow1_para = doc.add_paragraph()
-    flow1_para.add_run('Proceso:\n').bold = True
-    doc.add_paragraph('1. GestorMapeos envía la información de la primera matrícula', style='List Number')
-    doc.add_paragraph('   → POST https://erpacademico.unir.net/api/v1/migrar', style='List Number 2')
-    doc.add_paragraph('2. El ERP Académico procesa y guarda la matrícula', style='List Number')
-    doc.add_paragraph('3. Si es la PRIMERA matrícula, el ERP puede:', style='List Number')
-    doc.add_paragraph('   a) Crear un nuevo expediente en Expedientes:', style='List Number 2')
-    doc.add_paragraph('      POST https://expedienteserpunir.net/api/v1/expedientes-alumnos', style='List Number 3')
-    doc.add_paragraph('   b) Actualizar un expediente existente:', style='List Number 2')
-    doc.add_paragraph('      PUT https://expedienteserp.unir.net/api/v1/expedientes-alumnos/{id}/por-integracion', style='List Number 3')
-
-    # Flujo 2
-    doc.add_heading('Flujo 2 — Ampliación (No Primera Matrícula)', level=3)
-    flow2_para = doc.add_paragraph()
-    flow2_para.add_run('Proceso:\n').bold = True
-    doc.add_paragraph('1. GestorMapeos envía la información de ampliación', style='List Number')
-    doc.add_paragraph('   → POST https://erpacademico.unir.net/api/v1/migrar/ampliacion', style='List Number 2')
-    doc.add_paragraph('2. El ERP Académico procesa y guarda la matrícula', style='List Number')
-    doc.add_paragraph('3. El ERP notifica a Expedientes que se ha realizado una matrícula:', style='List Number')
-    doc.add_paragraph('   → POST https://expedienteserp.unir.net/api/v1/expedientes-alumnos/matricula-realizada', style='List Number 2')
-
-    doc.add_heading('Código PlantUML', level=2)
-    plantuml_code = """@startuml
-skinparam rectangle {
-  BackgroundColor<<Gestor>> #0E52A0
-  BackgroundColor<<ERP>> #367EDF
-  BackgroundColor<<Expedientes>> #4CAF50
-  FontColor white
-}
-actor "GestorMapeos" as GM <<Gestor>>
-rectangle "ERP Académico\nPOST /api/v1/migrar (primera)\nPOST /api/v1/migrar/ampliacion (no primera)" as ERP <<ERP>>
-rectangle "Expedientes\nhttps://expedienteserp.unir.net" as EXP <<Expedientes>>
-GM --> ERP : POST https://erpacademico.unir.net/api/v1/migrar
-ERP --> EXP : "Primera matrícula -> crear/actualizar expediente"
-note right of ERP
-    - Crear: POST https://expedienteserp.unir.net/api/v1/expedientes-alumnos
-    - Actualizar: PUT https://expedienteserp.unir.net/api/v1/expedientes-alumnos/{id}/por-integracion
-end note
-GM --> ERP : POST https://erpacademico.unir.net/api/v1/migrar/ampliacion
-ERP --> EXP : POST https://expedienteserp.unir.net/api/v1/expedientes-alumnos/matricula-realizada
-@enduml"""
-    doc.add_paragraph(plantuml_code)
-    
+    blocks.append(heading('Diagrama Visual', 2))
+    blocks.append(Picture(6.5))
+    blocks.append(paragraph())  # Espacio
+
+    blocks.append(heading('Descripción de Sistemas', 2))
+    runs = []
+    for i, system in enumerate(model.systems):
+        runs.append(bold(f'• {system.name}: '))
+        description = f'{system.description} ({system.color_name})' if system.color_name else system.description
+        runs.append(description + ('\n' if i < len(model.systems) - 1 else ''))
+    blocks.append(paragraph(*runs))
+
+    blocks.append(heading('Endpoints de las APIs', 2))
+
+    # Un apartado por sistema con endpoints
+    for system in model.systems:
+        endpoints = model.endpoints_of(system.key)
+        if not endpoints:
+            continue
+        blocks.append(heading(system.name, 3))
+        for endpoint in endpoints:
+            blocks.append(paragraph(f'• {endpoint.summary}:', style='List Bullet'))
+            blocks.append(paragraph(f'  {endpoint.method} {model.url(endpoint)}', style='List Bullet 2'))
+
+    if model.flows:
+        blocks.append(heading('Descripción Detallada de los Flujos', 2))
+
+    for number, flow in enumerate(model.flows, start=1):
+        blocks.append(heading(f'Flujo {number} — {flow.title}', 3))
+        blocks.append(paragraph(bold('Proceso:\n')))
+        for step in flow.steps:
+            blocks.append(paragraph('   ' * (step.level - 1) + step.text, style=_list_number_style(step.level)))
+            if step.endpoint is not None:
+                endpoint = model.endpoint(step.endpoint)
+                blocks.append(paragraph(f'{"   " * step.level}→ {endpoint.method} {model.url(endpoint)}',
+                                        style=_list_number_style(step.level + 1)))
+
+    blocks.append(heading('Código PlantUML', 2))
+    blocks.append(paragraph(plantuml_code(model)))
+
     # Nota final
-    doc.add_paragraph()
-    note_para = doc.add_paragraph()
-    note_para.add_run('Nota: ').bold = True
-    note_para.add_run('Este diagrama puede ser renderizado usando PlantUML para generar diagramas UML alternativos.')
+    blocks.append(paragraph())
+    blocks.append(paragraph(bold('Nota: '), 'Este diagrama puede ser renderizado usando PlantUML para generar diagramas UML alternativos.'))
+    return blocks
 
-    doc.save(doc_path)
-    return doc_path
 
+@traced("docx")
+def _generate_word_document(doc_path, img_path, model=None):
+    """Genera únicamente el documento Word con documentación detallada.
 
-def generate_png_only(output_dir=None):
-    """Genera únicamente la imagen PNG del diagrama.
+    Con una imagen PNG el DOCX sale de la plantilla compilada de `plantilla` (sólo se
+    generan `word/document.xml` y la parte de la imagen); con otro formato se monta
+    con python-docx.
 
     Args:
-        output_dir (str): carpeta donde guardar el resultado. Si es None, se usa
-            el subdirectorio `output` dentro del paquete.
+        doc_path (str | file-like): ruta completa o flujo binario donde guardar el DOCX
+        img_path (str | bytes | file-like): imagen PNG para embeber en el documento,
+            como ruta, como bytes ya codificados o como flujo binario
+        model (FlowModel): flujos a documentar. Si es None se usa `default_flow()`.
 
     Returns:
-        str: ruta de la imagen PNG generada
+        str: ruta del documento generado (o el propio flujo)
     """
+    model = resolve_flow(model)
+    image = _read_image_bytes(img_path)
+    blocks = _document_blocks(model)
+    with span("save"):
+        if is_png(image):
+            count("bytes_written", render_docx(blocks, image, doc_path))
+            return doc_path
+        build_docx(blocks, image, doc_path)
+    if enabled():
+        size = os.path.getsize(doc_path) if isinstance(doc_path, str) else doc_path.tell()
+        count("bytes_written", size)
+    return doc_path
+
+
+def _list_number_style(level):
+    """Estilo de lista numerada de python-docx para un nivel (1-3)."""
+    level = min(max(level, 1), 3)
+    return 'List Number' if level == 1 else f'List Number {level}'
+
+
+@traced("fingerprint")
+def _png_fingerprint(model=None, backend="png", preset=None, mode=None):
+    """Huella de todo lo que determina el contenido de la imagen (PNG o SVG)."""
+    import PIL
+    return fingerprint(
+        backend,
+        tuple(get_preset(encoding_preset(mode, preset))) if backend == "png" else None,
+        tuple(get_mode(mode)) if backend == "png" else None,
+        resolve_flow(model).digest(),
+        source_of(_draw_diagram),
+        source_of(_label_box),
+        source_of(_box_lines),
+        source_of(_node_sizes),
+        source_of(_geometry),
+        source_of(_capas_module),
+        source_of(_temas_module),
+        source_of(_lienzos_module),
+        source_of(_metricas_module),
+        source_of(_layout_module),
+        source_of(FlowModel.nodes),
+        source_of(_render_png_image),
+        source_of(_encode_png),
+        source_of(_flat_colors),
+        source_of(_codificacion_module),
+        source_of(_modos_module),
+        source_of(_load_fonts),
+        _FONT_CANDIDATES,
+        font_signature(_load_fonts()),
+        PIL.__version__,
+    )
+
+
+@traced("fingerprint")
+def _docx_fingerprint(png_digest, model=None):
+    """Huella del DOCX: modelo, su propio código y el contenido exacto del PNG embebido."""
+    import docx
+    return fingerprint(
+        "docx",
+        resolve_flow(model).digest(),
+        source_of(_generate_word_document),
+        source_of(_document_blocks),
+        source_of(_list_number_style),
+        source_of(_plantilla_module),
+        source_of(plantuml_code),
+        getattr(docx, "__version__", ""),
+        png_digest,
+    )
+
+
+def _output_paths(output_dir, backend="png", preset=None):
+    """Crea (si hace falta) el directorio de salida y devuelve (img_path, doc_path)."""
     pkg_dir = os.path.dirname(__file__)
     if output_dir is None:
         output_dir = os.path.join(pkg_dir, "output")
     os.makedirs(output_dir, exist_ok=True)
 
-    img_path = os.path.join(output_dir, "diagram_expedientes_flow.png")
-    return _generate_png_diagram(img_path)
+    suffix = extension(preset) if backend == "png" else get_backend(backend).extension
+    img_path = os.path.join(output_dir, "diagram_expedientes_flow" + suffix)
+    doc_path = os.path.join(output_dir, "Esquema_Flujos_GestorMapeos_ERP_Expedientes.docx")
+    return img_path, doc_path
+
+
+def render_png_image(flow=None, mode=None):
+    """Renderiza el diagrama en memoria sin tocar el sistema de ficheros.
+
+    Args:
+        flow (None | str | dict | FlowModel): flujos a dibujar (ver `modelo.resolve_flow`).
+        mode (str): modo de render (ver `modos`). Si es None, 'normal'.
+
+    Returns:
+        PIL.Image.Image: imagen RGB del diagrama
+    """
+    return _render_png_image(flow, mode)
+
+
+def render_png_bytes(flow=None, preset=None, mode=None):
+    """Renderiza el diagrama y devuelve la imagen codificada.
+
+    Args:
+        flow (None | str | dict | FlowModel): flujos a dibujar.
+        preset (str): perfil de codificación: 'default', 'fast', 'small', 'print' o
+            'webp' (ver `codificacion`). Si es None, el del modo o
+            `codificacion.DEFAULT_PRESET`.
+        mode (str): modo de render: 'draft', 'normal', 'hq' o 'hq4' (ver `modos`).
+
+    Returns:
+        bytes: contenido del fichero PNG (o WebP con `preset="webp"`)
+    """
+    model = resolve_flow(flow)
+    return _encode_png(_render_png_image(model, mode), preset, model, mode)
+
+
+def render_svg_bytes(flow=None):
+    """Genera el diagrama como SVG (vectorial, sin rasterizar).
+
+    Returns:
+        bytes: contenido del fichero SVG
+    """
+    return _render_svg(io.BytesIO(), flow).getvalue()
+
+
+def render_word_bytes(image=None, flow=None, mode=None):
+    """Genera el documento Word en memoria.
+
+    Args:
+        image (bytes | file-like | str): PNG a embeber. Si es None se renderiza.
+        flow (None | str | dict | FlowModel): flujos a documentar.
+        mode (str): modo de render del PNG cuando `image` es None (ver `modos`).
+
+    Returns:
+        bytes: contenido del fichero DOCX
+    """
+    model = resolve_flow(flow)
+    if image is None:
+        image = _docx_png(model, mode)
+    buffer = io.BytesIO()
+    _generate_word_document(buffer, image, model)
+    return buffer.getvalue()
+
+
+def _write_svg(img_path, model=None):
+    """Escribe el SVG en disco en streaming (no devuelve el contenido)."""
+    with open(img_path, "wb") as fh:
+        _render_svg(fh, model)
+
+
+def _image_writer(backend, model, preset=None, mode=None):
+    """Función path -> (bytes escritos o None) que genera la imagen con `backend`."""
+    get_backend(backend)
+    if backend == "svg":
+        return lambda path: _write_svg(path, model)
+    get_preset(preset)
+    get_mode(mode)
+    return lambda path: _write_png(path, model, preset, mode)
+
+
+def _embeds_in_docx(backend, preset):
+    """True si la imagen generada puede embeberse tal cual en el DOCX (PNG raster)."""
+    return backend == "png" and get_preset(preset).format == "PNG"
+
+
+def _docx_preset(mode=None):
+    """Perfil del PNG que se embebe en el DOCX: el del modo, o el global si no es PNG."""
+    preset = encoding_preset(mode)
+    return preset if get_preset(preset).format == "PNG" else DEFAULT_PRESET
+
+
+def _docx_png(model, mode=None, img=None):
+    """PNG para el DOCX en el modo `mode`; `img` es la imagen ya dibujada, si la hay."""
+    if img is None:
+        img = _render_png_image(model, mode)
+    return _encode_png(img, _docx_preset(mode), model)
+
 
+@traced("generate_png_only")
+def generate_png_only(output_dir=None, incremental=False, flow=None, backend="png",
+                      preset=None, mode=None):
+    """Genera únicamente la imagen del diagrama (PNG, o SVG con `backend="svg"`).
 
-def generate_word_only(output_dir=None, img_path=None):
+    Args:
+        output_dir (str): carpeta donde guardar el resultado. Si es None, se usa
+            el subdirectorio `output` dentro del paquete.
+        incremental (bool): si es True no se regenera la imagen cuando ninguna de
+            sus entradas ha cambiado desde la última generación.
+        flow (None | str | dict | FlowModel): flujos a dibujar (ver `modelo.resolve_flow`).
+        backend (str): 'png' (raster con PIL) o 'svg' (vectorial, escrito en streaming).
+        preset (str): perfil de codificación de la imagen raster (ver `codificacion`).
+        mode (str): modo de render de la imagen raster (ver `modos`).
+
+    Returns:
+        str: ruta de la imagen generada
+    """
+    model = resolve_flow(flow)
+    preset = encoding_preset(mode, preset)
+    img_path, _ = _output_paths(output_dir, backend, preset)
+    write_image = _image_writer(backend, model, preset, mode)
+    if not incremental:
+        write_image(img_path)
+        return img_path
+
+    manifest = BuildManifest.load(os.path.dirname(img_path))
+    if build_artifact(manifest, img_path, _png_fingerprint(model, backend, preset, mode),
+                      write_image):
+        manifest.save()
+    return img_path
+
+
+@traced("generate_word_only")
+def generate_word_only(output_dir=None, img_path=None, incremental=False, flow=None):
     """Genera únicamente el documento Word.
 
     Args:
         output_dir (str): carpeta donde guardar el resultado. Si es None, se usa
             el subdirectorio `output` dentro del paquete.
-        img_path (str): ruta de la imagen PNG para embeber. Si es None, se busca
-            en el directorio de salida.
+        img_path (str | bytes | file-like): imagen PNG para embeber. Si es None, se
+            busca en el directorio de salida.
+        incremental (bool): si es True no se regenera el documento cuando ni su
+            contenido ni la imagen embebida han cambiado.
+        flow (None | str | dict | FlowModel): flujos a documentar (ver `modelo.resolve_flow`).
 
     Returns:
         str: ruta del documento DOCX generado
     """
-    pkg_dir = os.path.dirname(__file__)
-    if output_dir is None:
-        output_dir = os.path.join(pkg_dir, "output")
-    os.makedirs(output_dir, exist_ok=True)
+    model = resolve_flow(flow)
+    default_img_path, doc_path = _output_paths(output_dir)
+    manifest = BuildManifest.load(os.path.dirname(doc_path)) if incremental else None
 
-    doc_path = os.path.join(output_dir, "Esquema_Flujos_GestorMapeos_ERP_Expedientes.docx")
-    
     if img_path is None:
-        img_path = os.path.join(output_dir, "diagram_expedientes_flow.png")
-        # Si no existe la imagen, crearla primero
+        img_path = default_img_path
+        # Si no existe la imagen, crearla primero y embeberla sin volver a leerla
         if not os.path.exists(img_path):
-            _generate_png_diagram(img_path)
-    
-    return _generate_word_document(doc_path, img_path)
+            png_bytes = _write_png(img_path, model)
+            if manifest is not None:
+                manifest.record(img_path, _png_fingerprint(model), sha256_of(png_bytes))
+            img_path = png_bytes
+
+    if manifest is None:
+        return _generate_word_document(doc_path, img_path, model)
+
+    if isinstance(img_path, str):
+        png_digest = manifest.digest(img_path)
+    else:
+        png_bytes = _read_image_bytes(img_path)
+        png_digest, img_path = sha256_of(png_bytes), png_bytes
+    key = _docx_fingerprint(png_digest, model)
+    build_artifact(manifest, doc_path, key,
+                   lambda path: _generate_word_document(path, img_path, model))
+    manifest.save()
+    return doc_path
 
 
-def generate_diagram(output_dir=None):
+def _read_image_bytes(image):
+    if isinstance(image, str):
+        with open(image, "rb") as fh:
+            return fh.read()
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    image.seek(0)
+    return image.read()
+
+
+@traced("generate_diagram")
+def generate_diagram(output_dir=None, incremental=False, in_memory=False, flow=None,
+                     backend="png", preset=None, mode=None):
     """Genera la imagen PNG y el documento DOCX.
 
+    El PNG se codifica una sola vez y el mismo buffer se embebe en el DOCX, sin
+    releer el fichero escrito.
+
     Args:
         output_dir (str): carpeta donde guardar los resultados. Si es None, se usa
             el subdirectorio `output` dentro del paquete.
+        incremental (bool): si es True sólo se regeneran los artefactos cuyas
+            entradas han cambiado (ver `incremental.BuildManifest`). Un cambio que
+            sólo afecta al DOCX no vuelve a rasterizar el PNG.
+        in_memory (bool): si es True no se escribe nada en disco y se devuelven
+            los contenidos en lugar de las rutas.
+        flow (None | str | dict | FlowModel): flujos a dibujar y documentar. Si es
+            None se usan los flujos GestorMapeos -> ERP Académico -> Expedientes.
+        backend (str): 'png' o 'svg'. Con 'svg' la imagen se escribe como SVG; el
+            DOCX sigue embebiendo un PNG (Word no admite SVG sin raster alternativo),
+            que se genera sólo en memoria.
+        preset (str): perfil de codificación de la imagen (ver `codificacion`). Con
+            'webp' el DOCX embebe también un PNG generado en memoria.
+        mode (str): modo de render de la imagen raster (ver `modos`); el DOCX embebe
+            la misma imagen.
 
     Returns:
-        tuple: (img_path, doc_path)
+        tuple: (img_path, doc_path), o (img_bytes, docx_bytes) con `in_memory=True`
     """
-    pkg_dir = os.path.dirname(__file__)
-    if output_dir is None:
-        output_dir = os.path.join(pkg_dir, "output")
-    os.makedirs(output_dir, exist_ok=True)
+    model = resolve_flow(flow)
+    preset = encoding_preset(mode, preset)
+    if not _embeds_in_docx(backend, preset):
+        return _generate_separate_diagram(output_dir, incremental, in_memory, model, backend,
+                                          preset, mode)
+    if in_memory:
+        png_bytes = render_png_bytes(model, preset, mode)
+        return png_bytes, render_word_bytes(png_bytes, model)
 
-    img_path = os.path.join(output_dir, "diagram_expedientes_flow.png")
-    doc_path = os.path.join(output_dir, "Esquema_Flujos_GestorMapeos_ERP_Expedientes.docx")
+    img_path, doc_path = _output_paths(output_dir, backend, preset)
 
-    # Generar la imagen PNG
-    img_path = _generate_png_diagram(img_path)
-    
-    # Generar el documento Word
-    doc_path = _generate_word_document(doc_path, img_path)
+    if not incremental:
+        # Generar la imagen PNG
+        png_bytes = _write_png(img_path, model, preset, mode)
+
+        # Generar el documento Word reutilizando el PNG ya codificado
+        _generate_word_document(doc_path, png_bytes, model)
+
+        return img_path, doc_path
+
+    manifest = BuildManifest.load(os.path.dirname(img_path))
+    rendered = {}
+
+    def build_png(path):
+        rendered["png"] = _write_png(path, model, preset, mode)
+        return rendered["png"]
 
+    changed = build_artifact(manifest, img_path, _png_fingerprint(model, backend, preset, mode),
+                             build_png)
+    key = _docx_fingerprint(manifest.digest(img_path), model)
+    changed |= build_artifact(
+        manifest, doc_path, key,
+        lambda path: _generate_word_document(path, rendered.get("png", img_path), model))
+    if changed:
+        manifest.save()
     return img_path, doc_path
 
 
-def main():
-    img, doc = generate_diagram()
+def _generate_separate_diagram(output_dir, incremental, in_memory, model, backend, preset,
+                               mode=None):
+    """`generate_diagram` cuando Word no admite la imagen (SVG, WebP): el DOCX lleva un PNG.
+
+    El PNG se dibuja en el mismo modo; con WebP se codifica la imagen ya dibujada.
+    """
+    get_backend(backend)
+    get_mode(mode)
+    rendered = {}
+
+    def write_image(path):
+        if backend == "svg":
+            return _write_svg(path, model)
+        rendered["img"] = _render_png_image(model, mode)
+        data = _encode_png(rendered["img"], preset, model, mode)
+        if path is not None:
+            _write_bytes(path, data)
+        return data
+
+    def docx_png():
+        return _docx_png(model, mode, rendered.get("img"))
+
+    if in_memory:
+        image = render_svg_bytes(model) if backend == "svg" else write_image(None)
+        return image, render_word_bytes(docx_png(), model)
+
+    img_path, doc_path = _output_paths(output_dir, backend, preset)
+    if not incremental:
+        write_image(img_path)
+        _generate_word_document(doc_path, docx_png(), model)
+        return img_path, doc_path
+
+    manifest = BuildManifest.load(os.path.dirname(img_path))
+    changed = build_artifact(manifest, img_path, _png_fingerprint(model, backend, preset, mode),
+                             write_image)
+    # El PNG embebido no está en disco: la huella del DOCX usa la de sus entradas
+    key = _docx_fingerprint(_png_fingerprint(model, "png", _docx_preset(mode), mode), model)
+    changed |= build_artifact(
+        manifest, doc_path, key,
+        lambda path: _generate_word_document(path, docx_png(), model))
+    if changed:
+        manifest.save()
+    return img_path, doc_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m CreateExpediente",
+        description="Genera el diagrama PNG y el documento Word de los flujos.")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="directorio de salida (por defecto, output/ dentro del paquete)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="no regenerar los ficheros cuyas entradas no han cambiado")
+    parser.add_argument("--flow", default=None,
+                        help="fichero JSON con el modelo de flujos (por defecto, el integrado)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="png",
+                        help="formato de la imagen: png (raster) o svg (vectorial)")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default=None,
+                        help=f"perfil de codificación de la imagen (por defecto, {DEFAULT_PRESET})")
+    parser.add_argument("--mode", choices=sorted(MODES), default=None,
+                        help="modo de render de la imagen: draft (previsualización rápida), "
+                             "normal (por defecto), hq o hq4 (sobremuestreado 2x/4x)")
+    parser.add_argument("--profile", action="store_true",
+                        help="imprime el tiempo de cada etapa y los contadores de la generación")
+    parser.add_argument("--profile-json", default=None,
+                        help="guarda el desglose por etapas en este fichero JSON (implica --profile)")
+    parser.add_argument("--profile-stats", default=None,
+                        help="guarda un perfil de cProfile en este fichero (implica --profile)")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="muestra mensajes de diagnóstico (-vv para depuración)")
+    subparsers = parser.add_subparsers(dest="command")
+    batch = subparsers.add_parser("batch", help="genera muchos diagramas en paralelo")
+    batch.add_argument("jobs", help="fichero JSON con la lista de trabajos")
+    batch.add_argument("-j", "--workers", type=int, default=None,
+                       help="número de procesos (por defecto, uno por CPU)")
+    batch.add_argument("--summary", default=None,
+                       help="fichero JSON donde guardar el resumen del lote")
+    presets = subparsers.add_parser(
+        "presets", help="mide el tiempo y el tamaño de cada perfil de codificación")
+    presets.add_argument("--json", default=None, help="fichero JSON donde guardar el informe")
+    bench = subparsers.add_parser("bench", help="mide tiempos y memoria de la generación")
+    bench.add_argument("--sizes", default="25,100",
+                       help="endpoints de los modelos sintéticos, separados por comas")
+    bench.add_argument("--repeat", type=int, default=3, help="ejecuciones por caso en caliente")
+    bench.add_argument("--cold-repeat", type=int, default=2,
+                       help="ejecuciones por caso en frío")
+    bench.add_argument("--json", default=None, help="fichero JSON donde guardar los resultados")
+    bench.add_argument("--baseline", default=None,
+                       help="resultados de referencia; se falla si se superan")
+    bench.add_argument("--margin", type=float, default=0.25,
+                       help="exceso relativo tolerado sobre la referencia (0.25 = 25%%)")
+    variants = subparsers.add_parser(
+        "variants", help="genera el diagrama en varios temas, idiomas y resoluciones")
+    variants.add_argument("--themes", default="light",
+                          help="temas separados por comas (light, high-contrast)")
+    variants.add_argument("--languages", default="es",
+                          help="idiomas separados por comas (es, en)")
+    variants.add_argument("--dpi", default="96",
+                          help="resoluciones separadas por comas (96 = pantalla, 300 = impresión)")
+    watch = subparsers.add_parser(
+        "watch", help="regenera PNG y DOCX cada vez que cambia el fichero de --flow, "
+                      "rehaciendo sólo lo que cambia")
+    watch.add_argument("--interval", type=float, default=0.25,
+                       help="segundos entre comprobaciones de los ficheros")
+    watch.add_argument("--debounce", type=float, default=0.2,
+                       help="segundos sin cambios antes de regenerar")
+    openapi = subparsers.add_parser(
+        "openapi", help="genera el diagrama con los endpoints de especificaciones OpenAPI "
+                        "(JSON o YAML)")
+    openapi.add_argument("specs", nargs="+", metavar="[SISTEMA=]FICHERO",
+                         help="especificación; SISTEMA es la clave del sistema del modelo al "
+                              "que pertenece (por defecto, el nombre del fichero)")
+    openapi.add_argument("--tags", default=None, help="sólo estas etiquetas, separadas por comas")
+    openapi.add_argument("--methods", default=None,
+                         help="sólo estos métodos HTTP, separados por comas")
+    openapi.add_argument("--paths", default=None,
+                         help="sólo las rutas que encajan con estos patrones, separados por "
+                              "comas (p. ej. '/api/v1/expedientes*')")
+    openapi.add_argument("--group-by", choices=("tag", "path"), default=None,
+                         help="un sistema por etiqueta o por primer segmento de la ruta")
+    openapi.add_argument("--standalone", action="store_true",
+                         help="sólo las APIs importadas, sin partir de --flow ni del modelo integrado")
+    openapi.add_argument("--save-flow", default=None,
+                         help="guarda el modelo resultante en este fichero JSON (para --flow)")
+    serve = subparsers.add_parser(
+        "serve", help="servicio residente que devuelve PNG, SVG o DOCX por HTTP local")
+    serve.add_argument("--host", default="127.0.0.1", help="dirección TCP (por defecto, localhost)")
+    serve.add_argument("--port", type=int, default=8765, help="puerto TCP")
+    serve.add_argument("--socket", default=None,
+                       help="ruta de un socket Unix (en lugar de TCP)")
+    serve.add_argument("-j", "--workers", type=int, default=None,
+                       help="hilos de render (por defecto, uno por CPU)")
+    serve.add_argument("--cache-size", type=int, default=128,
+                       help="número máximo de resultados en caché")
+    args = parser.parse_args(argv)
+    level = {0: logging.WARNING, 1: logging.INFO}.get(args.verbose, logging.DEBUG)
+    logging.basicConfig(level=level, format="%(levelname)s %(name)s: %(message)s")
+
+    if args.command == "batch":
+        from . import lote
+        summary = lote.run_batch(lote.load_jobs(args.jobs), workers=args.workers,
+                                 progress=lote.print_progress)
+        lote.print_summary(summary)
+        if args.summary:
+            with open(args.summary, "w", encoding="utf-8") as fh:
+                json.dump(summary, fh, indent=2)
+        return 1 if summary["failed"] else 0
+
+    if args.command == "serve":
+        from .servidor import serve as serve_forever
+        try:
+            serve_forever(args.host, args.port, args.socket, args.workers, args.cache_size)
+        except OSError as exc:  # puerto ocupado, socket en uso...
+            parser.error(str(exc))
+        return 0
+
+    if args.command == "bench":
+        from . import rendimiento
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+        print(f"{'caso':<34} {'mediana':>12} {'mínimo':>12} {'pico':>14}")
+        results = rendimiento.run_benchmarks(sizes, args.repeat, args.cold_repeat,
+                                             progress=rendimiento.print_progress)
+        if args.json:
+            rendimiento.save_results(results, args.json)
+        if not args.baseline:
+            return 0
+        regressions = rendimiento.compare(results, rendimiento.load_results(args.baseline),
+                                          args.margin)
+        rendimiento.print_regressions(regressions)
+        return 1 if regressions else 0
+
+    if args.command == "variants":
+        from .variantes import expand, write_variants
+        split = lambda value: [item.strip() for item in value.split(",") if item.strip()]
+        try:
+            selected = expand(split(args.themes), split(args.languages),
+                              [int(dpi) for dpi in split(args.dpi)])
+        except ValueError as exc:
+            parser.error(str(exc))
+        output_dir = os.path.dirname(_output_paths(args.output_dir)[0])
+        for path in write_variants(output_dir, selected, args.flow, args.preset, args.backend):
+            print(f"image:{path}")
+        return 0
+
+    if args.command == "watch":
+        from . import vigilancia
+        if not args.flow:
+            parser.error("watch necesita --flow (el fichero JSON del modelo que se edita)")
+        # Por defecto el perfil más rápido de codificar: es una vista previa
+        try:
+            vigilancia.watch(args.flow, args.output_dir, args.preset or "fast", args.mode,
+                             args.interval, args.debounce, report=vigilancia.print_update)
+        except ValueError as exc:
+            parser.error(str(exc))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.command == "presets":
+        from .codificacion import encode_report, print_report
+        model = resolve_flow(args.flow)
+        report = encode_report(_render_png_image(model), exact_colors=_flat_colors(model))
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+        return 0
+
+    flow = args.flow
+    if args.command == "openapi":
+        from .openapi import import_openapi, parse_spec_argument
+        split = lambda value: [item.strip() for item in (value or "").split(",") if item.strip()]
+        specs = [parse_spec_argument(spec) for spec in args.specs]
+        try:
+            flow = import_openapi(specs, None if args.standalone else resolve_flow(args.flow),
+                                  split(args.tags), split(args.methods), split(args.paths),
+                                  args.group_by)
+        except (OSError, ValueError, ImportError) as exc:
+            parser.error(str(exc))
+        if args.save_flow:
+            with open(args.save_flow, "w", encoding="utf-8") as fh:
+                json.dump(flow.to_dict(), fh, indent=2, ensure_ascii=False)
+
+    def generate():
+        return generate_diagram(args.output_dir, incremental=args.incremental, flow=flow,
+                                backend=args.backend, preset=args.preset, mode=args.mode)
+
+    if not (args.profile or args.profile_json or args.profile_stats):
+        img, doc = generate()
+        print(f"image:{img}")
+        print(f"doc:{doc}")
+        return 0
+
+    with profile() as profiler:
+        if args.profile_stats:
+            import cProfile
+            stats = cProfile.Profile()
+            img, doc = stats.runcall(generate)
+            stats.dump_stats(args.profile_stats)
+        else:
+            img, doc = generate()
     print(f"image:{img}")
     print(f"doc:{doc}")
+    profiler.print_report()
+    if args.profile_json:
+        profiler.save_json(args.profile_json)
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Registro de fuentes compartido por todo el proceso.
+
+Evita que cada llamada a `_load_fonts()` vuelva a buscar en disco las fuentes
+candidatas: los directorios de fuentes del sistema se recorren una sola vez, el
+índice resultante (nombre de fichero y familia/estilo -> ruta) se persiste en
+disco y los objetos `FreeTypeFont` ya cargados se guardan en una caché LRU
+acotada con clave (ruta, tamaño).
+
+Funciones públicas:
+- get_registry(): devuelve el registro global del proceso
+- warm_fonts(specs=None): precarga fuentes en la caché
+- invalidate_font_cache(rescan=False): vacía la caché (y opcionalmente el índice)
+"""
+from collections import OrderedDict
+import json
+import os
+import sys
+import threading
+
+from PIL import ImageFont
+
+INDEX_VERSION = 1
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+DEFAULT_MAX_FONTS = 64
+
+
+def _default_font_dirs():
+    """Directorios de fuentes habituales según la plataforma."""
+    home = os.path.expanduser("~")
+    dirs = []
+    extra = os.environ.get("CREATEEXPEDIENTE_FONT_DIRS")
+    if extra:
+        dirs.extend(p for p in extra.split(os.pathsep) if p)
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        dirs.append(os.path.join(windir, "Fonts"))
+        localappdata = os.environ.get("LOCALAPPDATA")
+        if localappdata:
+            dirs.append(os.path.join(localappdata, "Microsoft", "Windows", "Fonts"))
+    elif sys.platform == "darwin":
+        dirs.extend(["/Library/Fonts", "/System/Library/Fonts",
+                     os.path.join(home, "Library", "Fonts")])
+    else:
+        # Mismos directorios que recorre PIL en Linux (XDG_DATA_DIRS/fonts)
+        data_dirs = os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share")
+        dirs.extend(os.path.join(d, "fonts") for d in data_dirs.split(":") if d)
+        data_home = os.environ.get("XDG_DATA_HOME", os.path.join(home, ".local", "share"))
+        dirs.append(os.path.join(data_home, "fonts"))
+        dirs.append(os.path.join(home, ".fonts"))
+    # Quitar duplicados conservando el orden
+    seen = set()
+    return [d for d in dirs if not (d in seen or seen.add(d))]
+
+
+def _default_index_path():
+    """Ruta del índice persistido (en el directorio de caché del usuario)."""
+    cache_dir = os.environ.get("CREATEEXPEDIENTE_CACHE_DIR")
+    if not cache_dir:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+        cache_dir = os.path.join(base, "CreateExpediente")
+    return os.path.join(cache_dir, "font_index.json")
+
+
+class FontRegistry:
+    """Índice de fuentes del sistema y caché LRU de objetos `FreeTypeFont`.
+
+    Args:
+        font_dirs (list): directorios a indexar. Si es None se usan los del sistema.
+        index_path (str): fichero donde persistir el índice. Si es None se usa el
+            directorio de caché del usuario; si es False no se persiste.
+        max_fonts (int): número máximo de fuentes cargadas en memoria.
+    """
+
+    def __init__(self, font_dirs=None, index_path=None, max_fonts=DEFAULT_MAX_FONTS):
+        self.font_dirs = list(font_dirs) if font_dirs is not None else _default_font_dirs()
+        self.index_path = _default_index_path() if index_path is None else index_path
+        self.max_fonts = max_fonts
+        self._lock = threading.RLock()
+        self._index = None
+        self._fonts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # -- índice ---------------------------------------------------------
+    def _dir_signature(self):
+        """Fecha de modificación de cada directorio recorrido (detecta altas/bajas)."""
+        signature = {}
+        for root_dir in self.font_dirs:
+            for dirpath, _dirnames, _filenames in os.walk(root_dir):
+                try:
+                    signature[dirpath] = os.stat(dirpath).st_mtime_ns
+                except OSError:
+                    continue
+        return signature
+
+    def _scan(self, signature):
+        """Recorre los directorios de fuentes y construye el índice."""
+        files = {}
+        families = {}
+        for root_dir in self.font_dirs:
+            for dirpath, _dirnames, filenames in os.walk(root_dir):
+                for filename in sorted(filenames):
+                    if not filename.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    # El primer directorio gana, igual que en la búsqueda de PIL
+                    files.setdefault(filename.lower(), path)
+                    try:
+                        family, style = ImageFont.truetype(path, 10).getname()
+                    except (OSError, IOError, ValueError):
+                        continue
+                    families.setdefault(_family_key(family, style), path)
+        return {"version": INDEX_VERSION, "signature": signature,
+                "files": files, "families": families}
+
+    def _load_persisted(self, signature):
+        if not self.index_path:
+            return None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION or data.get("signature") != signature:
+            return None
+        return data
+
+    def _persist(self, index):
+        if not self.index_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(index, fh)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # La caché en disco es opcional: si no se puede escribir seguimos en memoria
+            pass
+
+    @property
+    def index(self):
+        """Índice de fuentes (se construye o se lee de disco la primera vez)."""
+        with self._lock:
+            if self._index is None:
+                signature = self._dir_signature()
+                index = self._load_persisted(signature)
+                if index is None:
+                    index = self._scan(signature)
+                    self._persist(index)
+                self._index = index
+            return self._index
+
+    def rescan(self):
+        """Fuerza a recorrer de nuevo los directorios y reescribir el índice."""
+        with self._lock:
+            self._index = self._scan(self._dir_signature())
+            self._persist(self._index)
+            return self._index
+
+    # -- búsqueda -------------------------------------------------------
+    def find(self, name):
+        """Resuelve un nombre de fichero de fuente (p. ej. 'arial.ttf') a su ruta.
+
+        Returns:
+            str: ruta de la fuente o None si no está instalada.
+        """
+        if (os.path.isabs(name) or os.sep in name) and os.path.isfile(name):
+            return name
+        return self.index["files"].get(os.path.basename(name).lower())
+
+    def find_family(self, family, style="Regular"):
+        """Resuelve una familia y estilo (p. ej. 'DejaVu Sans', 'Bold') a su ruta."""
+        return self.index["families"].get(_family_key(family, style))
+
+    # -- caché de fuentes -----------------------------------------------
+    def truetype(self, name, size):
+        """Equivalente a `ImageFont.truetype(name, size)` usando índice y caché.
+
+        Raises:
+            OSError: si la fuente no está en el índice (sin buscar de nuevo en disco).
+        """
+        with self._lock:
+            path = self.find(name)
+            if path is None:
+                raise OSError(f"cannot open resource: {name}")
+            key = (path, size)
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+            font = ImageFont.truetype(path, size)
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+            return font
+
+    def load_default(self, size=None):
+        """Fuente por defecto de PIL, cacheada igual que el resto.
+
+        Con `size` la pide a ese tamaño; sin FreeType (o con un Pillow anterior a 10.1)
+        PIL sólo tiene la fuente de mapa de bits, que no se escala.
+        """
+        with self._lock:
+            key = ("<default>", size)
+            font = self._fonts.get(key)
+            if font is None:
+                try:
+                    font = ImageFont.load_default(size) if size is not None else ImageFont.load_default()
+                except TypeError:
+                    font = ImageFont.load_default()
+                self._fonts[key] = font
+            return font
+
+    def warm(self, specs):
+        """Precarga una lista de pares (nombre, tamaño); ignora las que no existan.
+
+        Returns:
+            int: número de fuentes cargadas correctamente.
+        """
+        loaded = 0
+        for name, size in specs:
+            try:
+                self.truetype(name, size)
+                loaded += 1
+            except (OSError, IOError):
+                continue
+        return loaded
+
+    def invalidate(self, rescan=False):
+        """Vacía la caché de fuentes; con `rescan=True` descarta también el índice."""
+        with self._lock:
+            self._fonts.clear()
+            self.hits = self.misses = 0
+            if rescan:
+                self._index = None
+                if self.index_path:
+                    try:
+                        os.remove(self.index_path)
+                    except OSError:
+                        pass
+
+    def cache_info(self):
+        """Estadísticas de la caché: dict con hits, misses, currsize y maxsize."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "currsize": len(self._fonts), "maxsize": self.max_fonts}
+
+
+def _family_key(family, style):
+    return f"{(family or '').strip().lower()}|{(style or 'Regular').strip().lower()}"
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Devuelve el registro de fuentes global del proceso."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = FontRegistry()
+    return _registry
+
+
+def warm_fonts(specs=None):
+    """Precarga fuentes en la caché del proceso.
+
+    Args:
+        specs (list): pares (nombre, tamaño). Si es None se precargan las fuentes
+            que usa el diagrama.
+
+    Returns:
+        int: número de fuentes disponibles tras la precarga.
+    """
+    if specs is None:
+        from .diagrama import _load_fonts
+        _load_fonts()
+        return get_registry().cache_info()["currsize"]
+    return get_registry().warm(specs)
+
+
+def invalidate_font_cache(rescan=False):
+    """Vacía la caché de fuentes del proceso (y el índice si `rescan=True`)."""
+    get_registry().invalidate(rescan=rescan)
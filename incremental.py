@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Construcción incremental direccionada por contenido.
+
+Cada artefacto (PNG, DOCX) tiene una huella: el hash de todo lo que influye en
+su contenido (código que lo dibuja, constantes, fuentes, versiones de
+librerías y, para el DOCX, el contenido del PNG embebido). Las huellas se
+guardan en un manifiesto dentro del directorio de salida; si la huella coincide
+y el fichero sigue intacto, no se vuelve a generar.
+
+Funciones públicas:
+- fingerprint(*parts): hash estable de una lista de componentes
+- BuildManifest.load(output_dir): manifiesto del directorio de salida
+- build_artifact(manifest, path, key, render): genera `path` sólo si ha cambiado
+"""
+import hashlib
+import inspect
+import json
+import os
+
+MANIFEST_NAME = ".build_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def fingerprint(*parts):
+    """Hash SHA-256 de los componentes dados (str, bytes o estructuras JSON)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, str):
+            data = part.encode("utf-8")
+        else:
+            data = json.dumps(part, sort_keys=True, default=repr).encode("utf-8")
+        # Prefijo de longitud para que ("ab", "c") y ("a", "bc") no colisionen
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def source_of(obj):
+    """Código fuente de una función o módulo (o su repr si no está disponible)."""
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return repr(obj)
+
+
+def font_signature(fonts):
+    """Ruta, tamaño y fecha de modificación de cada fuente cargada."""
+    signature = []
+    for font in fonts:
+        path = getattr(font, "path", None)
+        entry = [str(path), getattr(font, "size", None)]
+        if isinstance(path, str):
+            try:
+                stat = os.stat(path)
+                entry.extend([stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                pass
+        signature.append(entry)
+    return signature
+
+
+def sha256_of(data):
+    """SHA-256 de un contenido ya en memoria."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path):
+    """SHA-256 del contenido de un fichero."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """Huellas de los artefactos generados en un directorio de salida."""
+
+    def __init__(self, path, artifacts=None):
+        self.path = path
+        self.artifacts = artifacts or {}
+
+    @classmethod
+    def load(cls, output_dir):
+        """Lee el manifiesto de `output_dir` (vacío si no existe o está dañado)."""
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get("artifacts", {}))
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": MANIFEST_VERSION, "artifacts": self.artifacts}, fh,
+                      indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _entry_matches_file(self, entry, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+
+    def is_fresh(self, path, key):
+        """True si `path` se generó con la huella `key` y no se ha tocado desde entonces."""
+        entry = self.artifacts.get(os.path.basename(path))
+        return bool(entry) and entry.get("key") == key and self._entry_matches_file(entry, path)
+
+    def digest(self, path):
+        """Hash del contenido de `path`, reutilizando el del manifiesto si sigue vigente."""
+        entry = self.artifacts.get(os.path.basename(path))
+        if entry and self._entry_matches_file(entry, path):
+            return entry["sha256"]
+        return file_digest(path)
+
+    def record(self, path, key, sha256=None):
+        """Anota que `path` se acaba de generar con la huella `key`."""
+        stat = os.stat(path)
+        self.artifacts[os.path.basename(path)] = {
+            "key": key,
+            "sha256": sha256 or file_digest(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+
+def build_artifact(manifest, path, key, render):
+    """Genera `path` con `render(path)` sólo si su huella ha cambiado.
+
+    Si `render` devuelve los bytes escritos, el hash se calcula sobre ellos en vez
+    de volver a leer el fichero.
+
+    Returns:
+        bool: True si se ha regenerado, False si se ha reutilizado.
+    """
+    if manifest.is_fresh(path, key):
+        return False
+    written = render(path)
+    digest = sha256_of(written) if isinstance(written, (bytes, bytearray)) else None
+    manifest.record(path, key, digest)
+    return True
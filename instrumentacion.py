@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Instrumentación de la generación: tramos (spans) por etapa, contadores y ganchos.
+
+Las etapas de la generación (carga de fuentes, layout, cajas, flechas,
+codificación, montaje y guardado del DOCX...) se marcan con `span(nombre)` o con
+el decorador `traced(nombre)`, y las magnitudes (medidas de texto, bytes
+escritos...) con `count(nombre, valor)`. Sin ganchos registrados todo esto se
+reduce a comprobar una lista vacía: no se toma ningún tiempo.
+
+Un gancho es cualquier objeto con la interfaz de `Hooks`; `StageProfiler` es el
+que usa `--profile` para acumular tiempos por etapa y contadores.
+
+Funciones públicas:
+- add_hook(hook), remove_hook(hook), enabled(): registro de ganchos
+- span(name), traced(name), count(name, value): puntos de instrumentación
+- profile(): context manager que registra un `StageProfiler` y lo devuelve
+"""
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+_hooks = []
+_local = threading.local()
+
+
+class Hooks:
+    """Interfaz de los ganchos; las subclases redefinen sólo lo que necesiten."""
+
+    def on_span_start(self, path):
+        """Empieza la etapa `path` (nombres anidados separados por '/')."""
+
+    def on_span_end(self, path, seconds):
+        """Termina la etapa `path` tras `seconds` segundos."""
+
+    def on_count(self, name, value):
+        """Suma `value` al contador `name`."""
+
+
+def add_hook(hook):
+    """Registra un gancho (ver `Hooks`) para todo el proceso."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def enabled():
+    """True si hay algún gancho registrado (para evitar medir lo que nadie escucha)."""
+    return bool(_hooks)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self.name)
+        self.path = "/".join(stack)
+        for hook in list(_hooks):
+            hook.on_span_start(self.path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _local.stack.pop()
+        for hook in list(_hooks):
+            hook.on_span_end(self.path, seconds)
+        return False
+
+
+def span(name):
+    """Context manager que mide la etapa `name` (anidada en la etapa en curso)."""
+    if not _hooks:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def traced(name):
+    """Decorador: cada llamada a la función es una etapa `name`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Suma `value` al contador `name` en todos los ganchos."""
+    if not _hooks:
+        return
+    for hook in list(_hooks):
+        hook.on_count(name, value)
+
+
+class StageProfiler(Hooks):
+    """Gancho que acumula llamadas y tiempo por etapa, y los contadores."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+
+    def on_span_start(self, path):
+        # Se registra al empezar para conservar el orden de ejecución (padre antes que hijos)
+        with self._lock:
+            self.spans.setdefault(path, {"calls": 0, "seconds": 0.0})
+
+    def on_span_end(self, path, seconds):
+        with self._lock:
+            stats = self.spans[path]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+
+    def on_count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """Resumen: dict con spans {ruta: {calls, seconds}} y counters {nombre: valor}."""
+        with self._lock:
+            return {"spans": {path: dict(stats) for path, stats in self.spans.items()},
+                    "counters": dict(self.counters)}
+
+    def save_json(self, path):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.report(), fh, indent=2)
+
+    def print_report(self):
+        """Imprime el desglose por etapas (en árbol, con % sobre su raíz) y los contadores."""
+        report = self.report()
+        print(f"{'etapa':<44} {'llamadas':>8} {'ms':>10} {'%':>6}")
+        for path, stats in report["spans"].items():
+            root = report["spans"].get(path.split("/")[0], stats)
+            share = 100.0 * stats["seconds"] / root["seconds"] if root["seconds"] else 100.0
+            label = "  " * path.count("/") + path.rsplit("/", 1)[-1]
+            print(f"{label:<44} {stats['calls']:>8} {stats['seconds'] * 1000:>10.1f} "
+                  f"{share:>6.1f}")
+        for name in sorted(report["counters"]):
+            print(f"{name:<44} {report['counters'][name]:>8}")
+
+
+@contextmanager
+def profile():
+    """Registra un `StageProfiler` mientras dura el bloque y lo devuelve."""
+    profiler = StageProfiler()
+    add_hook(profiler)
+    try:
+        yield profiler
+    finally:
+        remove_hook(profiler)
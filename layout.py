@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""Motor de layout por capas (estilo Sugiyama) para `modelo.FlowModel`.
+
+Fases, todas casi lineales en nodos + aristas para que diagramas con cientos de
+endpoints se calculen en milisegundos:
+
+1. Eliminación de ciclos: DFS iterativo; las aristas de retroceso se invierten
+   sólo para el layout (la flecha se sigue dibujando hacia su destino real).
+2. Asignación de capas: camino más largo en orden topológico. Los nodos sin
+   aristas van a la columna más habitual de su sistema (o a una columna nueva si
+   ningún nodo del sistema tiene aristas); si son muchos, se reparten en varias
+   columnas para que el diagrama no sea una única tira.
+3. Nodos ficticios en las aristas que saltan varias capas.
+4. Orden dentro de cada capa: baricentros con barridos alternos, conservando el
+   orden con menos cruces (contados con un árbol de Fenwick, O(E log V)).
+5. Coordenada vertical: cada nodo busca la media de sus vecinos respetando el
+   orden y la separación mínima, resuelto con regresión isotónica (PAVA, O(n)).
+6. Enrutado: polilíneas con puertos repartidos en los laterales de cada caja.
+
+Funciones públicas:
+- compute_layout(model, node_size=None): devuelve un `Layout`
+"""
+from collections import namedtuple
+import math
+
+Layout = namedtuple("Layout", "width height boxes routes layers legend_y")
+Route = namedtuple("Route", "edge points label_pos index")  # index: posición en model.edges
+
+MARGIN_X = 100       # margen izquierdo y derecho
+LAYER_GAP = 160      # separación horizontal entre columnas
+NODE_GAP = 40        # separación vertical mínima entre cajas de una columna
+TOP = 150            # espacio reservado para el título
+LEGEND_GAP = 170     # distancia entre la última caja y la leyenda
+BOTTOM = 150         # espacio bajo la leyenda
+DUMMY_HEIGHT = 24    # alto de los nodos ficticios de las aristas largas
+LEGEND_ITEM_WIDTH = 200
+MIN_WIDTH = 1000
+COLUMN_NODES = 12    # cajas sin aristas por columna, como mínimo, antes de abrir otra
+
+
+def legend_width(n_items):
+    """Borde derecho del panel de leyenda para `n_items` sistemas."""
+    return 80 + LEGEND_ITEM_WIDTH * n_items + 40
+
+
+def _remove_cycles(n, out_edges):
+    """Devuelve el conjunto de índices de arista que hay que invertir (DFS iterativo)."""
+    reversed_edges = set()
+    state = [0] * n  # 0 = sin visitar, 1 = en la pila, 2 = terminado
+    for root in range(n):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(out_edges[root]))]
+        while stack:
+            node, edges = stack[-1]
+            advanced = False
+            for edge_index, target in edges:
+                if state[target] == 1:
+                    reversed_edges.add(edge_index)
+                elif state[target] == 0:
+                    state[target] = 1
+                    stack.append((target, iter(out_edges[target])))
+                    advanced = True
+                    break
+            if not advanced:
+                state[node] = 2
+                stack.pop()
+    return reversed_edges
+
+
+def _column_capacity(members, sizes):
+    """Cajas por columna de un sistema: las que quepan en un bloque más o menos cuadrado."""
+    w = max(sizes[v][0] for v in members)
+    h = max(sizes[v][1] for v in members)
+    rows = math.ceil(math.sqrt(len(members) * (w + LAYER_GAP) / (h + NODE_GAP)))
+    return max(COLUMN_NODES, rows)
+
+
+def _assign_layers(n, dag_edges, node_systems, sizes):
+    """Capa de cada nodo por el camino más largo desde las fuentes (Kahn)."""
+    succs = [[] for _ in range(n)]
+    indegree = [0] * n
+    connected = [False] * n
+    for u, v in dag_edges:
+        succs[u].append(v)
+        indegree[v] += 1
+        connected[u] = connected[v] = True
+    layer = [0] * n
+    queue = [v for v in range(n) if indegree[v] == 0]
+    head = 0
+    while head < len(queue):
+        u = queue[head]
+        head += 1
+        for v in succs[u]:
+            if layer[u] + 1 > layer[v]:
+                layer[v] = layer[u] + 1
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                queue.append(v)
+
+    # Nodos aislados: a la columna más frecuente de su sistema; los sistemas sin
+    # ninguna arista (p. ej. APIs importadas) ocupan columnas propias a la derecha
+    # de las usadas, en lugar de apilarse todos en la primera. Cuando una columna
+    # llega a su capacidad, los siguientes pasan a otra del sistema o a una nueva:
+    # cientos de endpoints importados forman un bloque y no una tira de 80000 px
+    system_layers = {}
+    members = {}
+    for v in range(n):
+        members.setdefault(node_systems[v], []).append(v)
+        if connected[v]:
+            counts = system_layers.setdefault(node_systems[v], {})
+            counts[layer[v]] = counts.get(layer[v], 0) + 1
+    next_layer = max((layer[v] for v in range(n) if connected[v]), default=-1) + 1
+    capacities = {}
+    for v in range(n):
+        if not connected[v]:
+            system = node_systems[v]
+            capacity = capacities.get(system)
+            if capacity is None:
+                capacity = capacities[system] = _column_capacity(members[system], sizes)
+            counts = system_layers.setdefault(system, {})
+            free = [k for k in counts if counts[k] < capacity]
+            if free:
+                layer[v] = max(free, key=lambda k: (counts[k], -k))
+            else:
+                layer[v] = next_layer
+                next_layer += 1
+            counts[layer[v]] = counts.get(layer[v], 0) + 1
+    return layer
+
+
+def _count_crossings(upper_pos, lower_pos, edges):
+    """Cruces entre dos capas consecutivas (acumulador de Barth-Mutzel-Jünger)."""
+    if len(edges) < 2:
+        return 0
+    pairs = sorted((upper_pos[u], lower_pos[v]) for u, v in edges)
+    size = max(p for _, p in pairs) + 1
+    tree = [0] * (size + 1)
+    crossings = 0
+    seen = 0
+    for _, p in pairs:
+        # Aristas ya vistas que terminan estrictamente más abajo -> cruzan
+        i = p + 1
+        not_greater = 0
+        while i > 0:
+            not_greater += tree[i]
+            i -= i & -i
+        crossings += seen - not_greater
+        i = p + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+        seen += 1
+    return crossings
+
+
+def _total_crossings(layers, between):
+    total = 0
+    for i in range(len(layers) - 1):
+        upper = {v: k for k, v in enumerate(layers[i])}
+        lower = {v: k for k, v in enumerate(layers[i + 1])}
+        total += _count_crossings(upper, lower, between[i])
+    return total
+
+
+def _order_layers(layers, preds, succs, between, sweeps):
+    """Minimiza cruces con la heurística del baricentro."""
+    best = [list(layer) for layer in layers]
+    best_crossings = _total_crossings(best, between)
+    current = [list(layer) for layer in layers]
+
+    def reorder(layer_index, neighbours, reference):
+        position = {v: k for k, v in enumerate(current[reference])}
+        keyed = []
+        for k, v in enumerate(current[layer_index]):
+            adjacent = neighbours[v]
+            if adjacent:
+                key = sum(position[u] for u in adjacent) / len(adjacent)
+            else:
+                key = k  # sin vecinos: conserva su posición relativa
+            keyed.append((key, k, v))
+        keyed.sort()
+        current[layer_index] = [v for _, _, v in keyed]
+
+    for sweep in range(sweeps):
+        if best_crossings == 0:
+            break
+        if sweep % 2 == 0:
+            for i in range(1, len(current)):
+                reorder(i, preds, i - 1)
+        else:
+            for i in range(len(current) - 2, -1, -1):
+                reorder(i, succs, i + 1)
+        crossings = _total_crossings(current, between)
+        if crossings < best_crossings:
+            best_crossings = crossings
+            best = [list(layer) for layer in current]
+    return best
+
+
+def _place(order, heights, desired, weights, gap):
+    """Tops que minimizan sum w·(top - deseado)² con el orden y la separación dados.
+
+    Con z_i = top_i - offset_i la restricción top_{i+1} >= top_i + h_i + gap pasa a
+    ser z no decreciente: es una regresión isotónica, resuelta con PAVA.
+    """
+    offsets = []
+    acc = 0.0
+    for v in order:
+        offsets.append(acc)
+        acc += heights[v] + gap
+    blocks = []  # [suma_w, suma_wz, número de elementos]
+    for k, v in enumerate(order):
+        w = weights[v]
+        blocks.append([w, w * (desired[v] - offsets[k]), 1])
+        while len(blocks) > 1 and (blocks[-2][1] * blocks[-1][0]
+                                   > blocks[-1][1] * blocks[-2][0]):
+            w2, s2, c2 = blocks.pop()
+            blocks[-1][0] += w2
+            blocks[-1][1] += s2
+            blocks[-1][2] += c2
+    tops = {}
+    k = 0
+    for w, s, count in blocks:
+        z = s / w
+        for _ in range(count):
+            v = order[k]
+            tops[v] = z + offsets[k]
+            k += 1
+    return tops
+
+
+def _assign_y(layers, heights, preds, succs, sweeps):
+    top = {}
+    for layer in layers:
+        acc = 0.0
+        for v in layer:
+            top[v] = acc
+            acc += heights[v] + NODE_GAP
+
+    def sweep(indices, neighbours_of):
+        for i in indices:
+            desired = {}
+            weights = {}
+            for v in layers[i]:
+                neighbours = neighbours_of(v)
+                if neighbours:
+                    centre = sum(top[u] + heights[u] / 2 for u in neighbours) / len(neighbours)
+                    desired[v] = centre - heights[v] / 2
+                    weights[v] = float(len(neighbours))
+                else:
+                    desired[v] = top[v]
+                    weights[v] = 0.01
+            top.update(_place(layers[i], heights, desired, weights, NODE_GAP))
+
+    down = range(1, len(layers))
+    up = range(len(layers) - 2, -1, -1)
+    for _ in range(sweeps):
+        sweep(down, lambda v: preds[v])
+        sweep(up, lambda v: succs[v])
+    # Pasada final equilibrando con los vecinos de ambos lados
+    sweep(range(len(layers)), lambda v: preds[v] + succs[v])
+    return top
+
+
+def compute_layout(model, node_size=None, sweeps=4):
+    """Calcula posiciones, rutas de las aristas y tamaño del lienzo.
+
+    Args:
+        model (FlowModel): modelo a dibujar
+        node_size (callable): node_size(node) -> (w, h). Por defecto, el
+            `box_size` del sistema del nodo.
+        sweeps (int): barridos de las fases de orden y de posición vertical.
+
+    Returns:
+        Layout: width, height, boxes {id: (x, y, w, h)}, routes [Route], layers
+            (ids por columna, sin ficticios) y legend_y.
+    """
+    nodes = model.nodes()
+    if node_size is None:
+        def node_size(node):
+            return model.system(node.system).box_size
+    n_real = len(nodes)
+    index = {node.id: i for i, node in enumerate(nodes)}
+    sizes = [tuple(node_size(node)) for node in nodes]
+
+    # 1. Ciclos
+    out_edges = [[] for _ in range(n_real)]
+    for k, edge in enumerate(model.edges):
+        u, v = index[edge.source], index[edge.target]
+        if u != v:
+            out_edges[u].append((k, v))
+    reversed_edges = _remove_cycles(n_real, out_edges)
+    dag = []  # (índice de arista, u, v) en sentido del layout
+    for k, edge in enumerate(model.edges):
+        u, v = index[edge.source], index[edge.target]
+        if u == v:
+            continue  # los bucles sobre el mismo nodo no se dibujan
+        dag.append((k, v, u) if k in reversed_edges else (k, u, v))
+
+    # 2. Capas
+    layer_of = _assign_layers(n_real, [(u, v) for _, u, v in dag],
+                              [node.system for node in nodes], sizes)
+    n_layers = max(layer_of) + 1 if layer_of else 0
+
+    # 3. Nodos ficticios
+    heights = [h for _, h in sizes]
+    widths = [w for w, _ in sizes]
+    chains = {}
+    preds = [[] for _ in range(n_real)]
+    succs = [[] for _ in range(n_real)]
+    between = [[] for _ in range(max(n_layers - 1, 0))]
+    for k, u, v in dag:
+        chain = [u]
+        for layer in range(layer_of[u] + 1, layer_of[v]):
+            dummy = len(layer_of)
+            layer_of.append(layer)
+            heights.append(DUMMY_HEIGHT)
+            widths.append(0)
+            preds.append([])
+            succs.append([])
+            chain.append(dummy)
+        chain.append(v)
+        for a, b in zip(chain, chain[1:]):
+            succs[a].append(b)
+            preds[b].append(a)
+            between[layer_of[a]].append((a, b))
+        chains[k] = chain
+
+    # Los nodos sin aristas van detrás de los conectados de su columna, para que no
+    # empujen hacia arriba a los que se alinean con sus vecinos
+    layers = [[] for _ in range(n_layers)]
+    for v in sorted(range(len(layer_of)), key=lambda v: not (preds[v] or succs[v])):
+        layers[layer_of[v]].append(v)
+
+    # 4. Orden y 5. posición vertical
+    layers = _order_layers(layers, preds, succs, between, sweeps * 2)
+    top = _assign_y(layers, heights, preds, succs, sweeps)
+
+    # Columnas
+    layer_x = []
+    x = MARGIN_X
+    for layer in layers:
+        layer_x.append(x)
+        x += max((widths[v] for v in layer), default=0) + LAYER_GAP
+    content_right = x - LAYER_GAP if layers else MARGIN_X
+
+    min_top = min(top.values()) if top else 0.0
+    shift = TOP - min_top
+    boxes_by_index = {}
+    for i, layer in enumerate(layers):
+        for v in layer:
+            boxes_by_index[v] = (layer_x[i], round(top[v] + shift), widths[v], heights[v])
+    boxes = {nodes[v].id: boxes_by_index[v] for v in range(n_real)}
+
+    # 6. Rutas: puertos repartidos por los laterales según la altura del vecino
+    out_ports = [[] for _ in range(len(layer_of))]
+    in_ports = [[] for _ in range(len(layer_of))]
+    for k, chain in chains.items():
+        out_ports[chain[0]].append((boxes_by_index[chain[1]][1], k))
+        in_ports[chain[-1]].append((boxes_by_index[chain[-2]][1], k))
+    port_out, port_in = {}, {}
+    for v in range(n_real):
+        x, y, w, h = boxes_by_index[v]
+        for ports, side_x, result in ((out_ports[v], x + w, port_out),
+                                      (in_ports[v], x, port_in)):
+            ports.sort()
+            for slot, (_, k) in enumerate(ports):
+                result[k] = (side_x, y + h * (slot + 1) / (len(ports) + 1))
+
+    routes = []
+    for k, edge in enumerate(model.edges):
+        chain = chains.get(k)
+        if chain is None:
+            continue
+        points = [port_out[k]]
+        for dummy in chain[1:-1]:
+            x, y, _, h = boxes_by_index[dummy]
+            column_width = max((widths[v] for v in layers[layer_of[dummy]]), default=0)
+            points.append((x, y + h / 2))
+            points.append((x + column_width, y + h / 2))
+        points.append(port_in[k])
+        if k in reversed_edges:
+            points.reverse()
+        (x1, y1), (x2, y2) = points[0], points[1]
+        routes.append(Route(edge, points, ((x1 + x2) / 2, (y1 + y2) / 2), k))
+
+    content_bottom = max((y + h for _, y, _, h in boxes.values()), default=TOP)
+    legend_y = round(content_bottom + LEGEND_GAP)
+    width = max(round(content_right + MARGIN_X), legend_width(len(model.systems)) + 60,
+                MIN_WIDTH)
+    height = legend_y + BOTTOM
+    column_ids = [[nodes[v].id for v in layer if v < n_real] for layer in layers]
+    return Layout(width, height, boxes, routes, column_ids, legend_y)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""Backends de dibujo del diagrama.
+
+El dibujo del diagrama (cajas, flechas, etiquetas, leyenda) se expresa con las
+primitivas de `Canvas`; cada backend decide cómo materializarlas:
+
+- PILCanvas: rasteriza sobre una imagen RGB (capa estática y sprites cacheados).
+- SVGCanvas: escribe SVG en streaming directamente en un fichero o buffer, sin
+  crear ningún bitmap.
+
+Todos los backends reciben coordenadas del layout; el tema (`temas`) fija los
+colores y `scale` el número de píxeles por unidad del layout (PNG a más resolución
+o, en SVG, el tamaño de presentación).
+
+Funciones públicas:
+- get_backend(name): clase del backend ('png' o 'svg')
+- arrow_head(points, head_len): triángulo de la punta de una flecha
+"""
+from xml.sax.saxutils import escape, quoteattr
+import abc
+import logging
+import math
+import os
+
+from .capas import (BOX_OUTLINE_WIDTH, BOX_RADIUS, LEGEND_BOX_SIZE, SHADOW_OFFSET, line_width,
+                    paste_box, paste_text, scaled, static_layer)
+from .layout import LEGEND_ITEM_WIDTH, legend_width
+from .metricas import get_metrics
+from .temas import get_theme
+
+logger = logging.getLogger(__name__)
+
+
+def arrow_head(points, head_len=16):
+    """Vértices de la punta de flecha al final de la polilínea `points`."""
+    (x1, y1), (x2, y2) = points[-2], points[-1]
+    angle = math.atan2(y2 - y1, x2 - x1)
+    left = (x2 - head_len * math.cos(angle) + head_len/2 * math.sin(angle),
+            y2 - head_len * math.sin(angle) - head_len/2 * math.cos(angle))
+    right = (x2 - head_len * math.cos(angle) - head_len/2 * math.sin(angle),
+             y2 - head_len * math.sin(angle) + head_len/2 * math.cos(angle))
+    return [(x2, y2), left, right]
+
+
+class Canvas(abc.ABC):
+    """Interfaz de los backends de dibujo.
+
+    Las coordenadas son las del layout; las fuentes son objetos de PIL al tamaño del
+    layout (se usan para medir y, en SVG, para obtener familia, estilo y tamaño).
+
+    Args:
+        width, height (int): tamaño del lienzo en unidades del layout
+        theme (str | temas.Theme): colores. Si es None, el tema por defecto.
+        scale (float): píxeles por unidad del layout
+    """
+
+    extension = None
+
+    def __init__(self, width, height, theme=None, scale=1):
+        self.width = width
+        self.height = height
+        self.theme = get_theme(theme)
+        self.scale = scale
+
+    @abc.abstractmethod
+    def chrome(self, title, legend, legend_y, font_title, font_small):
+        """Fondo, título, línea decorativa y leyenda [(nombre, color)]."""
+
+    @abc.abstractmethod
+    def box(self, x, y, w, h, fill, outline=None):
+        """Caja redondeada con sombra (borde del tema si `outline` es None)."""
+
+    @abc.abstractmethod
+    def text(self, x, y, text, font, fill):
+        """Texto de una línea con la esquina superior izquierda en (x, y)."""
+
+    @abc.abstractmethod
+    def polyline(self, points, fill, width):
+        """Línea quebrada por `points` con el grosor `width`."""
+
+    @abc.abstractmethod
+    def polygon(self, points, fill):
+        """Polígono relleno (la punta de las flechas)."""
+
+    @abc.abstractmethod
+    def rectangle(self, rect, fill, outline, width):
+        """Rectángulo [x0, y0, x1, y1], relleno y con borde opcionales."""
+
+    @abc.abstractmethod
+    def finish(self):
+        """Termina el dibujo y devuelve el resultado propio del backend."""
+
+
+class PILCanvas(Canvas):
+    """Backend raster con PIL; `finish()` devuelve la `PIL.Image.Image`.
+
+    Con `cheap=True` las cajas son rectángulos sin redondear dibujados directamente
+    (sin sprites) y las polilíneas no llevan uniones redondeadas (ver `modos`).
+
+    Con `region=(x0, y0, x1, y1)` (píxeles de la imagen completa) sólo se materializa
+    ese recorte: las primitivas se dibujan desplazadas y `finish()` devuelve el
+    recorte, idéntico a la misma zona de la imagen completa (ver `vigilancia`).
+    """
+
+    extension = ".png"
+
+    def __init__(self, width, height, theme=None, scale=1, cheap=False, region=None):
+        super().__init__(width, height, theme, scale)
+        self.cheap = cheap
+        self.region = region
+        self.offset = region[:2] if region is not None else (0, 0)
+        self.img = None
+        self.draw = None
+        self._fonts = {}
+
+    def _font(self, font):
+        """La fuente a `scale` veces su tamaño (la misma si no hay que escalar).
+
+        La fuente por defecto de PIL no tiene ruta: se pide de nuevo al tamaño escalado.
+        La de mapa de bits (PIL sin FreeType) no se puede escalar y se usa tal cual.
+        """
+        if self.scale == 1:
+            return font
+        scaled_font = self._fonts.get(id(font))
+        if scaled_font is None:
+            from .fuentes import get_registry
+            path = getattr(font, "path", None)
+            size = getattr(font, "size", None)
+            if size is None:
+                logger.warning("La fuente %r no se puede escalar a %s; el texto saldrá a "
+                               "tamaño 1x", font, self.scale)
+                scaled_font = font
+            elif isinstance(path, (str, bytes, os.PathLike)):
+                scaled_font = get_registry().truetype(path, max(1, round(size * self.scale)))
+            else:
+                scaled_font = get_registry().load_default(max(1, round(size * self.scale)))
+            self._fonts[id(font)] = scaled_font
+        return scaled_font
+
+    def _points(self, points):
+        ox, oy = self.offset
+        if self.scale == 1 and not (ox or oy):
+            return points
+        return [(x * self.scale - ox, y * self.scale - oy) for x, y in points]
+
+    def chrome(self, title, legend, legend_y, font_title, font_small):
+        from PIL import ImageDraw
+
+        # Fondo, título y leyenda salen ya dibujados de la caché de capas estáticas
+        self.img = static_layer(self.width, self.height, title, legend, legend_y,
+                                self._font(font_title), self._font(font_small),
+                                self.theme, self.scale, self.region)
+        self.draw = ImageDraw.Draw(self.img)
+
+    def box(self, x, y, w, h, fill, outline=None):
+        if self.cheap:
+            rect = [x, y, x + w, y + h]
+            if self.theme.shadow is not None:
+                self.rectangle([value + SHADOW_OFFSET for value in rect], self.theme.shadow,
+                               None, 1)
+            self.rectangle(rect, fill, outline or self.theme.border, BOX_OUTLINE_WIDTH)
+            return
+        # Caja y sombra: sprite cacheado por (w, h, fill, outline, radius, sombra)
+        paste_box(self.img, x, y, w, h, fill, outline or self.theme.border,
+                  shadow=self.theme.shadow, scale=self.scale, offset=self.offset)
+
+    def text(self, x, y, text, font, fill):
+        # Máscara de texto cacheada: los temas y los renders sucesivos la comparten
+        paste_text(self.img, x * self.scale - self.offset[0], y * self.scale - self.offset[1],
+                   text, self._font(font), fill)
+
+    def polyline(self, points, fill, width):
+        self.draw.line(self._points(points), fill=fill, width=line_width(width, self.scale),
+                       joint=None if self.cheap else "curve")
+
+    def polygon(self, points, fill):
+        self.draw.polygon(self._points(points), fill=fill)
+
+    def rectangle(self, rect, fill, outline, width):
+        (x0, y0), (x1, y1) = self._points([rect[:2], rect[2:]])
+        self.draw.rectangle([x0, y0, x1, y1], fill=fill, outline=outline,
+                            width=line_width(width, self.scale))
+
+    def finish(self):
+        return self.img
+
+
+def _rgb(color):
+    return "#{:02x}{:02x}{:02x}".format(*color[:3])
+
+
+def _num(value):
+    """Número compacto para atributos SVG."""
+    value = round(float(value), 2)
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def _points(points):
+    return " ".join(f"{_num(x)},{_num(y)}" for x, y in points)
+
+
+class SVGCanvas(Canvas):
+    """Backend vectorial que escribe SVG en streaming.
+
+    Args:
+        width, height (int): tamaño del lienzo
+        stream: flujo binario donde escribir (fichero abierto en 'wb' o BytesIO).
+            `finish()` devuelve el propio flujo.
+    """
+
+    extension = ".svg"
+
+    def __init__(self, width, height, stream, theme=None, scale=1):
+        super().__init__(width, height, theme, scale)
+        self.stream = stream
+        self._font_attrs = {}
+        # El contenido va en coordenadas del layout; la escala sólo cambia el tamaño
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{scaled(width, scale)}" '
+            f'height="{scaled(height, scale)}" viewBox="0 0 {width} {height}">\n')
+
+    def _write(self, text):
+        self.stream.write(text.encode("utf-8"))
+
+    def _font(self, font):
+        """Atributos de fuente SVG y ascendente (para pasar de 'top' a línea base)."""
+        attrs = self._font_attrs.get(id(font))
+        if attrs is None:
+            try:
+                family, style = font.getname()
+            except (AttributeError, TypeError):
+                family, style = "sans-serif", "Regular"
+            size = getattr(font, "size", 11)
+            try:
+                ascent = font.getmetrics()[0]
+            except AttributeError:
+                ascent = size
+            weight = ' font-weight="bold"' if "bold" in (style or "").lower() else ""
+            italic = ' font-style="italic"' if "italic" in (style or "").lower() else ""
+            attrs = (f'font-family={quoteattr(f"{family}, sans-serif")} '
+                     f'font-size="{size}"{weight}{italic}', ascent)
+            self._font_attrs[id(font)] = attrs
+        return attrs
+
+    def chrome(self, title, legend, legend_y, font_title, font_small):
+        width, theme = self.width, self.theme
+        self._write(f'<rect width="100%" height="100%" fill="{_rgb(theme.background)}"/>\n')
+        x0, _, x1, _ = get_metrics().bbox(font_title, title)
+        title_x = (width - (x1 - x0)) // 2
+        if theme.title_shadow is not None:
+            self.text(title_x + 2, 22, title, font_title, theme.title_shadow)
+        self.text(title_x, 20, title, font_title, theme.title)
+        self.polyline([(width // 2 - 350, 70), (width // 2 + 350, 70)], theme.rule, 2)
+        self.rectangle([60, legend_y - 15, legend_width(len(legend)), legend_y + 50],
+                       theme.legend_fill, theme.legend_outline, 2)
+        for i, (name, color) in enumerate(legend):
+            legend_x = 80 + LEGEND_ITEM_WIDTH * i
+            self.rectangle([legend_x, legend_y, legend_x + LEGEND_BOX_SIZE,
+                            legend_y + LEGEND_BOX_SIZE], color, theme.border, 2)
+            self.text(legend_x + 40, legend_y + 2, name, font_small, theme.legend_text)
+
+    def box(self, x, y, w, h, fill, outline=None):
+        if self.theme.shadow is not None:
+            self._write(
+                f'<rect x="{_num(x + SHADOW_OFFSET)}" y="{_num(y + SHADOW_OFFSET)}" '
+                f'width="{_num(w)}" height="{_num(h)}" rx="{BOX_RADIUS}" '
+                f'fill="{_rgb(self.theme.shadow)}"/>\n')
+        self._write(
+            f'<rect x="{_num(x)}" y="{_num(y)}" width="{_num(w)}" height="{_num(h)}" '
+            f'rx="{BOX_RADIUS}" fill="{_rgb(fill)}" stroke="{_rgb(outline or self.theme.border)}" '
+            f'stroke-width="{BOX_OUTLINE_WIDTH}"/>\n')
+
+    def text(self, x, y, text, font, fill):
+        attrs, ascent = self._font(font)
+        self._write(f'<text x="{_num(x)}" y="{_num(y + ascent)}" {attrs} fill="{_rgb(fill)}" '
+                    f'xml:space="preserve">{escape(text)}</text>\n')
+
+    def polyline(self, points, fill, width):
+        self._write(f'<polyline points="{_points(points)}" fill="none" stroke="{_rgb(fill)}" '
+                    f'stroke-width="{width}" stroke-linejoin="round"/>\n')
+
+    def polygon(self, points, fill):
+        self._write(f'<polygon points="{_points(points)}" fill="{_rgb(fill)}"/>\n')
+
+    def rectangle(self, rect, fill, outline, width):
+        x0, y0, x1, y1 = rect
+        self._write(f'<rect x="{_num(x0)}" y="{_num(y0)}" width="{_num(x1 - x0)}" '
+                    f'height="{_num(y1 - y0)}" fill="{_rgb(fill)}" stroke="{_rgb(outline)}" '
+                    f'stroke-width="{width}"/>\n')
+
+    def finish(self):
+        self._write("</svg>\n")
+        return self.stream
+
+
+BACKENDS = {"png": PILCanvas, "svg": SVGCanvas}
+
+
+def get_backend(name):
+    """Clase del backend de dibujo por nombre ('png' o 'svg').
+
+    Raises:
+        ValueError: si el backend no existe.
+    """
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"backend desconocido: {name!r} (disponibles: {sorted(BACKENDS)})")
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Generación por lotes de muchos pares diagrama + documento en paralelo.
+
+Cada trabajo es un dict con las claves:
+- output_dir (obligatoria): carpeta de salida del trabajo
+- name: nombre para los informes (por defecto, el de la carpeta)
+- formats: lista con "png" y/o "docx" (por defecto, ambos)
+- incremental: si es True no se regenera lo que no ha cambiado
+- flow: fichero JSON con el modelo de flujos (por defecto, el integrado)
+- backend: "png" (por defecto) o "svg" para la imagen
+- preset: perfil de codificación de la imagen (ver `codificacion`)
+- mode: modo de render de la imagen: "draft", "normal", "hq" o "hq4" (ver `modos`)
+- profile: si es True el resultado incluye el desglose por etapas (ver `instrumentacion`)
+
+Los trabajos se reparten entre un pool de procesos; cada proceso carga las
+fuentes una sola vez al arrancar.
+
+Funciones públicas:
+- load_jobs(path): lee la lista de trabajos de un fichero JSON
+- run_batch(jobs, workers=None, progress=None): ejecuta los trabajos y devuelve un resumen
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+import time
+import traceback
+
+VALID_FORMATS = ("png", "docx")
+
+
+def load_jobs(path):
+    """Lee una lista de trabajos de un fichero JSON.
+
+    El fichero puede contener una lista o un objeto con la clave "jobs". Las rutas
+    relativas se resuelven respecto a la carpeta del fichero.
+
+    Returns:
+        list: trabajos (dicts)
+    """
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    if isinstance(data, dict):
+        data = data.get("jobs", [])
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for job in data:
+        job = dict(job)
+        for key in ("output_dir", "flow"):
+            if job.get(key):
+                job[key] = os.path.join(base_dir, job[key])
+        jobs.append(job)
+    return jobs
+
+
+def _job_name(job, position):
+    if job.get("name"):
+        return job["name"]
+    if job.get("output_dir"):
+        return os.path.basename(os.path.normpath(job["output_dir"]))
+    return f"job-{position}"
+
+
+def _validate_job(job):
+    if not job.get("output_dir"):
+        raise ValueError("el trabajo no tiene 'output_dir'")
+    formats = tuple(job.get("formats") or VALID_FORMATS)
+    unknown = set(formats) - set(VALID_FORMATS)
+    if unknown:
+        raise ValueError(f"formatos desconocidos: {sorted(unknown)}")
+    return formats
+
+
+def _init_worker():
+    """Inicializador de cada proceso: deja las fuentes cargadas para todos sus trabajos."""
+    from .fuentes import warm_fonts
+    warm_fonts()
+
+
+def run_job(job):
+    """Ejecuta un trabajo y devuelve su resultado; nunca lanza excepciones.
+
+    Returns:
+        dict: name, ok, outputs (lista de rutas), error (traza o None) y elapsed (s);
+        con `profile` en el trabajo, también profile (ver `StageProfiler.report`)
+    """
+    if job.get("profile"):
+        from .instrumentacion import profile
+        with profile() as profiler:
+            result = _run_job(job)
+        result["profile"] = profiler.report()
+        return result
+    return _run_job(job)
+
+
+def _run_job(job):
+    from . import diagrama
+
+    start = time.perf_counter()
+    name = job.get("name", "")
+    try:
+        formats = _validate_job(job)
+        output_dir = job["output_dir"]
+        options = {"incremental": bool(job.get("incremental", False)), "flow": job.get("flow")}
+        image_options = {"backend": job.get("backend", "png"), "preset": job.get("preset"),
+                         "mode": job.get("mode")}
+        if "png" in formats and "docx" in formats:
+            outputs = list(diagrama.generate_diagram(output_dir, **image_options, **options))
+        elif "png" in formats:
+            outputs = [diagrama.generate_png_only(output_dir, **image_options, **options)]
+        else:
+            outputs = [diagrama.generate_word_only(output_dir, **options)]
+        return {"name": name, "ok": True, "outputs": outputs, "error": None,
+                "elapsed": time.perf_counter() - start}
+    except Exception:
+        return {"name": name, "ok": False, "outputs": [], "error": traceback.format_exc(),
+                "elapsed": time.perf_counter() - start}
+
+
+def run_batch(jobs, workers=None, progress=None):
+    """Ejecuta una lista de trabajos repartiéndolos entre varios procesos.
+
+    Args:
+        jobs (list): trabajos (ver la documentación del módulo)
+        workers (int): número de procesos. Si es None se usa uno por CPU; con 1 se
+            ejecuta todo en el proceso actual.
+        progress (callable): se llama como progress(done, total, result) al terminar
+            cada trabajo.
+
+    Returns:
+        dict: total, succeeded, failed, elapsed, workers y results (en el orden de `jobs`)
+    """
+    jobs = [dict(job, name=_job_name(job, i)) for i, job in enumerate(jobs)]
+    total = len(jobs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, total or 1))
+
+    start = time.perf_counter()
+    results = [None] * total
+    done = 0
+    if workers == 1:
+        _init_worker()
+        for i, job in enumerate(jobs):
+            results[i] = run_job(job)
+            done += 1
+            if progress:
+                progress(done, total, results[i])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(run_job, job): i for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception:
+                    # El proceso murió (p. ej. sin memoria): se informa como fallo del trabajo
+                    results[i] = {"name": jobs[i]["name"], "ok": False, "outputs": [],
+                                  "error": traceback.format_exc(), "elapsed": 0.0}
+                done += 1
+                if progress:
+                    progress(done, total, results[i])
+
+    failed = sum(1 for r in results if not r["ok"])
+    return {
+        "total": total,
+        "succeeded": total - failed,
+        "failed": failed,
+        "elapsed": time.perf_counter() - start,
+        "workers": workers,
+        "results": results,
+    }
+
+
+def print_progress(done, total, result):
+    """Callback de progreso para la línea de comandos."""
+    status = "ok" if result["ok"] else "ERROR"
+    print(f"[{done}/{total}] {result['name']}: {status} ({result['elapsed']:.2f}s)", flush=True)
+
+
+def print_summary(summary):
+    """Muestra el resumen final y las trazas de los trabajos fallidos."""
+    for result in summary["results"]:
+        if not result["ok"]:
+            print(f"--- {result['name']} ---")
+            print(result["error"].rstrip())
+    print(f"{summary['succeeded']}/{summary['total']} trabajos correctos, "
+          f"{summary['failed']} con errores, {summary['elapsed']:.2f}s "
+          f"con {summary['workers']} procesos")
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Servicio de métricas de texto con caché.
+
+Las medidas de texto (`textbbox`) se repiten entre cajas, entre renders y entre
+trabajos de un lote: los mismos métodos, rutas y etiquetas con las mismas
+fuentes. Aquí se memorizan por (fuente, tamaño, texto) en una caché LRU
+acotada, y se añade el ajuste de líneas largas (URLs) a un ancho máximo.
+
+Funciones públicas:
+- get_metrics(): servicio global del proceso
+- TextMetrics.bbox / size / line_height / measure_many / wrap
+"""
+from collections import OrderedDict
+import re
+import threading
+
+DEFAULT_MAX_ENTRIES = 8192
+
+# Puntos de corte preferidos en URLs y textos: tras '/', '-', '?', '&', '=', '_' o espacio
+_BREAK_RE = re.compile(r"[^/\-?&=_ ]*[/\-?&=_ ]?")
+
+
+def font_key(font):
+    """Identidad estable de una fuente: (ruta, tamaño).
+
+    Las fuentes sin ruta (la de mapa de bits por defecto de PIL) se identifican por
+    el propio objeto: la clave lo mantiene vivo mientras esté en la caché, así que
+    su id() no puede pasar a otra fuente.
+    """
+    return (getattr(font, "path", None) or font, getattr(font, "size", None))
+
+
+class TextMetrics:
+    """Caché LRU de cajas de texto con clave (fuente, tamaño, texto).
+
+    Args:
+        max_entries (int): número máximo de medidas guardadas.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bbox(self, font, text):
+        """Caja (x0, y0, x1, y1) del texto de una línea dibujado en (0, 0).
+
+        Equivale a `ImageDraw.textbbox((0, 0), text, font=font)`.
+        """
+        key = (font_key(font), text)
+        with self._lock:
+            box = self._cache.get(key)
+            if box is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return box
+            self.misses += 1
+        box = tuple(font.getbbox(text))
+        with self._lock:
+            self._cache[key] = box
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return box
+
+    def size(self, font, text):
+        """(ancho, alto) del texto; las líneas vacías miden lo que una 'A'."""
+        x0, y0, x1, y1 = self.bbox(font, text if text.strip() else "A")
+        return x1 - x0, y1 - y0
+
+    def line_height(self, font):
+        """Distancia entre dos líneas consecutivas: ascendente más descendente de la fuente.
+
+        No depende de los glifos de cada línea, así que el interlineado es constante.
+        Las fuentes de mapa de bits sin `getmetrics` usan el alto de una 'A'.
+        """
+        getmetrics = getattr(font, "getmetrics", None)
+        if getmetrics is None:
+            return self.size(font, "A")[1]
+        ascent, descent = getmetrics()
+        return ascent + descent
+
+    def measure_many(self, font, texts):
+        """Mide varias líneas de una vez.
+
+        Returns:
+            list: cajas (x0, y0, x1, y1) en el mismo orden que `texts`
+        """
+        return [self.bbox(font, text) for text in texts]
+
+    def _width(self, font, text):
+        x0, _, x1, _ = self.bbox(font, text)
+        return x1 - x0
+
+    def wrap(self, font, text, max_width):
+        """Parte cada línea de `text` para que no supere `max_width` píxeles.
+
+        Se corta preferentemente tras '/', '-', '?', '&', '=', '_' o espacios; si un
+        fragmento sigue sin caber, se corta por caracteres.
+
+        Returns:
+            list: líneas resultantes (las líneas vacías se conservan)
+        """
+        lines = []
+        for line in text.split("\n"):
+            if not line.strip() or self._width(font, line) <= max_width:
+                lines.append(line)
+                continue
+            current = ""
+            for token in _BREAK_RE.findall(line):
+                if not token:
+                    continue
+                candidate = current + token
+                if self._width(font, candidate.rstrip()) <= max_width:
+                    current = candidate
+                    continue
+                if current:
+                    lines.append(current.rstrip())
+                current = token
+                if self._width(font, current.rstrip()) > max_width:
+                    # Un único fragmento demasiado largo: cortar por caracteres
+                    pieces = self._split_chars(font, current, max_width)
+                    lines.extend(piece.rstrip() for piece in pieces[:-1])
+                    current = pieces[-1]
+            if current:
+                lines.append(current.rstrip())
+        return lines
+
+    def _split_chars(self, font, text, max_width):
+        """Corta `text` por caracteres (búsqueda binaria del mayor prefijo que cabe)."""
+        pieces = []
+        while text:
+            lo, hi = 1, len(text)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self._width(font, text[:mid]) <= max_width:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            pieces.append(text[:lo])
+            text = text[lo:]
+        return pieces
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+    def cache_info(self):
+        """Estadísticas de la caché: dict con hits, misses, currsize y maxsize."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "currsize": len(self._cache), "maxsize": self.max_entries}
+
+
+_metrics = TextMetrics()
+
+
+def get_metrics():
+    """Devuelve el servicio de métricas de texto global del proceso."""
+    return _metrics
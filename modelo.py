@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""Modelo declarativo de los flujos: sistemas, endpoints, aristas y flujos.
+
+Es la única fuente de verdad para el PNG, las listas de endpoints del DOCX y el
+bloque PlantUML. Un modelo se puede construir desde un dict (o un fichero JSON
+con la misma forma que `DEFAULT_FLOW`).
+
+Los nodos del diagrama son los endpoints y, además, los sistemas que no exponen
+ningún endpoint (p. ej. GestorMapeos), que se dibujan como una única caja. Las
+aristas unen identificadores de nodo.
+
+Funciones públicas:
+- default_flow(): modelo con los flujos GestorMapeos -> ERP Académico -> Expedientes
+- load_flow(path): lee un modelo de un fichero JSON
+- resolve_flow(flow): acepta None, una ruta o un FlowModel y devuelve un FlowModel
+- plantuml_code(model): código PlantUML equivalente al diagrama
+- synthetic_flow(n_endpoints): modelo sintético grande (pruebas y benchmarks)
+"""
+from collections import namedtuple
+import json
+
+System = namedtuple("System", "key name color description color_name base_url box_size")
+Endpoint = namedtuple("Endpoint", "key system method path caption summary")
+Edge = namedtuple("Edge", "source target label")
+Step = namedtuple("Step", "text level endpoint")
+Flow = namedtuple("Flow", "name title steps")
+Node = namedtuple("Node", "id system text")
+
+DEFAULT_BOX_SIZE = (450, 100)
+
+DEFAULT_FLOW = {
+    "title": "Flujos: GestorMapeos - ERP Académico - Expedientes",
+    "systems": [
+        {"key": "gestor", "name": "GestorMapeos", "color": "#0E52A0",
+         "description": "Sistema de gestión de mapeos de matrículas",
+         "color_name": "azul oscuro", "box_size": [340, 100]},
+        {"key": "erp", "name": "ERP Académico", "color": "#367EDF",
+         "description": "Sistema de planificación de recursos académicos",
+         "color_name": "azul medio", "base_url": "https://erpacademico.unir.net",
+         "box_size": [450, 100]},
+        {"key": "expedientes", "name": "Expedientes", "color": "#4CAF50",
+         "description": "Sistema de gestión de expedientes académicos",
+         "color_name": "verde", "base_url": "https://expedienteserp.unir.net",
+         "box_size": [590, 140]},
+    ],
+    "endpoints": [
+        {"key": "erp_migrar", "system": "erp", "method": "POST", "path": "/api/v1/migrar",
+         "caption": "API Primera Matrícula",
+         "summary": "Primera migración (crear/actualizar expediente)"},
+        {"key": "erp_ampliacion", "system": "erp", "method": "POST",
+         "path": "/api/v1/migrar/ampliacion", "caption": "API Ampliación",
+         "summary": "Ampliación (no primera matrícula)"},
+        {"key": "exp_crear", "system": "expedientes", "method": "POST",
+         "path": "/api/v1/expedientes-alumnos", "summary": "Crear expediente"},
+        {"key": "exp_actualizar", "system": "expedientes", "method": "PUT",
+         "path": "/api/v1/expedientes-alumnos/{id}/por-integracion",
+         "summary": "Modificar expediente por integración"},
+        {"key": "exp_matricula", "system": "expedientes", "method": "POST",
+         "path": "/api/v1/expedientes-alumnos/matricula-realizada",
+         "summary": "Notificar matrícula realizada"},
+    ],
+    "edges": [
+        {"source": "gestor", "target": "erp_migrar", "label": "Primera Matrícula"},
+        {"source": "erp_migrar", "target": "exp_crear", "label": "Crear Expediente"},
+        {"source": "erp_migrar", "target": "exp_actualizar", "label": "Actualizar Expediente"},
+        {"source": "gestor", "target": "erp_ampliacion", "label": "Ampliación"},
+        {"source": "erp_ampliacion", "target": "exp_matricula", "label": "Matrícula Realizada"},
+    ],
+    "flows": [
+        {"name": "Primera Matrícula", "steps": [
+            {"text": "1. GestorMapeos envía la información de la primera matrícula",
+             "endpoint": "erp_migrar"},
+            {"text": "2. El ERP Académico procesa y guarda la matrícula"},
+            {"text": "3. Si es la PRIMERA matrícula, el ERP puede:"},
+            {"text": "a) Crear un nuevo expediente en Expedientes:", "level": 2,
+             "endpoint": "exp_crear"},
+            {"text": "b) Actualizar un expediente existente:", "level": 2,
+             "endpoint": "exp_actualizar"},
+        ]},
+        {"name": "Ampliación", "title": "Ampliación (No Primera Matrícula)", "steps": [
+            {"text": "1. GestorMapeos envía la información de ampliación",
+             "endpoint": "erp_ampliacion"},
+            {"text": "2. El ERP Académico procesa y guarda la matrícula"},
+            {"text": "3. El ERP notifica a Expedientes que se ha realizado una matrícula:",
+             "endpoint": "exp_matricula"},
+        ]},
+    ],
+}
+
+
+def _parse_color(value):
+    """Acepta '#RRGGBB' o una lista [r, g, b] y devuelve una tupla RGB."""
+    if isinstance(value, str):
+        value = value.lstrip("#")
+        if len(value) != 6:
+            raise ValueError(f"color no válido: #{value}")
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    return tuple(int(c) for c in value)
+
+
+def color_hex(color):
+    """Tupla RGB -> '#RRGGBB'."""
+    return "#{:02X}{:02X}{:02X}".format(*color[:3])
+
+
+class FlowModel:
+    """Sistemas, endpoints, aristas y flujos de un diagrama.
+
+    Los objetos son inmutables en la práctica (namedtuples en tuplas), así que un
+    modelo se puede compartir entre hilos y usar como clave de caché vía `digest()`.
+
+    Raises:
+        ValueError: si una arista, paso o endpoint hace referencia a algo inexistente.
+    """
+
+    def __init__(self, title, systems, endpoints=(), edges=(), flows=()):
+        self.title = title
+        self.systems = tuple(systems)
+        self.endpoints = tuple(endpoints)
+        self.edges = tuple(edges)
+        self.flows = tuple(flows)
+        self._systems = {s.key: s for s in self.systems}
+        self._endpoints = {e.key: e for e in self.endpoints}
+        self._nodes = None
+        self._validate()
+
+    def _validate(self):
+        for endpoint in self.endpoints:
+            if endpoint.system not in self._systems:
+                raise ValueError(f"el endpoint {endpoint.key!r} usa un sistema desconocido: "
+                                 f"{endpoint.system!r}")
+        node_ids = {node.id for node in self.nodes()}
+        for edge in self.edges:
+            for ref in (edge.source, edge.target):
+                if ref not in node_ids:
+                    raise ValueError(f"la arista {edge.source!r} -> {edge.target!r} usa un "
+                                     f"nodo desconocido: {ref!r}")
+        for flow in self.flows:
+            for step in flow.steps:
+                if step.endpoint is not None and step.endpoint not in self._endpoints:
+                    raise ValueError(f"el flujo {flow.name!r} usa un endpoint desconocido: "
+                                     f"{step.endpoint!r}")
+
+    # -- construcción ---------------------------------------------------
+    @classmethod
+    def from_dict(cls, data):
+        """Construye un modelo a partir de un dict con la forma de `DEFAULT_FLOW`."""
+        systems = [
+            System(
+                key=s["key"],
+                name=s.get("name", s["key"]),
+                color=_parse_color(s.get("color", "#367EDF")),
+                description=s.get("description", ""),
+                color_name=s.get("color_name", ""),
+                base_url=(s.get("base_url") or "").rstrip("/"),
+                box_size=tuple(s.get("box_size") or DEFAULT_BOX_SIZE),
+            )
+            for s in data.get("systems", [])
+        ]
+        endpoints = [
+            Endpoint(
+                key=e["key"],
+                system=e["system"],
+                method=e.get("method", "GET").upper(),
+                path=e["path"],
+                caption=e.get("caption"),
+                summary=e.get("summary") or e["path"],
+            )
+            for e in data.get("endpoints", [])
+        ]
+        edges = [Edge(e["source"], e["target"], e.get("label", ""))
+                 for e in data.get("edges", [])]
+        flows = [
+            Flow(
+                name=f["name"],
+                title=f.get("title", f["name"]),
+                steps=tuple(Step(st["text"], st.get("level", 1), st.get("endpoint"))
+                            for st in f.get("steps", [])),
+            )
+            for f in data.get("flows", [])
+        ]
+        return cls(data.get("title", ""), systems, endpoints, edges, flows)
+
+    def to_dict(self):
+        """Inverso de `from_dict` (apto para JSON)."""
+        return {
+            "title": self.title,
+            "systems": [dict(s._asdict(), color=color_hex(s.color), box_size=list(s.box_size))
+                        for s in self.systems],
+            "endpoints": [e._asdict() for e in self.endpoints],
+            "edges": [e._asdict() for e in self.edges],
+            "flows": [{"name": f.name, "title": f.title,
+                       "steps": [st._asdict() for st in f.steps]} for f in self.flows],
+        }
+
+    def digest(self):
+        """Hash estable del contenido del modelo."""
+        from .incremental import fingerprint
+        return fingerprint(self.to_dict())
+
+    # -- consultas ------------------------------------------------------
+    def system(self, key):
+        return self._systems[key]
+
+    def endpoint(self, key):
+        return self._endpoints[key]
+
+    def is_endpoint(self, node_id):
+        return node_id in self._endpoints
+
+    def endpoints_of(self, system_key):
+        return [e for e in self.endpoints if e.system == system_key]
+
+    def url(self, endpoint):
+        """URL completa de un endpoint (base del sistema + ruta)."""
+        if isinstance(endpoint, str):
+            endpoint = self._endpoints[endpoint]
+        return self._systems[endpoint.system].base_url + endpoint.path
+
+    def nodes(self):
+        """Cajas del diagrama: sistemas sin endpoints y cada endpoint, en orden."""
+        if self._nodes is None:
+            with_endpoints = {e.system for e in self.endpoints}
+            nodes = [Node(s.key, s.key, s.name) for s in self.systems
+                     if s.key not in with_endpoints]
+            for endpoint in self.endpoints:
+                if endpoint.caption:
+                    text = f"{endpoint.caption}\n\n{endpoint.method} {self.url(endpoint)}"
+                else:
+                    text = f"{endpoint.method}\n\n{endpoint.path.lstrip('/')}"
+                nodes.append(Node(endpoint.key, endpoint.system, text))
+            self._nodes = nodes
+        return self._nodes
+
+
+_default_flow = None
+
+
+def default_flow():
+    """Modelo de los flujos GestorMapeos -> ERP Académico -> Expedientes."""
+    global _default_flow
+    if _default_flow is None:
+        _default_flow = FlowModel.from_dict(DEFAULT_FLOW)
+    return _default_flow
+
+
+def load_flow(path):
+    """Lee un modelo de un fichero JSON con la forma de `DEFAULT_FLOW`."""
+    with open(path, "r", encoding="utf-8") as fh:
+        return FlowModel.from_dict(json.load(fh))
+
+
+def resolve_flow(flow):
+    """Normaliza el argumento `flow` de las funciones públicas.
+
+    Args:
+        flow (None | str | dict | FlowModel): None para el modelo por defecto, una
+            ruta a un fichero JSON, un dict o un modelo ya construido.
+
+    Returns:
+        FlowModel
+    """
+    if flow is None:
+        return default_flow()
+    if isinstance(flow, FlowModel):
+        return flow
+    if isinstance(flow, dict):
+        return FlowModel.from_dict(flow)
+    return load_flow(flow)
+
+
+def plantuml_code(model):
+    """Código PlantUML con un rectángulo por sistema y una flecha por arista."""
+    aliases = {s.key: "".join(ch for ch in s.key.upper() if ch.isalnum()) or "S"
+               for s in model.systems}
+    lines = ["@startuml", "skinparam rectangle {"]
+    for system in model.systems:
+        lines.append(f"  BackgroundColor<<{aliases[system.key]}>> {color_hex(system.color)}")
+    lines.extend(["  FontColor white", "}"])
+
+    node_system = {node.id: node.system for node in model.nodes()}
+    for system in model.systems:
+        alias = aliases[system.key]
+        endpoints = model.endpoints_of(system.key)
+        if not endpoints:
+            lines.append(f'actor "{system.name}" as {alias} <<{alias}>>')
+            continue
+        body = "\\n".join([system.name] + [f"{e.method} {e.path}" for e in endpoints])
+        lines.append(f'rectangle "{body}" as {alias} <<{alias}>>')
+
+    for edge in model.edges:
+        source = aliases[node_system[edge.source]]
+        target = aliases[node_system[edge.target]]
+        if model.is_endpoint(edge.target):
+            target_endpoint = model.endpoint(edge.target)
+            description = f"{target_endpoint.method} {model.url(target_endpoint)}"
+        else:
+            description = ""
+        label = " - ".join(part for part in (edge.label, description) if part)
+        lines.append(f"{source} --> {target} : {label}" if label else f"{source} --> {target}")
+    lines.append("@enduml")
+    return "\n".join(lines)
+
+
+def synthetic_flow(n_endpoints, n_systems=4, fan_out=2, seed=0):
+    """Modelo sintético con `n_endpoints` endpoints repartidos en columnas.
+
+    Sirve para medir el motor de layout y el render con diagramas grandes.
+    """
+    import random
+
+    rng = random.Random(seed)
+    palette = ["#0E52A0", "#367EDF", "#4CAF50", "#F39C12", "#8E44AD", "#C0392B"]
+    systems = [{"key": "origen", "name": "Origen", "color": palette[0], "box_size": [340, 100]}]
+    for i in range(n_systems):
+        systems.append({"key": f"sis{i}", "name": f"Sistema {i}",
+                        "color": palette[(i + 1) % len(palette)],
+                        "base_url": f"https://sistema{i}.unir.net", "box_size": [450, 100]})
+    endpoints = []
+    for j in range(n_endpoints):
+        system = f"sis{j * n_systems // max(n_endpoints, 1)}"
+        endpoints.append({"key": f"ep{j}", "system": system,
+                          "method": rng.choice(["GET", "POST", "PUT", "DELETE"]),
+                          "path": f"/api/v1/recurso-{j}/{{id}}"})
+    edges = []
+    by_system = {}
+    for e in endpoints:
+        by_system.setdefault(e["system"], []).append(e["key"])
+    columns = [by_system[k] for k in sorted(by_system, key=lambda k: int(k[3:]))]
+    for key in columns[0] if columns else []:
+        edges.append({"source": "origen", "target": key, "label": "inicio"})
+    for left, right in zip(columns, columns[1:]):
+        for key in left:
+            for target in rng.sample(right, min(fan_out, len(right))):
+                edges.append({"source": key, "target": target, "label": "llamada"})
+    return FlowModel.from_dict({"title": f"Flujo sintético ({n_endpoints} endpoints)",
+                                "systems": systems, "endpoints": endpoints, "edges": edges})
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Modos de render del PNG: borrador, normal y alta calidad.
+
+Todos los modos usan el mismo código de dibujo (`diagrama._draw_diagram` sobre un
+`PILCanvas`); sólo cambian la escala del lienzo, las formas y el paso final:
+
+- draft: a media escala, rectángulos sin redondear, sin sombras y codificado con el
+  perfil 'fast'. Pensado para previsualizaciones mientras se edita el modelo.
+- normal: el render de siempre (una unidad del layout, un píxel).
+- hq, hq4: se dibuja a 2x o 4x y se reduce al tamaño normal promediando cada bloque
+  de 2x2 o 4x4 píxeles. Para factores enteros ese promedio (filtro de caja) es el
+  antialiasing por cobertura de área: flechas y esquinas redondeadas suaves sin los
+  halos de Lanczos, y unas diez veces más rápido que éste.
+
+Funciones públicas:
+- get_mode(mode): modo por nombre (o el propio `RenderMode`)
+- canvas_factory(mode, theme, region): función (width, height) -> `PILCanvas` del modo
+- downsample(img, mode): imagen final a partir de la dibujada (hq: reducida)
+- encoding_preset(mode, preset): perfil de codificación efectivo
+- pixel_step(mode): paso del layout que cae siempre en píxeles enteros de la imagen
+"""
+from collections import namedtuple
+from fractions import Fraction
+
+from .instrumentacion import span
+from .lienzos import PILCanvas
+from .temas import get_theme
+
+# scale: píxeles finales por unidad del layout; supersample: factor de sobremuestreo;
+# cheap: formas baratas (ver `PILCanvas`); preset: perfil de codificación por defecto
+RenderMode = namedtuple("RenderMode", "name scale supersample shadows cheap preset")
+
+MODES = {mode.name: mode for mode in (
+    RenderMode("draft", 0.5, 1, False, True, "fast"),
+    RenderMode("normal", 1, 1, True, False, None),
+    RenderMode("hq", 1, 2, True, False, None),
+    RenderMode("hq4", 1, 4, True, False, None),
+)}
+
+DEFAULT_MODE = "normal"
+
+
+def get_mode(mode=None):
+    """Devuelve el modo `mode` (nombre o `RenderMode`); None es `DEFAULT_MODE`.
+
+    Raises:
+        ValueError: si el modo no existe.
+    """
+    if mode is None:
+        mode = DEFAULT_MODE
+    if isinstance(mode, RenderMode):
+        return mode
+    try:
+        return MODES[mode]
+    except KeyError:
+        raise ValueError(f"modo de render desconocido: {mode!r} (disponibles: {sorted(MODES)})")
+
+
+def canvas_factory(mode=None, theme=None, region=None):
+    """Función (width, height) -> `PILCanvas` con la escala, el tema y las formas del modo.
+
+    `region` (píxeles del lienzo antes de reducir) limita el dibujo a ese recorte.
+    """
+    mode = get_mode(mode)
+    theme = get_theme(theme)
+    if not mode.shadows:
+        theme = theme._replace(shadow=None, title_shadow=None)
+    scale = mode.scale * mode.supersample
+    return lambda width, height: PILCanvas(width, height, theme, scale, cheap=mode.cheap,
+                                           region=region)
+
+
+def downsample(img, mode=None):
+    """Reduce la imagen sobremuestreada al tamaño final (sin cambios si no hay sobremuestreo)."""
+    factor = get_mode(mode).supersample
+    if factor == 1:
+        return img
+    with span("downsample"):
+        return img.reduce(factor)
+
+
+def pixel_step(mode=None):
+    """Menor número entero de unidades del layout que mide un número entero de píxeles.
+
+    Las zonas que se redibujan por separado empiezan y acaban en múltiplos de este
+    paso para que encajen exactamente en la imagen (y en los bloques que promedia hq).
+    """
+    return Fraction(get_mode(mode).scale).limit_denominator(1000).denominator
+
+
+def encoding_preset(mode=None, preset=None):
+    """`preset` si se indica; si no, el perfil por defecto del modo (None: el global)."""
+    return preset if preset is not None else get_mode(mode).preset
@@ -0,0 +1,538 @@
+# -*- coding: utf-8 -*-
+"""Importador de especificaciones OpenAPI (JSON o YAML) para el modelo de flujos.
+
+Las especificaciones reales ocupan decenas o cientos de MB, casi todo esquemas,
+ejemplos y respuestas. El importador las recorre en streaming sin construir el árbol
+del documento: sólo guarda la pila de contenedores abiertos y materializa las cadenas
+que le interesan (ruta, método, etiquetas, resumen y operationId de cada operación,
+`info.title` y la URL del primer servidor). El resto de contenedores (`components`,
+`parameters`, `responses`...) se saltan enteros:
+
+- JSON: se lee por bloques de `CHUNK_SIZE` caracteres. Las zonas de interés se
+  recorren con un tokenizador de expresiones regulares y los subárboles que se saltan
+  se consumen con una expresión que se traga valores anidados completos, así que casi
+  todo el fichero se recorre en C.
+- YAML: eventos de `yaml.parse` (PyYAML, dependencia opcional; con libyaml si está
+  disponible), que tampoco construyen el documento.
+
+La memoria queda acotada por el bloque de lectura, el mayor path item (en JSON cada
+path item se decodifica entero con el decodificador en C de `json` y se descarta) y
+las operaciones seleccionadas, porque los filtros se aplican mientras se lee. Una
+especificación JSON de 200 MB se lee en pocos segundos con unas decenas de MB,
+frente al GB largo que ocupa con `json.load`. YAML es bastante más lento (PyYAML
+genera un evento por nodo), pero igual de acotado en memoria.
+
+Funciones públicas:
+- iter_operations(path, meta=None): operaciones de la especificación, en orden
+- read_spec(path, tags=None, methods=None, paths=None): `ApiSpec` con las operaciones
+  que pasan los filtros
+- group_operations(operations, group_by): operaciones agrupadas por etiqueta o ruta
+- import_flow(specs, base=None, group_by=None): modelo de flujos con las APIs importadas
+- import_openapi(specs, base, tags, methods, paths, group_by): lee las especificaciones
+  y construye el modelo en un paso
+- parse_spec_argument(text): 'sistema=fichero' (o sólo 'fichero') -> (sistema, fichero)
+"""
+from collections import namedtuple
+import fnmatch
+import json
+import logging
+import os
+import re
+import unicodedata
+
+from .instrumentacion import count, span
+from .modelo import FlowModel
+
+logger = logging.getLogger(__name__)
+
+Operation = namedtuple("Operation", "method path tags summary operation_id")
+ApiSpec = namedtuple("ApiSpec", "title base_url operations")
+
+CHUNK_SIZE = 1 << 18
+HTTP_METHODS = frozenset(("get", "put", "post", "delete", "options", "head", "patch", "trace"))
+GROUPINGS = ("tag", "path")
+
+# Colores de los sistemas nuevos (los del modelo base se conservan)
+_PALETTE = ["#367EDF", "#4CAF50", "#F39C12", "#8E44AD", "#C0392B", "#16A085", "#0E52A0"]
+
+# Cadenas que se materializan: (contexto, clave). Las etiquetas se guardan todas.
+_WANTED = frozenset((("operation", "summary"), ("operation", "operationId"),
+                     ("info", "title"), ("server", "url"),
+                     ("root", "host"), ("root", "basePath")))
+
+# Cadena JSON (con ':' si es una clave), o llave, corchete o comilla sin cerrar
+_TOKEN = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"(\s*:)?|[{}\[\]"]')
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_PLAIN = r'[^"{}\[\]]*'
+SKIP_DEPTH = 6
+
+
+def _skip_pattern(depth):
+    """Expresión que consume valores completos con hasta `depth` niveles de anidamiento.
+
+    Se detiene en la llave o corchete que cierra el contenedor actual, en un
+    subárbol más profundo o en uno que no cabe en el bloque leído (en los que
+    `_scan_json` entra bajando por `_SKIP_LEVELS`). Cada alternativa empieza por un
+    carácter distinto, así que al fallar no hay retroceso exponencial.
+    """
+    body = f"{_PLAIN}(?:{_STRING}{_PLAIN})*"
+    for _ in range(depth):
+        body = f"{_PLAIN}(?:(?:{_STRING}|\\{{{body}\\}}|\\[{body}\\]){_PLAIN})*"
+    return re.compile(body)
+
+
+# _SKIP_LEVELS[k] consume valores de hasta k niveles; _SKIP, los de SKIP_DEPTH
+_SKIP_LEVELS = [_skip_pattern(depth) for depth in range(SKIP_DEPTH + 1)]
+_SKIP = _SKIP_LEVELS[SKIP_DEPTH]
+_SPACE = re.compile(r"\s*")
+_DECODER = json.JSONDecoder()
+_VERSION = re.compile(r"v\d+(\.\d+)*$", re.IGNORECASE)
+
+
+class _Collector:
+    """Estado común a JSON y YAML: qué contenedores se recorren y qué cadenas se guardan.
+
+    Cada contenedor abierto es [contexto, última clave, datos]; los contextos son
+    root, info, servers, server, paths, path (un path item), operation y tags.
+    """
+
+    def __init__(self, meta):
+        self.meta = meta
+        self.stack = []
+
+    def open(self, kind):
+        """Entra en un contenedor ('{' o '['). False si no interesa y hay que saltarlo."""
+        if not self.stack:
+            child = "root" if kind == "{" else None
+        else:
+            context, key, _ = self.stack[-1]
+            if context == "root":
+                child = {("paths", "{"): "paths", ("info", "{"): "info",
+                         ("servers", "["): "servers"}.get((key, kind))
+            elif context == "paths":
+                child = "path" if kind == "{" else None
+            elif context == "path":
+                child = "operation" if kind == "{" and key in HTTP_METHODS else None
+            elif context == "operation":
+                child = "tags" if kind == "[" and key == "tags" else None
+            elif context == "servers":
+                child = "server" if kind == "{" else None
+            else:
+                child = None
+        if child is None:
+            return False
+        self.stack.append([child, None, {"tags": []} if child == "operation" else None])
+        return True
+
+    def close(self):
+        """Sale del contenedor actual; devuelve la `Operation` si era una operación."""
+        context, _, data = self.stack.pop()
+        if context != "operation":
+            return None
+        method = self.stack[-1][1]
+        path = self.stack[-2][1]
+        return Operation(method.upper(), path, tuple(data["tags"]), data.get("summary"),
+                         data.get("operationId"))
+
+    def in_paths(self):
+        """True si el contenedor actual es el objeto `paths` (lo que se abre es un path item)."""
+        return bool(self.stack) and self.stack[-1][0] == "paths"
+
+    def path_item(self, item):
+        """Operaciones de un path item ya decodificado (dict) bajo la clave actual."""
+        path = self.stack[-1][1]
+        for method, operation in item.items():
+            if method in HTTP_METHODS and isinstance(operation, dict):
+                yield Operation(method.upper(), path, tuple(operation.get("tags") or ()),
+                                operation.get("summary"), operation.get("operationId"))
+
+    def key(self, text):
+        self.stack[-1][1] = text
+
+    def wants(self):
+        """True si la cadena que viene (un valor) hay que guardarla."""
+        if not self.stack:
+            return False
+        context, key, _ = self.stack[-1]
+        return context == "tags" or (context, key) in _WANTED
+
+    def value(self, text):
+        context, key, data = self.stack[-1]
+        if context == "tags":
+            self.stack[-2][2]["tags"].append(text)
+        elif context == "operation":
+            data[key] = text
+        elif context == "info":
+            self.meta.setdefault("title", text)
+        elif context == "server":
+            self.meta.setdefault("server", text)
+        else:
+            self.meta.setdefault(key, text)
+
+
+def _decode(raw):
+    """Contenido de una cadena JSON (sólo se llama a `json` si tiene escapes)."""
+    return json.loads(f'"{raw}"') if "\\" in raw else raw
+
+
+def _scan_json(fh, collector, chunk_size):
+    buf = ""
+    pos = 0
+    eof = False
+    skip = 0  # profundidad pendiente del subárbol que se está saltando
+    grow = False
+    while True:
+        while True:
+            if skip:
+                pos = _SKIP.match(buf, pos).end()
+                if pos == len(buf) or buf[pos] == '"':
+                    break  # fin del bloque o cadena partida: hace falta más texto
+                if buf[pos] not in "{[":
+                    skip -= 1
+                    pos += 1
+                    continue
+                # Un subárbol más profundo que SKIP_DEPTH: se baja hasta la llave que
+                # no cabía saltando los hermanos de cada nivel, en lugar de entrar nivel
+                # a nivel y volver a recorrer cada vez los SKIP_DEPTH siguientes
+                for depth in range(SKIP_DEPTH - 1, -1, -1):
+                    skip += 1
+                    pos = _SKIP_LEVELS[depth].match(buf, pos + 1).end()
+                    if pos == len(buf) or buf[pos] not in "{[":
+                        break
+                continue
+            match = _TOKEN.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            raw = match.group(1)
+            if raw is None:
+                token = match.group()
+                if token == '"':
+                    pos = match.start()  # cadena partida entre dos bloques
+                    break
+                if token == "{" and collector.in_paths():
+                    # Un path item es pequeño: se decodifica entero con el decodificador
+                    # de `json` (en C) y se descarta tras sacar sus operaciones
+                    try:
+                        item, end = _DECODER.raw_decode(buf, match.start())
+                    except ValueError:
+                        if eof:
+                            raise ValueError("JSON incompleto o no válido")
+                        pos = match.start()
+                        grow = True
+                        break
+                    yield from collector.path_item(item)
+                    pos = end
+                    continue
+                pos = match.end()
+                if token in "{[":
+                    if not collector.open(token):
+                        skip = 1
+                else:
+                    operation = collector.close()
+                    if operation is not None:
+                        yield operation
+                continue
+            if match.group(2):
+                collector.key(_decode(raw))
+            elif not eof and _SPACE.match(buf, match.end()).end() == len(buf):
+                pos = match.start()  # los ':' de una clave pueden venir en el bloque siguiente
+                break
+            elif collector.wants():
+                collector.value(_decode(raw))
+            pos = match.end()
+        if eof:
+            break
+        # Si un path item no cabía en el bloque se lee otro tanto como lo pendiente,
+        # para no decodificarlo desde el principio una vez por bloque
+        data = fh.read(max(chunk_size, len(buf) - pos) if grow else chunk_size)
+        grow = False
+        count("openapi_chars", len(data))
+        buf = buf[pos:] + data
+        pos = 0
+        eof = not data
+    if skip or collector.stack or buf[pos:].strip():
+        raise ValueError("JSON incompleto o no válido")
+
+
+def _scan_yaml(fh, collector):
+    try:
+        import yaml
+    except ImportError as exc:
+        raise ImportError("leer especificaciones YAML necesita PyYAML "
+                          "(python -m pip install pyyaml)") from exc
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    starts = (yaml.MappingStartEvent, yaml.SequenceStartEvent)
+    ends = (yaml.MappingEndEvent, yaml.SequenceEndEvent)
+    # Por contenedor recorrido: True/False si es un mapa (¿espera clave?), None si es lista
+    expect_key = []
+    skip = 0
+    for event in yaml.parse(fh, Loader=loader):
+        if skip:
+            if isinstance(event, starts):
+                skip += 1
+            elif isinstance(event, ends):
+                skip -= 1
+                if not skip and expect_key and expect_key[-1] is False:
+                    expect_key[-1] = True
+            continue
+        if expect_key and expect_key[-1] and not isinstance(event, (yaml.ScalarEvent, ends)):
+            raise ValueError("las claves compuestas de YAML no están admitidas")
+        if isinstance(event, yaml.ScalarEvent):
+            if expect_key and expect_key[-1]:
+                collector.key(event.value)
+                expect_key[-1] = False
+                continue
+            if collector.wants():
+                collector.value(event.value)
+        elif isinstance(event, starts):
+            kind = "{" if isinstance(event, yaml.MappingStartEvent) else "["
+            if not collector.open(kind):
+                skip = 1
+                continue
+            expect_key.append(True if kind == "{" else None)
+            continue
+        elif isinstance(event, ends):
+            expect_key.pop()
+            operation = collector.close()
+            if operation is not None:
+                yield operation
+        elif isinstance(event, yaml.AliasEvent):
+            pass
+        elif isinstance(event, yaml.DocumentEndEvent):
+            break
+        else:
+            continue  # inicio de flujo o documento
+        if expect_key and expect_key[-1] is False:
+            expect_key[-1] = True
+
+
+def _is_json(path, fh):
+    lower = str(path).lower()
+    if lower.endswith(".json"):
+        return True
+    if lower.endswith((".yaml", ".yml")):
+        return False
+    head = fh.read(1024).lstrip()
+    fh.seek(0)
+    return head.startswith("{")
+
+
+def iter_operations(path, meta=None, chunk_size=CHUNK_SIZE):
+    """Recorre en streaming las operaciones de una especificación OpenAPI (o Swagger 2).
+
+    Args:
+        path (str): fichero JSON o YAML (por extensión; si no, por su primer carácter)
+        meta (dict): si se indica, se rellena con 'title', 'server', 'host' y
+            'basePath' a medida que aparecen
+        chunk_size (int): caracteres por lectura (sólo JSON)
+
+    Yields:
+        Operation: en el orden del fichero
+
+    Raises:
+        ValueError: si el JSON está incompleto o el YAML usa claves compuestas.
+        ImportError: si el fichero es YAML y PyYAML no está instalado.
+    """
+    collector = _Collector({} if meta is None else meta)
+    with open(path, "r", encoding="utf-8-sig") as fh:
+        if _is_json(path, fh):
+            yield from _scan_json(fh, collector, chunk_size)
+        else:
+            yield from _scan_yaml(fh, collector)
+
+
+def _base_url(meta):
+    if "server" in meta:
+        return meta["server"]
+    if "host" in meta:
+        return f"https://{meta['host']}{meta.get('basePath', '')}"
+    return meta.get("basePath", "")
+
+
+def read_spec(path, tags=None, methods=None, paths=None, chunk_size=CHUNK_SIZE):
+    """Lee una especificación y se queda con las operaciones que pasan los filtros.
+
+    Args:
+        path (str): fichero JSON o YAML
+        tags (iterable): sólo operaciones con alguna de estas etiquetas
+        methods (iterable): sólo estos métodos HTTP (sin distinguir mayúsculas)
+        paths (iterable): patrones `fnmatch` de ruta, p. ej. '/api/v1/expedientes*'
+
+    Returns:
+        ApiSpec: título, URL base (primer servidor) y operaciones en orden del fichero
+    """
+    tags = set(tags) if tags else None
+    methods = {method.upper() for method in methods} if methods else None
+    paths = list(paths) if paths else None
+    meta = {}
+    selected = []
+    with span("openapi"):
+        for operation in iter_operations(path, meta, chunk_size):
+            count("openapi_operations")
+            if tags is not None and not tags.intersection(operation.tags):
+                continue
+            if methods is not None and operation.method not in methods:
+                continue
+            if paths is not None and not any(fnmatch.fnmatchcase(operation.path, pattern)
+                                             for pattern in paths):
+                continue
+            selected.append(operation)
+    logger.info("%s: %d operaciones seleccionadas", path, len(selected))
+    return ApiSpec(meta.get("title", ""), _base_url(meta).rstrip("/"), selected)
+
+
+def _path_group(path):
+    """Primer segmento significativo de la ruta (sin 'api', versiones ni parámetros)."""
+    for segment in path.split("/"):
+        if segment and segment.lower() != "api" and not _VERSION.match(segment) \
+                and not segment.startswith("{"):
+            return segment
+    return ""
+
+
+def group_operations(operations, group_by=None):
+    """Agrupa las operaciones por su primera etiqueta ('tag') o por su ruta ('path').
+
+    Returns:
+        dict: grupo -> lista de operaciones, en orden de primera aparición. Las
+        operaciones sin etiqueta (o sin segmento de ruta) van al grupo ''; sin
+        `group_by` todas van al grupo ''.
+
+    Raises:
+        ValueError: si `group_by` no es None ni uno de `GROUPINGS`.
+    """
+    if group_by is not None and group_by not in GROUPINGS:
+        raise ValueError(f"agrupación desconocida: {group_by!r} (disponibles: {list(GROUPINGS)})")
+    groups = {}
+    for operation in operations:
+        if group_by == "tag":
+            group = operation.tags[0] if operation.tags else ""
+        elif group_by == "path":
+            group = _path_group(operation.path)
+        else:
+            group = ""
+        groups.setdefault(group, []).append(operation)
+    return groups
+
+
+def _slug(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^0-9a-z]+", "_", text.lower()).strip("_") or "x"
+
+
+def _unique(key, used):
+    candidate, n = key, 2
+    while candidate in used:
+        candidate, n = f"{key}_{n}", n + 1
+    used.add(candidate)
+    return candidate
+
+
+def import_flow(specs, base=None, group_by=None):
+    """Modelo de flujos con los endpoints de las especificaciones importadas.
+
+    Cada especificación se asigna a un sistema. Si el sistema existe en `base`, sus
+    endpoints pasan a ser los de la especificación: los que ya estaban con el mismo
+    método y ruta conservan su clave, título y resumen (y con ellos las aristas y
+    los flujos que los usan); los que no aparecen en la especificación se mantienen
+    con un aviso. Si no existe, se añade un sistema nuevo con el título y la URL de la
+    especificación. Con `group_by` cada grupo (etiqueta o ruta) es un sistema propio,
+    con su columna en el diagrama y su apartado en el DOCX y en el PlantUML.
+
+    Args:
+        specs (list): pares (clave de sistema, `ApiSpec`)
+        base (FlowModel): modelo de partida; None para un modelo sólo con las APIs
+        group_by (str): None, 'tag' o 'path'
+
+    Returns:
+        FlowModel
+
+    Raises:
+        ValueError: si la agrupación no existe o un sistema que se dibuja como caja
+            (sin endpoints y con aristas) recibe endpoints.
+    """
+    if base is not None:
+        data = base.to_dict()
+    else:
+        title = next((spec.title for _, spec in specs if spec.title), "") or "API"
+        data = {"title": title, "systems": [], "endpoints": [], "edges": [], "flows": []}
+    used = {e["key"] for e in data["endpoints"]} | {s["key"] for s in data["systems"]}
+
+    for system_key, spec in specs:
+        groups = group_operations(spec.operations, group_by)
+        systems = data["systems"]
+        index = next((i for i, s in enumerate(systems) if s["key"] == system_key), None)
+        if index is None:
+            system = {"key": system_key, "name": spec.title or system_key,
+                      "color": _PALETTE[len(systems) % len(_PALETTE)],
+                      "description": f"{len(spec.operations)} operaciones importadas de OpenAPI",
+                      "base_url": spec.base_url}
+            systems.append(system)
+            index = len(systems) - 1
+            used.add(system_key)
+        else:
+            system = systems[index]
+            if not system.get("base_url"):
+                system["base_url"] = spec.base_url
+        hand = [e for e in data["endpoints"] if e["system"] == system_key]
+        if spec.operations and not hand and any(system_key in (e["source"], e["target"])
+                                                for e in data["edges"]):
+            raise ValueError(f"el sistema {system_key!r} se dibuja como una caja con aristas; "
+                             "no se le pueden importar endpoints")
+        known = {(e["method"].upper(), e["path"]): e for e in hand}
+
+        group_systems = []
+        endpoints = []
+        for group, operations in groups.items():
+            group_key = system_key
+            if group:
+                group_key = _unique(f"{system_key}_{_slug(group)}", used)
+                group_systems.append(dict(system, key=group_key, name=f"{system['name']} · {group}"))
+            for operation in operations:
+                endpoint = known.pop((operation.method, operation.path), None)
+                if endpoint is None:
+                    name = operation.operation_id or f"{operation.method} {operation.path}"
+                    endpoint = {"key": _unique(f"{system_key}_{_slug(name)}", used),
+                                "method": operation.method, "path": operation.path,
+                                "summary": operation.summary or operation.operation_id}
+                endpoints.append(dict(endpoint, system=group_key))
+        for endpoint in known.values():
+            logger.warning("%s %s (%s) no aparece en la especificación importada",
+                           endpoint["method"], endpoint["path"], system_key)
+            endpoints.append(endpoint)
+
+        # El sistema original se sustituye por sus grupos si se queda sin endpoints
+        keep = not group_systems or any(e["system"] == system_key for e in endpoints)
+        systems[index:index + 1] = ([system] if keep else []) + group_systems
+        position = next((i for i, e in enumerate(data["endpoints"])
+                         if e["system"] == system_key), len(data["endpoints"]))
+        others = [e for e in data["endpoints"] if e["system"] != system_key]
+        data["endpoints"] = others[:position] + endpoints + others[position:]
+    return FlowModel.from_dict(data)
+
+
+def import_openapi(specs, base=None, tags=None, methods=None, paths=None, group_by=None):
+    """Lee las especificaciones y construye el modelo (`read_spec` + `import_flow`).
+
+    Args:
+        specs (list): pares (clave de sistema, ruta del fichero)
+        base (FlowModel): modelo de partida (ver `import_flow`)
+        tags, methods, paths: filtros de `read_spec`, comunes a todas las especificaciones
+        group_by (str): None, 'tag' o 'path'
+
+    Returns:
+        FlowModel
+    """
+    group_operations((), group_by)  # valida la agrupación antes de leer nada
+    read = [(key, read_spec(path, tags, methods, paths)) for key, path in specs]
+    return import_flow(read, base, group_by)
+
+
+def parse_spec_argument(text):
+    """'sistema=fichero' -> (sistema, fichero); sin 'sistema=', la clave sale del nombre."""
+    key, sep, path = text.partition("=")
+    if sep and key and not os.path.exists(text):
+        return key, path
+    stem = os.path.splitext(os.path.basename(text))[0]
+    return _slug(stem), text
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""Motor DOCX basado en una plantilla compilada.
+
+El documento se describe como una lista de bloques (`Paragraph` con estilo y
+fragmentos de texto, y un `Picture`). La primera vez, python-docx genera un paquete
+de referencia con su plantilla por defecto y una imagen de relleno; de él se guardan:
+
+- las partes estáticas del zip (estilos, numeración, tema...) ya comprimidas,
+- el principio y el final de `word/document.xml` y el XML del párrafo de imagen,
+- los identificadores de estilo por nombre ('List Bullet 2' -> 'ListBullet2').
+
+En cada render sólo se genera el cuerpo de `word/document.xml` a partir de los
+bloques, se ajusta la extensión de la imagen y se escribe el zip copiando tal cual
+los bytes comprimidos de las partes estáticas. El XML generado es el mismo que
+produciría python-docx con `add_paragraph`/`add_run`/`add_picture`.
+
+`build_docx` monta el mismo documento con python-docx y se usa para imágenes que
+no son PNG (la plantilla sólo lleva una parte `image/png`).
+
+Funciones públicas:
+- paragraph(*runs, style=None), heading(text, level), bold(text), Picture(width): bloques
+- render_docx(blocks, image, output): DOCX a partir de la plantilla compilada
+- build_docx(blocks, image, output): el mismo DOCX con python-docx
+- get_template(), clear_template_cache(): plantilla compilada del proceso
+- DocxPatcher(): renders sucesivos que sólo rehacen las partes que cambian
+"""
+from collections import namedtuple
+import base64
+import io
+import re
+import struct
+import threading
+import zlib
+
+from .instrumentacion import span
+
+Run = namedtuple("Run", "text bold")
+Paragraph = namedtuple("Paragraph", "style runs")
+Picture = namedtuple("Picture", "width")  # ancho en pulgadas
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG de 1x1 para compilar la plantilla sin depender de Pillow
+_PLACEHOLDER_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4//8/AAX+Av4N70a4AAAAAElFTkSuQmCC")
+
+# Fecha fija (1980-01-01) en las entradas del zip: la salida es reproducible
+_DOS_TIME, _DOS_DATE = 0, (0 << 9) | (1 << 5) | 1
+_ZIP_STORED, _ZIP_DEFLATED = 0, 8
+
+
+def bold(text):
+    """Fragmento de texto en negrita."""
+    return Run(text, True)
+
+
+def paragraph(*runs, style=None):
+    """Párrafo con los fragmentos `runs` (str o `Run`); sin fragmentos, un párrafo vacío."""
+    return Paragraph(style, tuple(run if isinstance(run, Run) else Run(run, False)
+                                  for run in runs if run))
+
+
+def heading(text, level):
+    """Título de nivel `level` (estilo 'Heading N', como `Document.add_heading`)."""
+    return paragraph(text, style=f"Heading {level}")
+
+
+def is_png(data):
+    return bytes(data[:8]) == PNG_SIGNATURE
+
+
+# Fuera del rango Char de XML 1.0: controles (salvo tab, salto y retorno), sustitutos,
+# U+FFFE y U+FFFF. lxml (y con él python-docx) rechaza estos caracteres
+_INVALID_XML = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _text_xml(text):
+    """Contenido de un <w:r> para `text`, igual que el `Run.text` de python-docx.
+
+    Raises:
+        ValueError: si `text` tiene caracteres que no admite XML (como python-docx).
+    """
+    if _INVALID_XML.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, "
+                         "no NULL bytes or control characters")
+    parts = []
+    buffer = []
+
+    def flush():
+        if buffer:
+            chunk = "".join(buffer)
+            space = ' xml:space="preserve"' if len(chunk.strip()) < len(chunk) else ""
+            parts.append(f"<w:t{space}>{_escape(chunk)}</w:t>")
+            buffer.clear()
+
+    for char in text:
+        if char == "\t":
+            flush()
+            parts.append("<w:tab/>")
+        elif char in "\r\n":
+            flush()
+            parts.append("<w:br/>")
+        else:
+            buffer.append(char)
+    flush()
+    return "".join(parts)
+
+
+def _run_xml(run):
+    rpr = "<w:rPr><w:b/></w:rPr>" if run.bold else ""
+    return f"<w:r>{rpr}{_text_xml(run.text)}</w:r>"
+
+
+class _Member(namedtuple("_Member", "name method crc compressed size")):
+    """Entrada del zip ya comprimida, lista para copiarse tal cual."""
+
+    @classmethod
+    def deflated(cls, name, data):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        return cls(name, _ZIP_DEFLATED, zlib.crc32(data), compressed, len(data))
+
+    @classmethod
+    def stored(cls, name, data):
+        data = bytes(data)
+        return cls(name, _ZIP_STORED, zlib.crc32(data), data, len(data))
+
+
+def _zip_bytes(members):
+    """Serializa las entradas como un zip (sin zip64: partes de menos de 4 GiB)."""
+    chunks = []
+    central = []
+    offset = 0
+    for member in members:
+        name = member.name.encode("utf-8")
+        header = struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, 0, member.method, _DOS_TIME,
+                             _DOS_DATE, member.crc, len(member.compressed), member.size,
+                             len(name), 0)
+        chunks += [header, name, member.compressed]
+        central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, 0, member.method,
+                                   _DOS_TIME, _DOS_DATE, member.crc, len(member.compressed),
+                                   member.size, len(name), 0, 0, 0, 0, 0, offset) + name)
+        offset += len(header) + len(name) + len(member.compressed)
+    directory = b"".join(central)
+    end = struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(members), len(members),
+                      len(directory), offset, 0)
+    return b"".join(chunks) + directory + end
+
+
+class DocxTemplate:
+    """Plantilla compilada: partes estáticas comprimidas y trozos de document.xml."""
+
+    def __init__(self):
+        from docx import Document
+        from docx.enum.style import WD_STYLE_TYPE
+        from docx.shared import Inches
+        import zipfile
+
+        doc = Document()
+        self.style_ids = {style.name: style.style_id for style in doc.styles
+                          if style.type == WD_STYLE_TYPE.PARAGRAPH}
+        doc.add_picture(io.BytesIO(_PLACEHOLDER_PNG), width=Inches(1))
+        buffer = io.BytesIO()
+        doc.save(buffer)
+
+        # (nombre, entrada comprimida); None en las dos partes que cambian en cada render
+        self.members = []
+        with zipfile.ZipFile(buffer) as package:
+            for name in package.namelist():
+                data = package.read(name)
+                if name == "word/document.xml":
+                    self._split_document(data.decode("utf-8"))
+                    self.members.append((name, None))
+                elif name.startswith("word/media/"):
+                    self.image_name = name
+                    self.members.append((name, None))
+                else:
+                    self.members.append((name, _Member.deflated(name, data)))
+
+    def _split_document(self, xml):
+        body = xml.index("<w:body>") + len("<w:body>")
+        sect = xml.index("<w:sectPr", body)
+        self.head, picture, self.tail = xml[:body], xml[body:sect], xml[sect:]
+        # La imagen de relleno es cuadrada: cx == cy == una pulgada
+        placeholder = 'cx="914400" cy="914400"'
+        if picture.count(placeholder) != 2:
+            raise ValueError("párrafo de imagen inesperado en la plantilla de python-docx")
+        self.picture_parts = picture.split(placeholder)
+
+    def _ppr(self, style):
+        if style is None:
+            return ""
+        try:
+            style_id = self.style_ids[style]
+        except KeyError:
+            raise KeyError(f"no style with name {style!r}")
+        return f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+
+    def _picture_xml(self, picture, image):
+        from docx.image.image import Image
+        from docx.shared import Inches
+
+        cx, cy = Image.from_blob(bytes(image)).scaled_dimensions(Inches(picture.width), None)
+        return f'cx="{cx}" cy="{cy}"'.join(self.picture_parts)
+
+    def document_xml(self, blocks, image):
+        """Texto completo de `word/document.xml` para los bloques y la imagen."""
+        body = []
+        pictures = 0
+        for block in blocks:
+            if isinstance(block, Picture):
+                pictures += 1
+                if pictures > 1:
+                    raise ValueError("la plantilla admite una sola imagen")
+                body.append(self._picture_xml(block, image))
+            elif block.runs:
+                body.append(f"<w:p>{self._ppr(block.style)}"
+                            f"{''.join(_run_xml(run) for run in block.runs)}</w:p>")
+            elif block.style is None:
+                body.append("<w:p/>")
+            else:
+                body.append(f"<w:p>{self._ppr(block.style)}</w:p>")
+        return self.head + "".join(body) + self.tail
+
+    def variable_member(self, name, xml, image):
+        """Entrada de una de las dos partes que cambian en cada render."""
+        if name == self.image_name:
+            return _Member.stored(name, image)
+        return _Member.deflated(name, xml)
+
+    def render(self, blocks, image):
+        """Bytes del DOCX: document.xml nuevo, la imagen (sin recomprimir) y el resto tal cual."""
+        xml = self.document_xml(blocks, image).encode("utf-8")
+        return _zip_bytes([member or self.variable_member(name, xml, image)
+                           for name, member in self.members])
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    """Plantilla compilada del proceso (se compila la primera vez)."""
+    global _template
+    with _template_lock:
+        if _template is None:
+            with span("template"):
+                _template = DocxTemplate()
+        return _template
+
+
+def clear_template_cache():
+    global _template
+    with _template_lock:
+        _template = None
+
+
+class DocxPatcher:
+    """Renders sucesivos del mismo documento que reutilizan las partes sin cambios.
+
+    Guarda la última entrada comprimida de `word/document.xml` y de la imagen: si su
+    contenido no ha cambiado se copian tal cual, sin volver a comprimir ni a calcular
+    el CRC (ver `vigilancia`).
+    """
+
+    def __init__(self, template=None):
+        self.template = template or get_template()
+        self._last = {}  # nombre -> (contenido, entrada)
+
+    def render(self, blocks, image):
+        """Como `DocxTemplate.render`.
+
+        Returns:
+            tuple: (bytes del DOCX, nombres de las partes que se han regenerado)
+        """
+        template = self.template
+        image = bytes(image)
+        xml = template.document_xml(blocks, image).encode("utf-8")
+        members = []
+        changed = []
+        for name, member in template.members:
+            if member is None:
+                content = image if name == template.image_name else xml
+                last = self._last.get(name)
+                if last is not None and last[0] == content:
+                    member = last[1]
+                else:
+                    member = template.variable_member(name, xml, image)
+                    self._last[name] = (content, member)
+                    changed.append(name)
+            members.append(member)
+        return _zip_bytes(members), changed
+
+
+def _write(output, data):
+    if isinstance(output, str):
+        with open(output, "wb") as fh:
+            fh.write(data)
+    else:
+        output.write(data)
+
+
+def render_docx(blocks, image, output):
+    """Escribe el DOCX de `blocks` con la imagen PNG `image` usando la plantilla.
+
+    Args:
+        blocks (list): `Paragraph` y un `Picture`
+        image (bytes): imagen PNG
+        output (str | file-like): ruta o flujo binario de salida
+
+    Returns:
+        int: bytes escritos
+    """
+    data = get_template().render(blocks, image)
+    _write(output, data)
+    return len(data)
+
+
+def build_docx(blocks, image, output):
+    """Monta el mismo DOCX con python-docx (admite cualquier imagen que admita python-docx)."""
+    from docx import Document
+    from docx.shared import Inches
+
+    doc = Document()
+    for block in blocks:
+        if isinstance(block, Picture):
+            doc.add_picture(io.BytesIO(bytes(image)), width=Inches(block.width))
+            continue
+        para = doc.add_paragraph(style=block.style)
+        for run in block.runs:
+            added = para.add_run(run.text)
+            if run.bold:
+                added.bold = True
+    doc.save(output)
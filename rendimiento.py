@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks de generación con umbrales de regresión de tiempo y memoria.
+
+Mide por separado `_load_fonts`, `_generate_png_diagram` (en cada modo de render:
+png, png-draft, png-hq y, sólo con el modelo integrado, png-hq4),
+`_generate_word_document`, `generate_diagram` y `render_variants` (cuatro
+variantes), en frío (cachés de fuentes, capas y métricas vacías) y en caliente,
+con el modelo integrado y con modelos sintéticos grandes; y `openapi.read_spec`
+con una especificación de esquemas planos y otra de esquemas muy anidados. De
+cada caso se guarda la mediana y el mínimo del tiempo y el pico de memoria de
+Python (`tracemalloc`, medido en una ejecución aparte para no alterar los
+tiempos; los buffers de imagen que reserva Pillow en C no se cuentan).
+
+Los resultados se guardan como JSON y pueden compararse con una línea base: un
+caso es una regresión si supera la base en más de `margin` (relativo) y en más
+de `min_delta` (absoluto, para no fallar por ruido en casos de microsegundos).
+
+Funciones públicas:
+- run_benchmarks(sizes, repeat, cold_repeat, progress): ejecuta la batería y devuelve los resultados
+- compare(results, baseline, margin, min_delta): lista de regresiones frente a la base
+- load_results(path), save_results(results, path): lectura y escritura en JSON
+- print_progress(name, result), print_regressions(regressions): salida por consola
+"""
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+DEFAULT_SIZES = (25, 100)
+DEFAULT_REPEAT = 3
+DEFAULT_COLD_REPEAT = 2
+DEFAULT_MARGIN = 0.25
+# Diferencias absolutas por debajo de esto no cuentan como regresión
+DEFAULT_MIN_DELTA = {"seconds": 0.002, "peak_bytes": 256 * 1024}
+
+
+def reset_caches():
+    """Vacía las cachés en proceso (fuentes, capas, sprites, métricas y plantilla DOCX)."""
+    from .capas import clear_layer_cache
+    from .fuentes import invalidate_font_cache
+    from .metricas import get_metrics
+    from .plantilla import clear_template_cache
+
+    invalidate_font_cache()
+    clear_layer_cache()
+    get_metrics().clear()
+    clear_template_cache()
+
+
+def measure(func, repeat=DEFAULT_REPEAT, setup=None):
+    """Mide `func()` `repeat` veces y una vez más con tracemalloc.
+
+    Args:
+        func (callable): código a medir
+        repeat (int): número de ejecuciones cronometradas
+        setup (callable): se llama antes de cada ejecución, fuera del cronómetro
+
+    Returns:
+        dict: seconds (mediana), min, runs y peak_bytes
+    """
+    times = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "min": min(times), "runs": len(times),
+            "peak_bytes": peak}
+
+
+def _cases(model, label, output_dir):
+    """Casos (nombre, función) de un modelo; cada uno se mide en frío y en caliente."""
+    from . import diagrama
+    from .variantes import expand, render_variants
+
+    png_bytes = diagrama.render_png_bytes(model)
+    # Dos temas x dos idiomas: se compara con cuatro veces png.<modelo>
+    variants = expand(("light", "high-contrast"), ("es", "en"))
+    # hq4 dibuja 16 veces más píxeles: con los modelos grandes serían cientos de MB
+    modes = ("draft", "hq", "hq4") if label == "default" else ("draft", "hq")
+    return [
+        (f"png.{label}", lambda: diagrama._generate_png_diagram(io.BytesIO(), model)),
+    ] + [
+        (f"png-{mode}.{label}",
+         lambda mode=mode: diagrama._generate_png_diagram(io.BytesIO(), model, mode=mode))
+        for mode in modes
+    ] + [
+        (f"docx.{label}",
+         lambda: diagrama._generate_word_document(io.BytesIO(), png_bytes, model)),
+        (f"diagram.{label}", lambda: diagrama.generate_diagram(output_dir, flow=model)),
+        (f"variants4.{label}", lambda: render_variants(variants, model)),
+    ]
+
+
+def _openapi_spec(path, depth, schemas=100, operations=200):
+    """Escribe una especificación OpenAPI sintética con esquemas de `depth` niveles.
+
+    Cada nivel tiene diez propiedades pequeñas y, la última, el nivel siguiente: el
+    caso en el que el lector tiene que bajar por debajo de `openapi.SKIP_DEPTH`.
+    """
+    def schema(level):
+        properties = {f"p{k}": {"type": "integer", "enum": [1, 2, {"a": [3]}]}
+                      for k in range(10)}
+        if level:
+            properties["hijo"] = schema(level - 1)
+        return {"type": "object", "description": f"nivel {level}", "properties": properties}
+
+    spec = {
+        "openapi": "3.0.1",
+        "info": {"title": "API sintética", "version": "1"},
+        "components": {"schemas": {f"S{i}": schema(depth) for i in range(schemas)}},
+        "paths": {f"/api/v1/recurso-{i}/{{id}}": {
+            "get": {"summary": f"Operación {i}",
+                    "responses": {"200": {"description": "ok", "content": {
+                        "application/json": {"schema": schema(2)}}}}}}
+            for i in range(operations)},
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(spec, fh)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT,
+                   cold_repeat=DEFAULT_COLD_REPEAT, progress=None):
+    """Ejecuta la batería completa de benchmarks.
+
+    Args:
+        sizes (iterable): número de endpoints de los modelos sintéticos (`synthetic_flow`)
+        repeat (int): ejecuciones por caso en caliente
+        cold_repeat (int): ejecuciones por caso en frío (cada una vacía las cachés)
+        progress (callable): se llama como progress(name, result) tras cada caso
+
+    Returns:
+        dict: meta (entorno) y results {nombre: {seconds, min, runs, peak_bytes}}
+    """
+    import PIL
+    import docx
+    from . import diagrama
+    from .modelo import default_flow, synthetic_flow
+    from .openapi import read_spec
+
+    results = {}
+
+    def record(name, func, runs, setup=None):
+        results[name] = measure(func, runs, setup)
+        if progress is not None:
+            progress(name, results[name])
+
+    output_dir = tempfile.mkdtemp(prefix="createexpediente-bench-")
+    try:
+        record("load_fonts.cold", diagrama._load_fonts, cold_repeat, reset_caches)
+        record("load_fonts.warm", diagrama._load_fonts, repeat)
+
+        models = [("default", default_flow())]
+        models += [(f"synthetic-{n}", synthetic_flow(n)) for n in sizes]
+        for label, model in models:
+            for name, func in _cases(model, label, output_dir):
+                record(name + ".cold", func, cold_repeat, reset_caches)
+                record(name + ".warm", func, repeat)
+
+        # Lectura de OpenAPI con esquemas planos y muy anidados (sin cachés: un caso)
+        for label, depth in (("flat", 2), ("deep", 40)):
+            spec_path = os.path.join(output_dir, f"openapi-{label}.json")
+            _openapi_spec(spec_path, depth)
+            record(f"openapi.{label}", lambda path=spec_path: read_spec(path), repeat)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "python_docx": getattr(docx, "__version__", ""),
+        "sizes": list(sizes),
+        "repeat": repeat,
+        "cold_repeat": cold_repeat,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, margin=DEFAULT_MARGIN, min_delta=None):
+    """Compara unos resultados con una línea base.
+
+    Sólo se comparan los casos presentes en ambos.
+
+    Args:
+        results (dict): salida de `run_benchmarks`
+        baseline (dict): salida guardada de una ejecución anterior
+        margin (float): exceso relativo tolerado (0.25 = un 25 % más)
+        min_delta (dict): exceso absoluto mínimo por métrica para contar como regresión
+
+    Returns:
+        list: dicts con case, metric, value, baseline y limit de cada regresión
+    """
+    if min_delta is None:
+        min_delta = DEFAULT_MIN_DELTA
+    regressions = []
+    base_results = baseline.get("results", {})
+    for name, result in results.get("results", {}).items():
+        base = base_results.get(name)
+        if base is None:
+            continue
+        for metric, slack in min_delta.items():
+            if metric not in result or metric not in base:
+                continue
+            limit = max(base[metric] * (1 + margin), base[metric] + slack)
+            if result[metric] > limit:
+                regressions.append({"case": name, "metric": metric, "value": result[metric],
+                                    "baseline": base[metric], "limit": limit})
+    return regressions
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def save_results(results, path):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2)
+
+
+def print_progress(name, result):
+    """Imprime una línea por caso medido (para `run_benchmarks(progress=...)`)."""
+    print(f"{name:<34} {result['seconds'] * 1000:>9.1f} ms {result['min'] * 1000:>9.1f} ms "
+          f"{result['peak_bytes'] / 1024:>10.0f} KiB")
+
+
+def print_regressions(regressions):
+    """Imprime las regresiones detectadas por `compare`."""
+    for regression in regressions:
+        print(f"REGRESIÓN {regression['case']} ({regression['metric']}): "
+              f"{regression['value']:.4g} > {regression['limit']:.4g} "
+              f"(base {regression['baseline']:.4g})")
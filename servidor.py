@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""Servicio de render residente con API HTTP local (TCP en localhost o socket Unix).
+
+Un único proceso mantiene calientes las fuentes, las capas estáticas, los sprites,
+las métricas de texto y python-docx ya importado, y atiende peticiones de render:
+
+- GET  /render.png | /render.svg | /render.docx: el modelo de flujos integrado
+- POST /render.png | /render.svg | /render.docx: el modelo va en el cuerpo (JSON con
+  la forma de `modelo.DEFAULT_FLOW`)
+- GET  /health: estadísticas del servicio en JSON
+
+El parámetro de consulta `preset` elige el perfil de codificación de la imagen (ver
+`codificacion`) y, en /render.png, `mode` el modo de render ('draft' para
+previsualizar mientras se edita, 'hq' para imprimir; ver `modos`). Las peticiones se
+reparten en un pool de hilos (las cachés son del proceso y se comparten); las
+peticiones idénticas en curso se atienden con un único render y los resultados
+recientes se guardan en una caché LRU acotada por número de entradas y por bytes.
+
+Funciones públicas:
+- RenderService(workers, max_entries, max_bytes): render con deduplicación y caché
+- make_server(service, host, port, unix_socket): servidor HTTP sobre TCP o socket Unix
+- serve(host, port, unix_socket, workers, max_entries): arranca el servicio (bloqueante)
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("png", "svg", "docx")
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+DEFAULT_PORT = 8765
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Tamaño máximo del cuerpo de una petición POST (modelo de flujos en JSON)
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+
+class RenderService:
+    """Render de PNG/SVG/DOCX con un pool de hilos, deduplicación y caché de resultados.
+
+    Args:
+        workers (int): hilos de render. Si es None, uno por CPU.
+        max_entries (int): número máximo de resultados en caché.
+        max_bytes (int): tamaño total máximo de los resultados en caché.
+    """
+
+    def __init__(self, workers=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix="render")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def warm(self):
+        """Carga fuentes, capas y python-docx antes de la primera petición."""
+        from .fuentes import warm_fonts
+
+        warm_fonts()
+        self.render("png")
+        self.render("docx")
+
+    def _key(self, fmt, model, preset, mode=None):
+        from .codificacion import get_preset
+        from .modos import encoding_preset, get_mode
+
+        # El modo sólo afecta a /render.png; el DOCX embebe siempre el render normal
+        mode = get_mode(mode) if fmt == "png" else None
+        preset = tuple(get_preset(encoding_preset(mode, preset))) if fmt != "svg" else None
+        return fmt, preset, mode and mode.name, model.digest()
+
+    def submit(self, fmt, flow=None, preset=None, mode=None):
+        """Encola un render y devuelve un `Future` con los bytes.
+
+        Si el resultado está en caché el future ya está resuelto; si hay un render
+        idéntico en curso se devuelve el mismo future.
+
+        Raises:
+            ValueError: si el formato, el perfil o el modo no existen.
+        """
+        from .modelo import resolve_flow
+
+        if fmt not in FORMATS:
+            raise ValueError(f"formato desconocido: {fmt!r} (disponibles: {list(FORMATS)})")
+        model = resolve_flow(flow)
+        key = self._key(fmt, model, preset, mode)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(data)
+                return future
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.shared += 1
+                return future
+            self.misses += 1
+            future = self._pool.submit(self._render, key, fmt, model, preset, mode)
+            self._in_flight[key] = future
+            return future
+
+    def render(self, fmt, flow=None, preset=None, mode=None):
+        """Como `submit`, pero espera y devuelve los bytes."""
+        return self.submit(fmt, flow, preset, mode).result()
+
+    def _render(self, key, fmt, model, preset, mode=None):
+        from . import diagrama
+
+        try:
+            if fmt == "svg":
+                data = diagrama.render_svg_bytes(model)
+            elif fmt == "png":
+                data = diagrama.render_png_bytes(model, preset, mode)
+            else:
+                data = diagrama.render_word_bytes(self._docx_image(model, preset), model)
+        except BaseException:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            raise
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._store(key, data)
+        return data
+
+    def _docx_image(self, model, preset):
+        """PNG para el DOCX: el de la caché si ya se renderizó (WebP no se puede embeber)."""
+        from .codificacion import get_preset
+
+        if get_preset(preset).format != "PNG":
+            return None
+        with self._lock:
+            return self._cache.get(self._key("png", model, preset))
+
+    def _store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._cache[key] = data
+        self._cache_bytes += len(data)
+        while len(self._cache) > self.max_entries or self._cache_bytes > self.max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    def stats(self):
+        """Estadísticas: hits, misses, shared (deduplicadas), in_flight, caché y workers."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "shared": self.shared,
+                    "in_flight": len(self._in_flight), "entries": len(self._cache),
+                    "bytes": self._cache_bytes, "max_entries": self.max_entries,
+                    "max_bytes": self.max_bytes, "workers": self.workers}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+class _RenderHandler(BaseHTTPRequestHandler):
+    server_version = "CreateExpediente"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        self._handle(None)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Sin una longitud válida no se sabe dónde acaba el cuerpo
+            self.close_connection = True
+            self._send_error(400, "Content-Length no válido")
+            return
+        if length > MAX_REQUEST_BYTES:
+            # El cuerpo no se lee: la conexión no puede reutilizarse
+            self.close_connection = True
+            self._send_error(413, "el modelo es demasiado grande")
+            return
+        try:
+            flow = json.loads(self.rfile.read(length) or b"null")
+        except ValueError as exc:
+            self._send_error(400, f"JSON no válido: {exc}")
+            return
+        if not isinstance(flow, dict):
+            # Nada de rutas ni otros valores: sólo el modelo en línea
+            self._send_error(400, "el cuerpo debe ser un objeto JSON con el modelo de flujos")
+            return
+        self._handle(flow)
+
+    def _handle(self, flow):
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == "/health":
+            self._send(200, "application/json", json.dumps(service.stats()).encode("utf-8"))
+            return
+        name, _, fmt = url.path.lstrip("/").partition(".")
+        if name != "render" or fmt not in FORMATS:
+            self._send_error(404, f"ruta desconocida: {url.path}")
+            return
+        query = parse_qs(url.query)
+        preset = (query.get("preset") or [None])[0]
+        mode = (query.get("mode") or [None])[0]
+        try:
+            data = service.render(fmt, flow, preset, mode)
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send_error(400, str(exc))
+            return
+        except Exception as exc:
+            logger.exception("Error renderizando %s", self.path)
+            self._send_error(500, str(exc))
+            return
+        if fmt == "png":
+            from .codificacion import get_preset
+            fmt = get_preset(preset).format.lower()
+        self._send(200, CONTENT_TYPES[fmt], data)
+
+    def _send_error(self, status, message):
+        body = json.dumps({"error": message}).encode("utf-8")
+        self._send(status, "application/json", body)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler espera una dirección (host, puerto)
+        return request, ("unix", 0)
+
+
+def _remove_stale_socket(path):
+    """Borra `path` sólo si es un socket Unix abandonado (nadie acepta conexiones).
+
+    Raises:
+        FileExistsError: si `path` no es un socket o hay un servicio escuchando en él.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} existe y no es un socket; no se sobrescribe")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+        except FileNotFoundError:
+            return
+    raise FileExistsError(f"ya hay un servicio escuchando en {path}")
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, unix_socket=None):
+    """Crea el servidor HTTP del servicio (sin arrancarlo).
+
+    Args:
+        service (RenderService): servicio de render
+        host, port: dirección TCP (por defecto sólo localhost; port=0 elige uno libre)
+        unix_socket (str): ruta de un socket Unix; si se indica, se usa en lugar de TCP.
+            Un socket abandonado en esa ruta se reemplaza; cualquier otra cosa no.
+
+    Returns:
+        socketserver.BaseServer: servidor con `serve_forever()` y `shutdown()`
+
+    Raises:
+        FileExistsError: si la ruta del socket es otro fichero o un servicio en marcha.
+    """
+    if unix_socket:
+        _remove_stale_socket(unix_socket)
+        server = _UnixHTTPServer(unix_socket, _RenderHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _RenderHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, unix_socket=None, workers=None,
+          max_entries=DEFAULT_MAX_ENTRIES):
+    """Arranca el servicio y atiende peticiones hasta Ctrl+C.
+
+    El puerto o el socket se reservan antes de calentar el servicio, así que un
+    puerto ocupado o un socket en uso fallan en el acto.
+
+    Raises:
+        OSError: si no se puede abrir el puerto o el socket (ver `make_server`).
+    """
+    service = RenderService(workers, max_entries)
+    try:
+        server = make_server(service, host, port, unix_socket)
+        try:
+            service.warm()
+            where = unix_socket or "http://{}:{}".format(*server.server_address[:2])
+            print(f"Sirviendo en {where} con {service.workers} hilos de render", flush=True)
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if unix_socket:
+                try:
+                    _remove_stale_socket(unix_socket)
+                except FileExistsError as exc:
+                    logger.warning("No se borra el socket al salir: %s", exc)
+    finally:
+        service.close()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Temas de color del diagrama.
+
+Un tema fija todos los colores que no vienen del modelo (fondo, título, leyenda,
+bordes, sombras, flechas y etiquetas) y, opcionalmente, una paleta que sustituye a
+los colores de los sistemas. Cambiar de tema no cambia la geometría: el layout y
+las medidas de texto se reutilizan (ver `variantes`).
+
+Temas incluidos:
+- light: el aspecto de siempre (fondo gris muy claro y los colores del modelo)
+- high-contrast: fondo blanco, trazos negros, sin sombras y sistemas en colores
+  oscuros saturados con texto blanco
+
+Funciones públicas:
+- get_theme(theme): tema por nombre (o el propio `Theme`)
+- system_colors(theme, model): color de relleno de cada sistema con ese tema
+- text_color(theme, fill): color del texto sobre una caja
+"""
+from collections import namedtuple
+
+Theme = namedtuple(
+    "Theme", "name background title title_shadow rule legend_fill legend_outline "
+             "legend_text border shadow text_dark text_light arrow label_fill "
+             "label_outline palette")
+
+LIGHT = Theme(
+    name="light",
+    background=(248, 250, 252),    # Fondo gris muy claro para mejor contraste
+    title=(20, 20, 20),
+    title_shadow=(180, 180, 180),
+    rule=(100, 100, 100),
+    legend_fill=(255, 255, 255),
+    legend_outline=(180, 180, 180),
+    legend_text=(0, 0, 0),
+    border=(30, 50, 80),
+    shadow=(200, 200, 200),        # Color para sombras
+    text_dark=(0, 0, 0),
+    text_light=(255, 255, 255),
+    arrow=(40, 40, 40),
+    label_fill=(255, 255, 255),
+    label_outline=(150, 150, 150),
+    palette=None,
+)
+
+HIGH_CONTRAST = Theme(
+    name="high-contrast",
+    background=(255, 255, 255),
+    title=(0, 0, 0),
+    title_shadow=None,
+    rule=(0, 0, 0),
+    legend_fill=(255, 255, 255),
+    legend_outline=(0, 0, 0),
+    legend_text=(0, 0, 0),
+    border=(0, 0, 0),
+    shadow=None,
+    text_dark=(0, 0, 0),
+    text_light=(255, 255, 255),
+    arrow=(0, 0, 0),
+    label_fill=(255, 255, 255),
+    label_outline=(0, 0, 0),
+    # Colores oscuros: el texto blanco de las cajas cumple con holgura WCAG AA
+    palette=((0, 45, 140), (0, 95, 0), (150, 0, 0), (90, 0, 130), (0, 0, 0), (110, 55, 0)),
+)
+
+THEMES = {theme.name: theme for theme in (LIGHT, HIGH_CONTRAST)}
+
+DEFAULT_THEME = "light"
+
+
+def get_theme(theme=None):
+    """Devuelve el tema `theme` (nombre o `Theme`); None es `DEFAULT_THEME`.
+
+    Raises:
+        ValueError: si el tema no existe.
+    """
+    if theme is None:
+        theme = DEFAULT_THEME
+    if isinstance(theme, Theme):
+        return theme
+    try:
+        return THEMES[theme]
+    except KeyError:
+        raise ValueError(f"tema desconocido: {theme!r} (disponibles: {sorted(THEMES)})")
+
+
+def system_colors(theme, model):
+    """{clave de sistema: color RGB}: los del modelo o, si el tema tiene paleta, los suyos."""
+    theme = get_theme(theme)
+    if theme.palette is None:
+        return {system.key: system.color for system in model.systems}
+    return {system.key: theme.palette[i % len(theme.palette)]
+            for i, system in enumerate(model.systems)}
+
+
+def text_color(theme, fill):
+    """Color del texto sobre una caja de relleno `fill` (claro sobre oscuro y viceversa)."""
+    return theme.text_light if sum(fill[:3]) < 400 else theme.text_dark
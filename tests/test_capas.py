@@ -0,0 +1,51 @@
+import unittest
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+from CreateExpediente import capas
+
+
+class TestLayerCache(unittest.TestCase):
+    def setUp(self):
+        capas.clear_layer_cache()
+
+    def test_box_sprite_is_cached_and_matches_direct_drawing(self):
+        sprite = capas.box_sprite(120, 60, (54, 126, 223))
+        self.assertIs(capas.box_sprite(120, 60, (54, 126, 223)), sprite)
+        self.assertEqual(capas.layer_cache_info()["sprites"]["hits"], 1)
+
+        pasted = Image.new("RGB", (200, 100), capas.BG_COLOR)
+        capas.paste_box(pasted, 10, 20, 120, 60, (54, 126, 223))
+        direct = Image.new("RGB", (200, 100), capas.BG_COLOR)
+        draw = ImageDraw.Draw(direct)
+        draw.rounded_rectangle([14, 24, 134, 84], radius=15, fill=capas.SHADOW_COLOR)
+        draw.rounded_rectangle([10, 20, 130, 80], radius=15, fill=(54, 126, 223),
+                               outline=capas.BORDER_COLOR, width=3)
+        self.assertIsNone(ImageChops.difference(pasted, direct).getbbox())
+
+    def test_text_mask_matches_direct_drawing(self):
+        from CreateExpediente.diagrama import _load_fonts
+        font = _load_fonts()[1]
+        for x, y in [(10, 12), (10.5, 12.25), (3.75, 0.5)]:
+            pasted = Image.new("RGB", (400, 60), capas.BG_COLOR)
+            capas.paste_text(pasted, x, y, "POST /api/v1/jóvenes", font, (40, 40, 40))
+            capas.paste_text(pasted, x, y + 25, "POST /api/v1/jóvenes", font, (200, 0, 0))
+            direct = Image.new("RGB", (400, 60), capas.BG_COLOR)
+            ImageDraw.Draw(direct).text((x, y), "POST /api/v1/jóvenes", font=font,
+                                        fill=(40, 40, 40))
+            ImageDraw.Draw(direct).text((x, y + 25), "POST /api/v1/jóvenes", font=font,
+                                        fill=(200, 0, 0))
+            self.assertIsNone(ImageChops.difference(pasted, direct).getbbox())
+        # La misma máscara sirve para cualquier color
+        self.assertEqual(capas.layer_cache_info()["text"]["currsize"], 3)
+
+    def test_static_layer_returns_independent_copies(self):
+        font = ImageFont.load_default()
+        legend = [("A", (1, 2, 3))]
+        first = capas.static_layer(400, 300, "Título", legend, 200, font, font)
+        ImageDraw.Draw(first).rectangle([0, 0, 50, 50], fill=(0, 0, 0))
+        second = capas.static_layer(400, 300, "Título", legend, 200, font, font)
+        self.assertEqual(second.getpixel((10, 10)), capas.BG_COLOR)
+        self.assertEqual(capas.layer_cache_info()["static"]["misses"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
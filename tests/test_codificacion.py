@@ -0,0 +1,55 @@
+import io
+import unittest
+from PIL import Image, ImageDraw, features
+
+from CreateExpediente import codificacion, render_png_bytes
+
+
+def _sample_image():
+    """Fondo, cajas planas (blanco muy cerca del fondo) y texto suavizado."""
+    img = Image.new("RGB", (400, 200), (248, 250, 252))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([10, 10, 190, 90], fill=(255, 255, 255))
+    draw.rounded_rectangle([210, 10, 390, 90], radius=15, fill=(54, 126, 223),
+                           outline=(30, 50, 80), width=3)
+    draw.ellipse([20, 110, 380, 190], fill=(76, 175, 80))
+    for i in range(0, 400, 7):
+        draw.line([(i, 100), (i + 30, 199)], fill=(40, 40, 40), width=1)
+    return img
+
+
+class TestEncodingPresets(unittest.TestCase):
+    def test_palette_keeps_flat_colors_exact(self):
+        img = _sample_image()
+        quantized = Image.open(io.BytesIO(codificacion.encode(img, "small")))
+        self.assertEqual(quantized.mode, "P")
+        rgb = quantized.convert("RGB")
+        for point in [(5, 5), (100, 50), (300, 50), (200, 150)]:
+            self.assertEqual(rgb.getpixel(point), img.getpixel(point))
+        counts = {color: n for n, color in img.getcolors(img.size[0] * img.size[1])}
+        quantized_counts = {color: n for n, color in rgb.getcolors(img.size[0] * img.size[1])}
+        self.assertEqual(quantized_counts[(255, 255, 255)], counts[(255, 255, 255)])
+
+    def test_small_is_smaller_than_default(self):
+        img = Image.open(io.BytesIO(render_png_bytes(preset="default"))).convert("RGB")
+        self.assertLess(len(codificacion.encode(img, "small")),
+                        len(codificacion.encode(img, "default")))
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ValueError):
+            codificacion.get_preset("jpeg")
+
+    @unittest.skipUnless(features.check("webp"), "Pillow sin soporte WebP")
+    def test_webp_preset(self):
+        data = render_png_bytes(preset="webp")
+        self.assertEqual(data[8:12], b"WEBP")
+        self.assertEqual(codificacion.extension("webp"), ".webp")
+
+    def test_encode_report(self):
+        report = codificacion.encode_report(_sample_image(), ["fast", "print"], repeat=1)
+        self.assertEqual([row["preset"] for row in report], ["fast", "print"])
+        self.assertTrue(all(row["bytes"] > 0 and row["seconds"] >= 0 for row in report))
+
+
+if __name__ == '__main__':
+    unittest.main()
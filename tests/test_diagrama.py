@@ -1,6 +1,11 @@
+import io
 import os
+import shutil
+import tempfile
 import unittest
-from CreateExpediente import generate_diagram
+from unittest import mock
+from CreateExpediente import generate_diagram, render_word_bytes
+from CreateExpediente import diagrama
 
 
 class TestGenerateDiagram(unittest.TestCase):
@@ -20,6 +25,42 @@ class TestGenerateDiagram(unittest.TestCase):
         self.assertTrue(os.path.exists(doc))
         self.assertTrue(os.path.getsize(doc) > 0)
 
+    def test_in_memory_returns_bytes(self):
+        png, docx = generate_diagram(in_memory=True)
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertTrue(docx.startswith(b'PK'))
+        self.assertEqual(render_word_bytes(io.BytesIO(png))[:2], b'PK')
+
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_unchanged_inputs_skip_rendering(self):
+        img, doc = generate_diagram(self.output_dir, incremental=True)
+        before = (os.stat(img).st_mtime_ns, os.stat(doc).st_mtime_ns)
+        self.assertEqual(generate_diagram(self.output_dir, incremental=True), (img, doc))
+        self.assertEqual((os.stat(img).st_mtime_ns, os.stat(doc).st_mtime_ns), before)
+
+    def test_docx_only_change_keeps_png(self):
+        img, doc = generate_diagram(self.output_dir, incremental=True)
+        img_mtime, doc_mtime = os.stat(img).st_mtime_ns, os.stat(doc).st_mtime_ns
+        with mock.patch.object(diagrama, '_docx_fingerprint', return_value='otro'):
+            generate_diagram(self.output_dir, incremental=True)
+        self.assertEqual(os.stat(img).st_mtime_ns, img_mtime)
+        self.assertNotEqual(os.stat(doc).st_mtime_ns, doc_mtime)
+
+    def test_touched_output_is_rebuilt(self):
+        img, _ = generate_diagram(self.output_dir, incremental=True)
+        size = os.path.getsize(img)
+        with open(img, 'ab') as fh:
+            fh.write(b'x')
+        generate_diagram(self.output_dir, incremental=True)
+        self.assertEqual(os.path.getsize(img), size)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+from CreateExpediente.fuentes import FontRegistry, get_registry
+
+
+class TestFontRegistry(unittest.TestCase):
+    def setUp(self):
+        path = get_registry().find("DejaVuSans.ttf")
+        if path is None:
+            self.skipTest("DejaVuSans.ttf no está instalada")
+        self.tmp = tempfile.mkdtemp()
+        self.font_dir = os.path.join(self.tmp, "fonts")
+        os.makedirs(self.font_dir)
+        shutil.copy(path, self.font_dir)
+        self.index_path = os.path.join(self.tmp, "index.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_index_is_persisted_and_reused(self):
+        registry = FontRegistry([self.font_dir], index_path=self.index_path)
+        self.assertIsNotNone(registry.find("dejavusans.ttf"))
+        self.assertIsNotNone(registry.find_family("DejaVu Sans", "Book"))
+        self.assertTrue(os.path.exists(self.index_path))
+        other = FontRegistry([self.font_dir], index_path=self.index_path)
+        self.assertEqual(other.index, registry.index)
+
+    def test_font_objects_are_cached(self):
+        registry = FontRegistry([self.font_dir], index_path=False, max_fonts=2)
+        font = registry.truetype("DejaVuSans.ttf", 16)
+        self.assertIs(registry.truetype("DejaVuSans.ttf", 16), font)
+        registry.truetype("DejaVuSans.ttf", 12)
+        registry.truetype("DejaVuSans.ttf", 10)
+        self.assertEqual(registry.cache_info()["currsize"], 2)
+        self.assertIsNot(registry.truetype("DejaVuSans.ttf", 16), font)
+
+    def test_missing_font_raises_and_invalidate_clears(self):
+        registry = FontRegistry([self.font_dir], index_path=False)
+        with self.assertRaises(OSError):
+            registry.truetype("noexiste.ttf", 12)
+        self.assertEqual(registry.warm([("DejaVuSans.ttf", 12), ("noexiste.ttf", 12)]), 1)
+        registry.invalidate()
+        self.assertEqual(registry.cache_info()["currsize"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import CreateExpediente
+
+_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(CreateExpediente.__file__)))
+
+_PROBE = """
+import json, sys
+{code}
+print(json.dumps({{name: name in sys.modules for name in ("PIL", "docx", "lxml")}}))
+"""
+
+
+def _loaded_modules(code):
+    """Ejecuta `code` en un intérprete limpio y devuelve qué dependencias pesadas cargó."""
+    env = dict(os.environ, PYTHONPATH=_PARENT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    out = subprocess.run([sys.executable, "-c", _PROBE.format(code=code)], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_package_import_is_light(self):
+        loaded = _loaded_modules("import CreateExpediente")
+        self.assertEqual(loaded, {"PIL": False, "docx": False, "lxml": False})
+
+    def test_png_only_path_does_not_import_docx(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            loaded = _loaded_modules(
+                "import CreateExpediente\n"
+                f"CreateExpediente.generate_png_only({tmp!r})\n"
+                "CreateExpediente.render_png_bytes()")
+        self.assertTrue(loaded["PIL"])
+        self.assertFalse(loaded["docx"])
+        self.assertFalse(loaded["lxml"])
+
+    def test_lazy_attributes(self):
+        self.assertIn("generate_diagram", dir(CreateExpediente))
+        self.assertTrue(callable(CreateExpediente.render_word_bytes))
+        with self.assertRaises(AttributeError):
+            CreateExpediente.no_existe
+
+
+if __name__ == '__main__':
+    unittest.main()
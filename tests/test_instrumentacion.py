@@ -0,0 +1,83 @@
+import contextlib
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+from CreateExpediente import generate_diagram, instrumentacion, render_png_bytes
+from CreateExpediente.diagrama import main
+from CreateExpediente.lote import run_job
+
+
+class _Recorder(instrumentacion.Hooks):
+    def __init__(self):
+        self.events = []
+
+    def on_span_start(self, path):
+        self.events.append(("start", path))
+
+    def on_span_end(self, path, seconds):
+        self.events.append(("end", path))
+
+    def on_count(self, name, value):
+        self.events.append(("count", name))
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_disabled_spans_are_shared_no_ops(self):
+        self.assertFalse(instrumentacion.enabled())
+        self.assertIs(instrumentacion.span("a"), instrumentacion.span("b"))
+
+    def test_hooks_receive_nested_spans_and_counters(self):
+        recorder = _Recorder()
+        instrumentacion.add_hook(recorder)
+        try:
+            render_png_bytes()
+        finally:
+            instrumentacion.remove_hook(recorder)
+        self.assertIn(("start", "draw"), recorder.events)
+        self.assertIn(("end", "draw/layout"), recorder.events)
+        self.assertIn(("end", "encode"), recorder.events)
+        self.assertIn(("count", "text_measurements"), recorder.events)
+        self.assertFalse(instrumentacion.enabled())
+
+    def test_profile_breaks_down_generate_diagram(self):
+        with instrumentacion.profile() as profiler:
+            img, doc = generate_diagram(self.tmp)
+        report = profiler.report()
+        for stage in ("generate_diagram", "generate_diagram/draw/boxes",
+                      "generate_diagram/encode", "generate_diagram/docx/save"):
+            self.assertEqual(report["spans"][stage]["calls"], 1)
+        self.assertEqual(report["counters"]["bytes_written"],
+                         os.path.getsize(img) + os.path.getsize(doc))
+
+    def test_cli_profile_outputs(self):
+        profile_json = os.path.join(self.tmp, "perfil.json")
+        profile_stats = os.path.join(self.tmp, "perfil.prof")
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["-o", self.tmp, "--profile-json", profile_json,
+                  "--profile-stats", profile_stats])
+        self.assertIn("generate_diagram", stdout.getvalue())
+        with open(profile_json, encoding="utf-8") as fh:
+            self.assertIn("generate_diagram/docx", json.load(fh)["spans"])
+        self.assertTrue(pstats.Stats(profile_stats).total_calls > 0)
+
+    def test_batch_job_profile(self):
+        result = run_job({"name": "p", "output_dir": self.tmp, "formats": ["png"],
+                          "profile": True})
+        self.assertTrue(result["ok"])
+        self.assertIn("generate_png_only/draw", result["profile"]["spans"])
+
+
+if __name__ == '__main__':
+    unittest.main()
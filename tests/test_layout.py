@@ -0,0 +1,68 @@
+import time
+import unittest
+from CreateExpediente.layout import NODE_GAP, compute_layout
+from CreateExpediente.modelo import FlowModel, default_flow, plantuml_code, synthetic_flow
+
+
+def _flow(edges, endpoints=("a", "b", "c", "d")):
+    return FlowModel.from_dict({
+        "title": "t",
+        "systems": [{"key": "s", "name": "S", "box_size": [100, 50]}],
+        "endpoints": [{"key": k, "system": "s", "path": "/" + k} for k in endpoints],
+        "edges": [{"source": u, "target": v} for u, v in edges],
+    })
+
+
+class TestFlowModel(unittest.TestCase):
+    def test_default_flow_nodes_and_urls(self):
+        model = default_flow()
+        self.assertEqual([n.id for n in model.nodes()][:2], ["gestor", "erp_migrar"])
+        self.assertEqual(model.url("erp_migrar"), "https://erpacademico.unir.net/api/v1/migrar")
+        self.assertEqual(FlowModel.from_dict(model.to_dict()).digest(), model.digest())
+        self.assertIn("GESTOR --> ERP", plantuml_code(model))
+
+    def test_unknown_reference_raises(self):
+        with self.assertRaises(ValueError):
+            _flow([("a", "zz")])
+
+
+class TestComputeLayout(unittest.TestCase):
+    def test_default_flow_columns(self):
+        layout = compute_layout(default_flow())
+        self.assertEqual(layout.layers[0], ["gestor"])
+        self.assertEqual(set(layout.layers[1]), {"erp_migrar", "erp_ampliacion"})
+        self.assertEqual(len(layout.routes), 5)
+        for route in layout.routes:
+            x, y, w, h = layout.boxes[route.edge.target]
+            self.assertEqual(route.points[-1][0], x)
+
+    def test_boxes_do_not_overlap_within_column(self):
+        layout = compute_layout(synthetic_flow(120))
+        for column in layout.layers:
+            boxes = sorted((layout.boxes[node_id] for node_id in column), key=lambda b: b[1])
+            for upper, lower in zip(boxes, boxes[1:]):
+                self.assertGreaterEqual(lower[1] - (upper[1] + upper[3]), NODE_GAP - 1)
+
+    def test_cycles_and_long_edges(self):
+        layout = compute_layout(_flow([("a", "b"), ("b", "c"), ("c", "a"), ("a", "c")]))
+        self.assertEqual(len(layout.routes), 4)
+        back = [r for r in layout.routes if r.edge.source == "c" and r.edge.target == "a"][0]
+        ax, _, _, _ = layout.boxes["a"]
+        self.assertEqual(back.points[-1][0], ax + 100)
+        long_edge = [r for r in layout.routes if (r.edge.source, r.edge.target) == ("a", "c")][0]
+        self.assertEqual(len(long_edge.points), 4)
+
+    def test_barycenter_removes_crossings(self):
+        model = _flow([("a", "d"), ("b", "c")], endpoints=("a", "b", "c", "d"))
+        layout = compute_layout(model)
+        self.assertEqual(layout.layers[1], ["d", "c"])
+
+    def test_large_graph_is_fast(self):
+        model = synthetic_flow(500)
+        start = time.perf_counter()
+        compute_layout(model)
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import xml.etree.ElementTree as ET
+
+from CreateExpediente import diagrama, lienzos, render_svg_bytes
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+
+class TestSVGBackend(unittest.TestCase):
+    def test_svg_is_valid_xml_with_boxes_and_labels(self):
+        root = ET.fromstring(render_svg_bytes())
+        self.assertEqual(root.tag, SVG_NS + "svg")
+        texts = [el.text for el in root.iter(SVG_NS + "text")]
+        self.assertIn("GestorMapeos", texts)
+        self.assertTrue(any(t and "/api/" in t for t in texts))
+        # Al menos una caja (con sombra) por nodo del modelo
+        rects = [el for el in root.iter(SVG_NS + "rect") if el.get("rx")]
+        self.assertGreaterEqual(len(rects), 2 * len(diagrama.resolve_flow(None).nodes()))
+        self.assertTrue(list(root.iter(SVG_NS + "polygon")))
+
+    def test_svg_render_creates_no_bitmap(self):
+        with mock.patch("PIL.Image.new", side_effect=AssertionError("raster")):
+            render_svg_bytes()
+
+    def test_svg_streams_into_given_file(self):
+        stream = io.BytesIO()
+        self.assertIs(diagrama._render_svg(stream), stream)
+        self.assertTrue(stream.getvalue().rstrip().endswith(b"</svg>"))
+
+    def test_generate_diagram_with_svg_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            img, doc = diagrama.generate_diagram(tmp, backend="svg")
+            self.assertTrue(img.endswith(".svg"))
+            self.assertTrue(os.path.getsize(doc) > 0)
+            ET.parse(img)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            lienzos.get_backend("pdf")
+        with self.assertRaises(ValueError):
+            diagrama.generate_png_only(tempfile.gettempdir(), backend="pdf")
+
+    def test_backends_must_implement_every_primitive(self):
+        with self.assertRaises(TypeError):
+            lienzos.Canvas(10, 10)
+
+        class Incompleto(lienzos.Canvas):
+            def finish(self):
+                return None
+
+        with self.assertRaises(TypeError):
+            Incompleto(10, 10)
+        lienzos.PILCanvas(10, 10)
+        lienzos.SVGCanvas(10, 10, io.BytesIO())
+
+
+class TestPILBackend(unittest.TestCase):
+    def test_default_fonts_are_scaled(self):
+        from PIL import ImageFont
+        canvas = lienzos.PILCanvas(10, 10, scale=3)
+        font = ImageFont.load_default()
+        self.assertEqual(canvas._font(font).size, 3 * font.size)
+        self.assertIs(canvas._font(font), canvas._font(font))
+        self.assertIs(lienzos.PILCanvas(10, 10)._font(font), font)
+
+        bitmap = ImageFont.load_default_imagefont()
+        with self.assertLogs("CreateExpediente.lienzos", "WARNING"):
+            self.assertIs(canvas._font(bitmap), bitmap)
+
+
+if __name__ == '__main__':
+    unittest.main()
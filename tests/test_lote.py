@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+import unittest
+from CreateExpediente.lote import run_batch
+
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_batch_reports_results_and_errors(self):
+        jobs = [
+            {"name": "a", "output_dir": os.path.join(self.tmp, "a")},
+            {"output_dir": os.path.join(self.tmp, "b"), "formats": ["png"]},
+            {"name": "mal", "output_dir": os.path.join(self.tmp, "c"), "formats": ["gif"]},
+        ]
+        seen = []
+        summary = run_batch(jobs, workers=2, progress=lambda done, total, r: seen.append(done))
+        self.assertEqual((summary["total"], summary["succeeded"], summary["failed"]), (3, 2, 1))
+        self.assertEqual(sorted(seen), [1, 2, 3])
+        self.assertEqual([r["name"] for r in summary["results"]], ["a", "b", "mal"])
+        self.assertEqual(len(summary["results"][0]["outputs"]), 2)
+        self.assertTrue(os.path.exists(summary["results"][1]["outputs"][0]))
+        self.assertIn("gif", summary["results"][2]["error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
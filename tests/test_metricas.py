@@ -0,0 +1,64 @@
+import gc
+import unittest
+import weakref
+from PIL import Image, ImageDraw, ImageFont
+from CreateExpediente.diagrama import _load_fonts
+from CreateExpediente import metricas
+from CreateExpediente.metricas import TextMetrics
+
+
+class TestTextMetrics(unittest.TestCase):
+    def setUp(self):
+        self.font = _load_fonts()[1]
+        self.metrics = TextMetrics(max_entries=8)
+
+    def test_bbox_matches_textbbox_and_is_cached(self):
+        draw = ImageDraw.Draw(Image.new("RGB", (10, 10)))
+        text = "POST api/v1/expedientes-alumnos"
+        self.assertEqual(self.metrics.bbox(self.font, text),
+                         tuple(draw.textbbox((0, 0), text, font=self.font)))
+        self.metrics.bbox(self.font, text)
+        self.assertEqual(self.metrics.cache_info()["hits"], 1)
+        self.assertEqual(self.metrics.size(self.font, ""), self.metrics.size(self.font, "A"))
+
+    def test_measure_many_keeps_order_and_bound(self):
+        texts = [f"linea {i}" for i in range(20)]
+        boxes = self.metrics.measure_many(self.font, texts)
+        self.assertEqual(boxes[3], self.metrics.bbox(self.font, "linea 3"))
+        self.assertLessEqual(self.metrics.cache_info()["currsize"], 8)
+
+    def test_wrap_long_url(self):
+        url = "POST https://erpacademico.unir.net/api/v1/migrar/ampliacion/" + "x" * 60
+        lines = self.metrics.wrap(self.font, "Título\n\n" + url, 300)
+        self.assertEqual(lines[:2], ["Título", ""])
+        self.assertGreater(len(lines), 3)
+        for line in lines:
+            self.assertLessEqual(self.metrics.size(self.font, line)[0], 300)
+        self.assertEqual("".join(lines[2:]).replace(" ", ""), url.replace(" ", ""))
+
+    def test_line_height_is_constant_and_leaves_room_for_descenders(self):
+        ascent, descent = self.font.getmetrics()
+        self.assertEqual(self.metrics.line_height(self.font), ascent + descent)
+        for text in ("A", "ampliacion", "Ágil y jugoso"):
+            top, bottom = self.metrics.bbox(self.font, text)[1::2]
+            self.assertLessEqual(bottom - top, self.metrics.line_height(self.font))
+
+    def test_fonts_without_path_stay_alive_while_cached(self):
+        # Con id() como clave, una fuente nueva podía heredar el id (y las medidas)
+        # de otra ya liberada
+        font = ImageFont.load_default_imagefont()
+        box = self.metrics.bbox(font, "GET")
+        self.assertNotEqual(metricas.font_key(font),
+                            metricas.font_key(ImageFont.load_default_imagefont()))
+        ref = weakref.ref(font)
+        del font
+        gc.collect()
+        self.assertIsNotNone(ref())
+        self.assertEqual(self.metrics.bbox(ref(), "GET"), box)
+        self.metrics.clear()
+        gc.collect()
+        self.assertIsNone(ref())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from PIL import Image
+
+from CreateExpediente import diagrama, instrumentacion, render_png_bytes, render_png_image
+from CreateExpediente.modos import MODES, get_mode
+from CreateExpediente.temas import LIGHT
+
+
+def _colors(img):
+    return {color for _, color in img.getcolors(img.width * img.height)}
+
+
+class TestRenderModes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.normal = render_png_image()
+
+    def test_normal_is_the_default_render(self):
+        self.assertEqual(render_png_bytes(mode="normal"), render_png_bytes())
+        self.assertEqual(render_png_image(mode="normal").tobytes(), self.normal.tobytes())
+
+    def test_draft_is_half_size_without_shadows(self):
+        img = render_png_image(mode="draft")
+        self.assertEqual(img.size, (self.normal.width // 2, self.normal.height // 2))
+        self.assertIn(LIGHT.shadow, _colors(self.normal))
+        self.assertNotIn(LIGHT.shadow, _colors(img))
+        # Sin preset explícito se codifica con el del modo
+        self.assertEqual(render_png_bytes(mode="draft"),
+                         render_png_bytes(preset="fast", mode="draft"))
+
+    def test_hq_is_supersampled_and_reduced(self):
+        for name in ("hq", "hq4"):
+            with instrumentacion.profile() as profiler:
+                img = render_png_image(mode=name)
+            self.assertEqual(img.size, self.normal.size)
+            self.assertIn("downsample", profiler.report()["spans"])
+            # Bordes suavizados: muchos más tonos intermedios que el render normal
+            self.assertGreater(len(_colors(img)), len(_colors(self.normal)))
+
+    def test_unknown_mode(self):
+        self.assertEqual(sorted(MODES), ["draft", "hq", "hq4", "normal"])
+        self.assertIs(get_mode(MODES["hq"]), MODES["hq"])
+        with self.assertRaises(ValueError):
+            render_png_bytes(mode="rough")
+
+    def test_mode_is_part_of_the_fingerprint(self):
+        keys = {diagrama._png_fingerprint(None, "png", None, name) for name in MODES}
+        self.assertEqual(len(keys), len(MODES))
+
+    def test_docx_embeds_the_same_image_when_the_output_is_webp(self):
+        def embedded(docx):
+            with zipfile.ZipFile(io.BytesIO(docx) if isinstance(docx, bytes) else docx) as zf:
+                name = next(n for n in zf.namelist() if n.startswith("word/media/"))
+                return Image.open(io.BytesIO(zf.read(name))).convert("RGB")
+
+        for name in ("draft", "hq"):
+            webp, docx = diagrama.generate_diagram(in_memory=True, preset="webp", mode=name)
+            png = embedded(docx)
+            self.assertEqual(png.size, Image.open(io.BytesIO(webp)).size, name)
+            # El mismo PNG que genera el modo cuando la salida es PNG
+            expected = Image.open(io.BytesIO(render_png_bytes(mode=name))).convert("RGB")
+            self.assertEqual(png.tobytes(), expected.tobytes(), name)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sizes = []
+            for name in ("draft", "hq"):
+                _, doc_path = diagrama.generate_diagram(tmp, incremental=True, preset="webp",
+                                                        mode=name)
+                sizes.append(embedded(doc_path).size)
+            # Cambiar sólo el modo rehace también el DOCX
+            self.assertEqual(sizes, [(self.normal.width // 2, self.normal.height // 2),
+                                     self.normal.size])
+
+    def test_cli_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(diagrama.main(["-o", tmp, "--mode", "draft"]), 0)
+            with Image.open(os.path.join(tmp, "diagram_expedientes_flow.png")) as img:
+                self.assertEqual(img.width, self.normal.width // 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from CreateExpediente import diagrama, openapi
+from CreateExpediente.layout import compute_layout
+from CreateExpediente.modelo import FlowModel, default_flow
+
+try:
+    import yaml
+except ImportError:  # PyYAML es opcional
+    yaml = None
+
+_SPEC = {
+    "openapi": "3.0.1",
+    "components": {"schemas": {"Plan": {"type": "object", "description": "llaves } y ] \"sueltas\"",
+                                        "properties": {"paths": {"type": "array", "items": [{}]}}}}},
+    "info": {"title": "ERP Académico", "version": "v1"},
+    "paths": {
+        "/api/v1/migrar": {
+            "parameters": [{"name": "x", "in": "query"}],
+            "post": {"tags": ["Migración"], "summary": "Migrar \"primera\" {matrícula}",
+                     "operationId": "Migrar",
+                     "responses": {"200": {"description": "ok", "content": {"get": {}}}}},
+        },
+        "/api/v1/planes/{id}": {
+            "get": {"tags": ["Planes", "Lectura"], "operationId": "GetPlan"},
+            "delete": {"summary": "Borrar plan"},
+        },
+        "/api/v2/alumnos": {"get": {"tags": ["Alumnos"], "summary": "Listar\\alumnos"}},
+    },
+    "servers": [{"url": "https://erpacademico.unir.net/", "variables": {"v": {"default": "1"}}}],
+}
+
+_EXPECTED = [
+    ("POST", "/api/v1/migrar", ("Migración",), 'Migrar "primera" {matrícula}', "Migrar"),
+    ("GET", "/api/v1/planes/{id}", ("Planes", "Lectura"), None, "GetPlan"),
+    ("DELETE", "/api/v1/planes/{id}", (), "Borrar plan", None),
+    ("GET", "/api/v2/alumnos", ("Alumnos",), "Listar\\alumnos", None),
+]
+
+
+class TestStreamingParser(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def _write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+        return path
+
+    def test_json_any_chunk_size(self):
+        for indent in (None, 2):
+            path = self._write("spec.json", json.dumps(_SPEC, indent=indent))
+            for chunk_size in (1, 3, 7, 64, openapi.CHUNK_SIZE):
+                meta = {}
+                operations = [tuple(op) for op in
+                               openapi.iter_operations(path, meta, chunk_size=chunk_size)]
+                self.assertEqual(operations, _EXPECTED, (indent, chunk_size))
+                self.assertEqual(meta, {"title": "ERP Académico",
+                                        "server": "https://erpacademico.unir.net/"})
+
+    def test_deeply_nested_subtrees_are_skipped(self):
+        deep = {}
+        for level in range(3 * openapi.SKIP_DEPTH):
+            # Hermanos de varias profundidades antes y después del hijo profundo
+            deep = {"a": [{"b": [level, {"c": "]"}]}, deep, "}", [[{}]]]}
+        spec = dict(_SPEC, components=deep, paths=dict(_SPEC["paths"], **{"/x": {"get": deep}}))
+        path = self._write("deep.json", json.dumps(spec))
+        for chunk_size in (1, 5, 64, openapi.CHUNK_SIZE):
+            operations = list(openapi.iter_operations(path, chunk_size=chunk_size))
+            self.assertEqual([tuple(op) for op in operations[:4]], _EXPECTED)
+            self.assertEqual(operations[4].path, "/x")
+
+    def test_truncated_json_is_an_error(self):
+        text = json.dumps(_SPEC)
+        path = self._write("roto.json", text[:len(text) // 2])
+        with self.assertRaises(ValueError):
+            list(openapi.iter_operations(path, chunk_size=16))
+
+    @unittest.skipIf(yaml is None, "PyYAML no está instalado")
+    def test_yaml_and_swagger_base_url(self):
+        spec = dict(_SPEC, swagger="2.0", host="erp.unir.net", basePath="/base")
+        del spec["servers"]
+        path = self._write("spec.yaml", yaml.safe_dump(spec, allow_unicode=True, sort_keys=False))
+        self.assertEqual([tuple(op) for op in openapi.iter_operations(path)], _EXPECTED)
+        self.assertEqual(openapi.read_spec(path).base_url, "https://erp.unir.net/base")
+
+    def test_filters_and_groups(self):
+        path = self._write("spec.json", json.dumps(_SPEC))
+        spec = openapi.read_spec(path, tags=["Planes", "Alumnos"], methods=["get"])
+        self.assertEqual(spec.title, "ERP Académico")
+        self.assertEqual(spec.base_url, "https://erpacademico.unir.net")
+        self.assertEqual([op.path for op in spec.operations], ["/api/v1/planes/{id}", "/api/v2/alumnos"])
+        spec = openapi.read_spec(path, paths=["/api/v1/*"])
+        self.assertEqual(len(spec.operations), 3)
+
+        operations = openapi.read_spec(path).operations
+        self.assertEqual(list(openapi.group_operations(operations, "tag")),
+                         ["Migración", "Planes", "", "Alumnos"])
+        self.assertEqual(list(openapi.group_operations(operations, "path")),
+                         ["migrar", "planes", "alumnos"])
+        with self.assertRaises(ValueError):
+            openapi.group_operations(operations, "sistema")
+
+
+class TestImportFlow(unittest.TestCase):
+    def _spec(self, *operations):
+        ops = [openapi.Operation(method, path, tags, None, None)
+               for method, path, tags in operations]
+        return openapi.ApiSpec("ERP real", "https://otro.unir.net", ops)
+
+    def test_merge_keeps_hand_endpoints_edges_and_flows(self):
+        spec = self._spec(("POST", "/api/v1/migrar", ()), ("GET", "/api/v1/planes", ()))
+        with self.assertLogs("CreateExpediente.openapi", "WARNING") as logs:
+            model = openapi.import_flow([("erp", spec)], default_flow())
+        self.assertIn("/api/v1/migrar/ampliacion", logs.output[0])
+        erp = [e.key for e in model.endpoints_of("erp")]
+        self.assertEqual(erp, ["erp_migrar", "erp_get_api_v1_planes", "erp_ampliacion"])
+        self.assertEqual(model.endpoint("erp_migrar").caption, "API Primera Matrícula")
+        self.assertEqual(model.edges, default_flow().edges)
+        self.assertEqual(model.flows, default_flow().flows)
+        # La URL del sistema del modelo manda sobre la de la especificación
+        self.assertEqual(model.system("erp").base_url, "https://erpacademico.unir.net")
+
+    def test_groups_become_systems_with_own_columns(self):
+        spec = self._spec(("GET", "/a", ("Uno",)), ("GET", "/b", ("Dos",)), ("PUT", "/a", ("Uno",)))
+        model = openapi.import_flow([("api", spec)], group_by="tag")
+        self.assertEqual(model.title, "ERP real")
+        self.assertEqual([s.key for s in model.systems], ["api_uno", "api_dos"])
+        self.assertEqual(model.system("api_dos").name, "ERP real · Dos")
+        layers = compute_layout(model).layers
+        self.assertEqual(len(layers), 2)  # sin aristas: una columna por sistema
+        self.assertIn("rectangle \"ERP real · Uno\\nGET /a\\nPUT /a\"", diagrama.plantuml_code(model))
+
+    def test_hundreds_of_operations_wrap_into_a_block(self):
+        spec = self._spec(*((method, f"/api/v1/recurso-{i}/{{id}}", ())
+                            for i in range(300) for method in ("GET", "POST")))
+        for base in (None, default_flow()):
+            with self.assertLogs("CreateExpediente.openapi", "WARNING") if base else \
+                    contextlib.nullcontext():
+                model = openapi.import_flow([("erp", spec)], base)
+            img = diagrama.render_png_image(model, mode="draft")
+            # Antes: una única columna de 1900x84916 px
+            self.assertLess(max(img.size), 2 * min(img.size))
+            self.assertLess(img.width * img.height, 25_000_000)
+            boxes = compute_layout(model).boxes.values()
+            self.assertEqual(len({(x, y) for x, y, _, _ in boxes}), len(boxes))
+
+    def test_box_system_cannot_receive_endpoints(self):
+        with self.assertRaises(ValueError):
+            openapi.import_flow([("gestor", self._spec(("GET", "/x", ())))], default_flow())
+
+
+class TestOpenAPICommand(unittest.TestCase):
+    def test_cli_generates_and_saves_the_flow(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec = os.path.join(tmp, "erp.json")
+            with open(spec, "w", encoding="utf-8") as fh:
+                json.dump(_SPEC, fh)
+            saved = os.path.join(tmp, "modelo.json")
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                code = diagrama.main(["-o", tmp, "--preset", "fast", "openapi", f"erp={spec}",
+                                      "--methods", "post,get", "--save-flow", saved])
+            self.assertEqual(code, 0)
+            self.assertIn("doc:", out.getvalue())
+            with open(saved, encoding="utf-8") as fh:
+                model = FlowModel.from_dict(json.load(fh))
+            self.assertEqual([e.path for e in model.endpoints_of("erp")],
+                             ["/api/v1/migrar", "/api/v1/planes/{id}", "/api/v2/alumnos",
+                              "/api/v1/migrar/ampliacion"])
+            self.assertEqual(openapi.parse_spec_argument(spec), ("erp", spec))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import io
+import unittest
+import zipfile
+from PIL import Image
+from docx import Document
+
+from CreateExpediente import diagrama, plantilla, render_png_bytes
+from CreateExpediente.modelo import default_flow, synthetic_flow
+
+
+def _parts(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return {name: package.read(name) for name in package.namelist()}
+
+
+def _document_xml(data):
+    xml = _parts(data)["word/document.xml"].decode("utf-8")
+    return xml[xml.index("<w:document"):]
+
+
+class TestDocxTemplate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = default_flow()
+        cls.png = render_png_bytes(cls.model, preset="fast")
+        cls.blocks = diagrama._document_blocks(cls.model)
+
+    def _render(self, blocks=None, image=None):
+        buffer = io.BytesIO()
+        plantilla.render_docx(blocks or self.blocks, image or self.png, buffer)
+        return buffer.getvalue()
+
+    def _build(self, blocks=None, image=None):
+        buffer = io.BytesIO()
+        plantilla.build_docx(blocks or self.blocks, image or self.png, buffer)
+        return buffer.getvalue()
+
+    def test_same_document_as_python_docx(self):
+        for model in (self.model, synthetic_flow(25)):
+            blocks = diagrama._document_blocks(model)
+            self.assertEqual(_document_xml(self._render(blocks)),
+                             _document_xml(self._build(blocks)))
+
+    def test_package_is_readable(self):
+        data = self._render()
+        self.assertIsNone(zipfile.ZipFile(io.BytesIO(data)).testzip())
+        doc = Document(io.BytesIO(data))
+        self.assertEqual(doc.paragraphs[0].style.name, "Heading 1")
+        self.assertTrue(any(p.style.name == "List Bullet 2" for p in doc.paragraphs))
+        self.assertEqual(len(doc.inline_shapes), 1)
+
+    def test_image_and_extent_are_replaced(self):
+        wide = io.BytesIO()
+        Image.new("RGB", (400, 100), "white").save(wide, "PNG")
+        parts = _parts(self._render(image=wide.getvalue()))
+        self.assertEqual(parts[plantilla.get_template().image_name], wide.getvalue())
+        shape = Document(io.BytesIO(self._render(image=wide.getvalue()))).inline_shapes[0]
+        self.assertEqual(shape.width, 5943600)
+        self.assertEqual(shape.height, 5943600 // 4)
+
+    def test_deterministic(self):
+        self.assertEqual(self._render(), self._render())
+
+    def test_special_characters(self):
+        blocks = [plantilla.heading("A & B <c>", 2),
+                  plantilla.paragraph(" lead\ttab\nline ", style="List Number 2"),
+                  plantilla.paragraph()]
+        self.assertEqual(_document_xml(self._render(blocks)),
+                         _document_xml(self._build(blocks)))
+
+    def test_xml_invalid_characters_are_rejected(self):
+        for text in ("tab\vvertical", "nulo\x00", "sustituto\ud800", "no\ufffe"):
+            blocks = [plantilla.paragraph(text)]
+            with self.assertRaises(ValueError):
+                self._build(blocks)
+            with self.assertRaises(ValueError):
+                self._render(blocks)
+        # Los caracteres válidos fuera del BMP se conservan
+        blocks = [plantilla.paragraph("emoji \U0001F600")]
+        self.assertEqual(_document_xml(self._render(blocks)), _document_xml(self._build(blocks)))
+
+    def test_unknown_style(self):
+        with self.assertRaises(KeyError):
+            self._render([plantilla.paragraph("x", style="No existe")])
+
+    def test_non_png_image_uses_python_docx(self):
+        jpeg = io.BytesIO()
+        Image.new("RGB", (40, 20), "white").save(jpeg, "JPEG")
+        buffer = io.BytesIO()
+        diagrama._generate_word_document(buffer, jpeg.getvalue(), self.model)
+        self.assertEqual(len(Document(io.BytesIO(buffer.getvalue())).inline_shapes), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
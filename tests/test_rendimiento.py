@@ -0,0 +1,60 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from CreateExpediente import rendimiento
+from CreateExpediente.diagrama import main
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_measure_reports_time_and_memory(self):
+        result = rendimiento.measure(lambda: bytearray(1024 * 1024), repeat=2)
+        self.assertEqual(result["runs"], 2)
+        self.assertLessEqual(result["min"], result["seconds"])
+        self.assertGreaterEqual(result["peak_bytes"], 1024 * 1024)
+
+    def test_compare_uses_relative_margin_and_absolute_slack(self):
+        baseline = {"results": {"a": {"seconds": 1.0, "peak_bytes": 10 ** 7},
+                                "b": {"seconds": 0.0001, "peak_bytes": 100}}}
+        results = {"results": {"a": {"seconds": 1.2, "peak_bytes": 2 * 10 ** 7},
+                               "b": {"seconds": 0.001, "peak_bytes": 1000},
+                               "nuevo": {"seconds": 5.0, "peak_bytes": 1}}}
+        regressions = rendimiento.compare(results, baseline, margin=0.25)
+        self.assertEqual([(r["case"], r["metric"]) for r in regressions], [("a", "peak_bytes")])
+        self.assertEqual(len(rendimiento.compare(results, baseline, margin=0.1)), 2)
+
+    def test_cli_writes_json_and_fails_on_regression(self):
+        out = os.path.join(self.tmp, "bench.json")
+        baseline = os.path.join(self.tmp, "base.json")
+        args = ["bench", "--sizes", "", "--repeat", "1", "--cold-repeat", "1", "--json", out]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(main(args), 0)
+        results = rendimiento.load_results(out)
+        for case in ("load_fonts.cold", "png.default.warm", "docx.default.cold",
+                     "diagram.default.warm", "variants4.default.warm",
+                     "png-draft.default.warm", "png-hq.default.cold", "png-hq4.default.warm",
+                     "openapi.flat", "openapi.deep"):
+            self.assertIn(case, results["results"])
+
+        # Una base irrealmente rápida y pequeña tiene que hacer fallar la ejecución
+        fast = {name: {"seconds": 0.0, "peak_bytes": 0} for name in results["results"]}
+        with open(baseline, "w", encoding="utf-8") as fh:
+            json.dump({"results": fast}, fh)
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(main(args + ["--baseline", baseline]), 1)
+        self.assertIn("REGRESIÓN", stdout.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from PIL import Image
+
+from CreateExpediente import servidor
+from CreateExpediente.modelo import DEFAULT_FLOW
+
+
+class TestRenderService(unittest.TestCase):
+    def test_identical_requests_share_one_render_and_hit_cache(self):
+        service = servidor.RenderService(workers=4)
+        calls = []
+
+        def slow_render(model, preset=None, mode=None):
+            calls.append(preset)
+            time.sleep(0.2)
+            return b"png"
+
+        try:
+            with mock.patch("CreateExpediente.diagrama.render_png_bytes", slow_render):
+                futures = [service.submit("png") for _ in range(5)]
+                self.assertEqual({f.result() for f in futures}, {b"png"})
+                self.assertEqual(service.render("png"), b"png")
+        finally:
+            service.close()
+        self.assertEqual(len(calls), 1)
+        stats = service.stats()
+        self.assertEqual((stats["misses"], stats["shared"], stats["hits"]), (1, 4, 1))
+
+    def test_cache_is_bounded(self):
+        service = servidor.RenderService(workers=1, max_entries=2)
+        try:
+            with mock.patch("CreateExpediente.diagrama.render_png_bytes",
+                            lambda model, preset=None, mode=None: b"x" * 10):
+                for preset in ("default", "fast", "small"):
+                    service.render("png", preset=preset)
+        finally:
+            service.close()
+        self.assertEqual(service.stats()["entries"], 2)
+        self.assertEqual(service.stats()["bytes"], 20)
+
+
+class TestRenderServer(unittest.TestCase):
+    def _start(self, **kwargs):
+        service = servidor.RenderService(workers=2)
+        server = servidor.make_server(service, **kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            service.close()
+        self.addCleanup(stop)
+        return server
+
+    def test_http_api(self):
+        server = self._start(port=0)
+        conn = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+        conn.request("GET", "/render.png")
+        response = conn.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "image/png")
+        self.assertTrue(response.read().startswith(b"\x89PNG"))
+
+        conn.request("POST", "/render.docx?preset=fast", body=json.dumps(DEFAULT_FLOW))
+        response = conn.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read()[:2], b"PK")
+
+        conn.request("GET", "/render.png?mode=draft")
+        response = conn.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(Image.open(io.BytesIO(response.read())).size, (950, 485))
+
+        conn.request("GET", "/render.png?mode=rough")
+        response = conn.getresponse()
+        self.assertEqual(response.status, 400)
+        response.read()
+
+        conn.request("POST", "/render.svg", body=json.dumps("/etc/passwd"))
+        response = conn.getresponse()
+        self.assertEqual(response.status, 400)
+        response.read()
+
+        for length in ("-1", "abc"):
+            bad = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+            bad.putrequest("POST", "/render.png")
+            bad.putheader("Content-Length", length)
+            bad.endheaders()
+            response = bad.getresponse()
+            self.assertEqual(response.status, 400)
+            response.read()
+            bad.close()
+
+        conn.request("GET", "/render.gif")
+        response = conn.getresponse()
+        self.assertEqual(response.status, 404)
+        response.read()
+
+        conn.request("GET", "/health")
+        self.assertEqual(json.loads(conn.getresponse().read())["misses"], 3)
+        conn.close()
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "sin sockets Unix")
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "render.sock")
+            self._start(unix_socket=path)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path)
+                sock.sendall(b"GET /render.svg HTTP/1.1\r\nHost: local\r\n"
+                             b"Connection: close\r\n\r\n")
+                chunks = []
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+        head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+        self.assertIn(b"200", head.split(b"\r\n")[0])
+        self.assertIn(b"image/svg+xml", head)
+        self.assertTrue(body.rstrip().endswith(b"</svg>"))
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "sin sockets Unix")
+    def test_unix_socket_path_is_only_replaced_when_stale(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "render.sock")
+            with open(path, "w") as fh:
+                fh.write("no es un socket")
+            service = servidor.RenderService(workers=1)
+            self.addCleanup(service.close)
+            with self.assertRaises(FileExistsError):
+                servidor.make_server(service, unix_socket=path)
+            self.assertTrue(os.path.isfile(path))
+            os.unlink(path)
+
+            # Un servicio en marcha no se puede desplazar...
+            self._start(unix_socket=path)
+            with self.assertRaises(FileExistsError):
+                servidor.make_server(service, unix_socket=path)
+
+            # ...pero el socket que deja un proceso muerto sí se reutiliza
+            stale = os.path.join(tmp, "stale.sock")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(stale)
+            sock.close()
+            server = servidor.make_server(service, unix_socket=stale)
+            server.server_close()
+
+    def test_serve_binds_before_warming_and_closes_on_failure(self):
+        busy = socket.socket()
+        self.addCleanup(busy.close)
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        with mock.patch.object(servidor.RenderService, "warm") as warm, \
+                mock.patch.object(servidor.RenderService, "close", autospec=True,
+                                  side_effect=servidor.RenderService.close) as close:
+            with self.assertRaises(OSError):
+                servidor.serve(port=busy.getsockname()[1], workers=1)
+        warm.assert_not_called()
+        close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image
+
+from CreateExpediente import instrumentacion, render_png_bytes, variantes
+from CreateExpediente.modelo import default_flow
+
+
+def _spans(profiler):
+    return {path: stats["calls"] for path, stats in profiler.report()["spans"].items()}
+
+
+class TestVariants(unittest.TestCase):
+    def test_translate_keeps_structure(self):
+        model = variantes.translate(None, "en")
+        self.assertTrue(model.title.startswith("Flows:"))
+        self.assertIn("First Enrolment", [edge.label for edge in model.edges])
+        self.assertEqual([n.id for n in model.nodes()], [n.id for n in default_flow().nodes()])
+        self.assertIs(variantes.translate(None, "es"), default_flow())
+
+    def test_layout_and_metrics_are_shared(self):
+        selected = variantes.expand(["light", "high-contrast"], ["es", "en"], [96, 192])
+        with instrumentacion.profile() as profiler:
+            results = variantes.render_variants(selected, preset="fast")
+        spans = _spans(profiler)
+        self.assertEqual(spans["variants/measure"], 2)
+        self.assertEqual(spans["variants/layout"], 1)
+        self.assertEqual(spans["variants/draw"], 8)
+        self.assertNotIn("variants/draw/layout", spans)
+        self.assertEqual(len(set(results.values())), 8)
+
+    def test_longer_labels_redo_layout(self):
+        long_caption = {"API Primera Matrícula": "Una etiqueta muy larga " * 8}
+        with mock.patch.dict(variantes.LANGUAGES, {"xx": long_caption}):
+            with instrumentacion.profile() as profiler:
+                variantes.render_variants([("light", "es", 96), ("light", "xx", 96)],
+                                          preset="fast")
+            geometries = variantes._geometries(default_flow(), ["es", "xx"])
+        self.assertEqual(_spans(profiler)["variants/layout"], 2)
+        heights = [geometries[lang][1][0].boxes["erp_migrar"][3] for lang in ("es", "xx")]
+        self.assertLess(heights[0], heights[1])
+
+    def test_default_variant_matches_single_render(self):
+        data = variantes.render_variants([variantes.variant()], preset="fast")
+        self.assertEqual(list(data.values()), [render_png_bytes(preset="fast")])
+
+    def test_theme_and_resolution(self):
+        results = variantes.render_variants([("high-contrast", "es", 96),
+                                             ("light", "es", 192)], preset="default")
+        contrast, large = (Image.open(io.BytesIO(data)) for data in results.values())
+        colors = {color for _, color in contrast.convert("RGB").getcolors(1 << 20)}
+        self.assertIn((255, 255, 255), colors)
+        self.assertIn((0, 45, 140), colors)
+        self.assertNotIn(default_flow().systems[0].color, colors)
+        single = Image.open(io.BytesIO(render_png_bytes(preset="default")))
+        self.assertEqual(large.size, (2 * single.size[0], 2 * single.size[1]))
+        self.assertEqual(round(large.info["dpi"][0]), 192)
+
+    def test_svg_and_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = variantes.write_variants(tmp, variantes.expand(languages=["es", "en"]),
+                                             backend="svg")
+            self.assertEqual([os.path.basename(p) for p in paths],
+                             ["diagram_expedientes_flow-es-light-96dpi.svg",
+                              "diagram_expedientes_flow-en-light-96dpi.svg"])
+            with open(paths[1], "rb") as fh:
+                self.assertIn(b"Academic ERP", fh.read())
+
+    def test_unknown_variant(self):
+        with self.assertRaises(ValueError):
+            variantes.variant("dark")
+        with self.assertRaises(ValueError):
+            variantes.variant(language="fr")
+        with self.assertRaises(ValueError):
+            variantes.variant(dpi=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from PIL import Image, ImageChops
+
+from CreateExpediente import diagrama, plantilla, vigilancia
+from CreateExpediente.codificacion import IncrementalEncoder, encode
+from CreateExpediente.modelo import DEFAULT_FLOW, FlowModel, default_flow, synthetic_flow
+from CreateExpediente.modos import pixel_step
+
+
+def _edited(model, edit):
+    data = model.to_dict()
+    edit(data)
+    return FlowModel.from_dict(data)
+
+
+class TestDirtyRegions(unittest.TestCase):
+    def test_only_changed_items_are_dirty(self):
+        old = [("a", (0, 0, 10, 10)), ("b", (50, 50, 60, 60))]
+        new = [("a", (0, 0, 10, 10)), ("c", (55.5, 52, 70, 61))]
+        self.assertEqual(vigilancia.dirty_regions(old, old, 1, 100, 100), [])
+        # Donde estaba y donde está, unidos, alineados y recortados al lienzo
+        self.assertEqual(vigilancia.dirty_regions(old, new, 2, 65, 100), [(50, 50, 66, 62)])
+
+    def test_region_render_matches_full_render(self):
+        for model in (default_flow(), synthetic_flow(25)):
+            geometry = diagrama._geometry(model, diagrama._load_fonts()[1])
+            layout = geometry[0]
+            rnd = random.Random(0)
+            for mode in ("normal", "draft", "hq"):
+                full = diagrama._render_png_image(model, mode, geometry)
+                step = pixel_step(mode)
+                for _ in range(8):
+                    x0 = rnd.randrange(0, layout.width - 100, step)
+                    y0 = rnd.randrange(0, layout.height - 100, step)
+                    region = (x0, y0, x0 + rnd.randrange(step, 400, step),
+                              y0 + rnd.randrange(step, 400, step))
+                    part, (x, y) = diagrama._render_png_region(model, geometry, region, mode)
+                    expected = full.crop((x, y, x + part.width, y + part.height))
+                    self.assertIsNone(ImageChops.difference(expected, part).getbbox(),
+                                      (mode, region))
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.watcher = vigilancia.Watcher(self.tmp, "fast")
+        self.model = default_flow()
+        self.first = self.watcher.refresh(self.model)
+
+    def test_first_refresh_writes_everything(self):
+        self.assertTrue(self.first.full)
+        self.assertEqual(len(self.first.docx_parts), 2)
+        with open(self.watcher.img_path, "rb") as fh:
+            self.assertEqual(fh.read(), diagrama.render_png_bytes(self.model, "fast"))
+
+    def test_label_edit_redraws_one_region(self):
+        def edit(data):
+            data["edges"][1]["label"] = "Otra etiqueta"
+        model = _edited(self.model, edit)
+        update = self.watcher.refresh(model)
+        self.assertFalse(update.full)
+        self.assertEqual(update.regions, 1)
+        self.assertEqual(update.sections, ["Código PlantUML"])
+        full = diagrama.render_png_image(model)
+        self.assertIsNone(ImageChops.difference(full, self.watcher.image).getbbox())
+        with Image.open(self.watcher.img_path) as img:
+            self.assertEqual(img.size, full.size)
+
+    def test_document_only_edit_keeps_png(self):
+        def edit(data):
+            data["flows"][0]["steps"][0]["text"] += " (editado)"
+        mtime = os.stat(self.watcher.img_path).st_mtime_ns
+        update = self.watcher.refresh(_edited(self.model, edit))
+        self.assertFalse(update.image)
+        self.assertEqual(update.docx_parts, ["word/document.xml"])
+        self.assertEqual(update.sections, ["Flujo 1 — Primera Matrícula"])
+        self.assertEqual(os.stat(self.watcher.img_path).st_mtime_ns, mtime)
+
+    def test_unchanged_model_writes_nothing(self):
+        update = self.watcher.refresh(default_flow())
+        self.assertEqual((update.full, update.regions, update.image, update.docx_parts),
+                         (False, 0, False, []))
+
+    def test_title_change_redraws_everything(self):
+        def edit(data):
+            data["title"] = "Otro título"
+        self.assertTrue(self.watcher.refresh(_edited(self.model, edit)).full)
+
+    def test_webp_is_rejected(self):
+        with self.assertRaises(ValueError):
+            vigilancia.Watcher(self.tmp, "webp")
+
+
+class TestIncrementalParts(unittest.TestCase):
+    def test_incremental_encoder_reuses_quantization(self):
+        img = diagrama.render_png_image()
+        encoder = IncrementalEncoder("fast")
+        first = encoder.encode(img)
+        self.assertEqual(first, encode(img, "fast"))
+        self.assertEqual(encoder.encode(img, regions=[(100, 100, 300, 200)]), first)
+
+    def test_docx_patcher_only_rebuilds_changed_parts(self):
+        model = default_flow()
+        png = diagrama.render_png_bytes(model, "fast")
+        blocks = diagrama._document_blocks(model)
+        patcher = plantilla.DocxPatcher()
+        data, parts = patcher.render(blocks, png)
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(data, plantilla.get_template().render(blocks, png))
+        self.assertEqual(patcher.render(blocks, png), (data, []))
+        _, parts = patcher.render(blocks[:-1], png)
+        self.assertEqual(parts, ["word/document.xml"])
+
+
+class TestPolling(unittest.TestCase):
+    def test_bursts_are_debounced(self):
+        path = os.path.join(tempfile.mkdtemp(), "flow.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(DEFAULT_FLOW, fh)
+        before = vigilancia.snapshot([path])
+
+        def burst():
+            for i in range(3):
+                time.sleep(0.05)
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write(" " * (i + 1))
+        writer = threading.Thread(target=burst)
+        writer.start()
+        after = vigilancia.wait_for_change([path], before, interval=0.02, debounce=0.15)
+        writer.join()
+        self.assertEqual(after, vigilancia.snapshot([path]))
+
+        stop = threading.Event()
+        stop.set()
+        self.assertIsNone(vigilancia.wait_for_change([path], after, stop=stop))
+
+    def test_watch_loop(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "flow.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(DEFAULT_FLOW, fh)
+        updates = []
+        stop = threading.Event()
+        thread = threading.Thread(target=vigilancia.watch, args=(path, tmp, "fast"),
+                                  kwargs={"interval": 0.02, "debounce": 0.05, "stop": stop,
+                                          "report": updates.append})
+        thread.start()
+        try:
+            deadline = time.monotonic() + 10
+            while not updates and time.monotonic() < deadline:
+                time.sleep(0.02)
+            data = json.loads(json.dumps(DEFAULT_FLOW))
+            data["edges"][0]["label"] = "Nueva"
+            # Contenido inválido a medio guardar: se ignora hasta el siguiente cambio
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write("{")
+            time.sleep(0.2)
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            while len(updates) < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(len(updates), 2)
+        self.assertFalse(updates[1].full)
+
+    def test_font_change_survives_an_invalid_save(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "flow.json")
+        font = os.path.join(tmp, "fuente.ttf")
+        for name in (path, font):
+            with open(name, "w", encoding="utf-8") as fh:
+                json.dump(DEFAULT_FLOW, fh)
+        updates = []
+        stop = threading.Event()
+        with mock.patch.object(vigilancia, "_font_paths", return_value=[font]), \
+                mock.patch.object(vigilancia, "_reset_font_caches") as reset:
+            thread = threading.Thread(target=vigilancia.watch, args=(path, tmp, "fast"),
+                                      kwargs={"interval": 0.02, "debounce": 0.05,
+                                              "stop": stop, "report": updates.append})
+            thread.start()
+            try:
+                deadline = time.monotonic() + 10
+                while not updates and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                # Fuente nueva y JSON a medio guardar en el mismo sondeo
+                with open(font, "a", encoding="utf-8") as fh:
+                    fh.write(" ")
+                with open(path, "w", encoding="utf-8") as fh:
+                    fh.write("{")
+                while not reset.called and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                time.sleep(0.2)
+                data = json.loads(json.dumps(DEFAULT_FLOW))
+                data["edges"][0]["label"] = "Nueva"
+                with open(path, "w", encoding="utf-8") as fh:
+                    json.dump(data, fh)
+                while len(updates) < 2 and time.monotonic() < deadline:
+                    time.sleep(0.02)
+            finally:
+                stop.set()
+                thread.join()
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(updates[1].full)
+
+    def test_cli_requires_flow(self):
+        with self.assertRaises(SystemExit), \
+                mock.patch("sys.stderr", io.StringIO()):
+            diagrama.main(["watch"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Variantes del mismo diagrama: temas, idiomas y resoluciones.
+
+Una variante es la combinación (tema, idioma, ppp). Renderizar N variantes no
+cuesta N renders completos:
+
+- las medidas de texto de las cajas se calculan una vez por idioma,
+- el layout se calcula una vez por cada conjunto distinto de tamaños de caja: si la
+  traducción no cambia el alto de ninguna caja se reutiliza el del otro idioma,
+- el tema y la resolución sólo cambian el pintado (colores y escala del lienzo).
+
+Las traducciones son tablas {texto original: texto traducido} en `LANGUAGES`
+(se aplican al título, sistemas, endpoints, etiquetas de las aristas y flujos; lo
+que no esté en la tabla se deja igual). Se pueden añadir idiomas a `LANGUAGES`.
+
+Funciones públicas:
+- variant(theme, language, dpi), expand(themes, languages, dpis): variantes (`Variant`)
+- translate(flow, language): modelo con los textos traducidos
+- render_variants(variants, flow, preset, backend): {Variant: bytes}
+- write_variants(output_dir, variants, flow, preset, backend): escribe los ficheros
+  (con los nombres de `variant_filename`)
+"""
+from collections import namedtuple
+import io
+import itertools
+import os
+
+from .codificacion import encode, extension, get_preset
+from .instrumentacion import count, span, traced
+from .lienzos import PILCanvas, SVGCanvas, get_backend
+from .metricas import get_metrics
+from .modelo import FlowModel, resolve_flow
+from .temas import get_theme
+
+Variant = namedtuple("Variant", "theme language dpi")
+
+# Resolución de referencia: a 96 ppp una unidad del layout es un píxel
+SCREEN_DPI = 96
+PRINT_DPI = 300
+
+LANGUAGES = {
+    "es": {},
+    "en": {
+        "Flujos: GestorMapeos - ERP Académico - Expedientes":
+            "Flows: GestorMapeos - Academic ERP - Student Records",
+        "ERP Académico": "Academic ERP",
+        "Expedientes": "Student Records",
+        "Sistema de gestión de mapeos de matrículas": "Enrolment mapping management system",
+        "Sistema de planificación de recursos académicos": "Academic resource planning system",
+        "Sistema de gestión de expedientes académicos": "Academic records management system",
+        "azul oscuro": "dark blue",
+        "azul medio": "medium blue",
+        "verde": "green",
+        "API Primera Matrícula": "First Enrolment API",
+        "API Ampliación": "Extension API",
+        "Primera migración (crear/actualizar expediente)": "First migration (create/update record)",
+        "Ampliación (no primera matrícula)": "Extension (not a first enrolment)",
+        "Crear expediente": "Create record",
+        "Modificar expediente por integración": "Update record via integration",
+        "Notificar matrícula realizada": "Notify completed enrolment",
+        "Primera Matrícula": "First Enrolment",
+        "Crear Expediente": "Create Record",
+        "Actualizar Expediente": "Update Record",
+        "Ampliación": "Extension",
+        "Matrícula Realizada": "Enrolment Completed",
+        "Ampliación (No Primera Matrícula)": "Extension (Not First Enrolment)",
+        "1. GestorMapeos envía la información de la primera matrícula":
+            "1. GestorMapeos sends the first enrolment data",
+        "2. El ERP Académico procesa y guarda la matrícula":
+            "2. The Academic ERP processes and stores the enrolment",
+        "3. Si es la PRIMERA matrícula, el ERP puede:":
+            "3. If it is the FIRST enrolment, the ERP can:",
+        "a) Crear un nuevo expediente en Expedientes:":
+            "a) Create a new record in Student Records:",
+        "b) Actualizar un expediente existente:": "b) Update an existing record:",
+        "1. GestorMapeos envía la información de ampliación":
+            "1. GestorMapeos sends the extension data",
+        "3. El ERP notifica a Expedientes que se ha realizado una matrícula:":
+            "3. The ERP notifies Student Records that an enrolment was completed:",
+        "Origen": "Source",
+        "inicio": "start",
+        "llamada": "call",
+    },
+}
+
+DEFAULT_LANGUAGE = "es"
+
+
+def variant(theme=None, language=DEFAULT_LANGUAGE, dpi=SCREEN_DPI):
+    """Variante normalizada (tema por nombre, idioma conocido y ppp enteros).
+
+    Raises:
+        ValueError: si el tema o el idioma no existen, o los ppp no son positivos.
+    """
+    if language not in LANGUAGES:
+        raise ValueError(f"idioma desconocido: {language!r} (disponibles: {sorted(LANGUAGES)})")
+    if int(dpi) <= 0:
+        raise ValueError(f"resolución no válida: {dpi!r}")
+    return Variant(get_theme(theme).name, language, int(dpi))
+
+
+def expand(themes=(None,), languages=(DEFAULT_LANGUAGE,), dpis=(SCREEN_DPI,)):
+    """Todas las combinaciones de temas, idiomas y resoluciones, en ese orden."""
+    return [variant(theme, language, dpi)
+            for theme, language, dpi in itertools.product(themes, languages, dpis)]
+
+
+def translate(flow, language):
+    """Copia del modelo con los textos traducidos.
+
+    Args:
+        flow (None | str | dict | FlowModel): modelo original
+        language (str | dict): código de `LANGUAGES` o tabla {original: traducción}
+
+    Returns:
+        FlowModel: el propio modelo si la tabla está vacía
+    """
+    model = resolve_flow(flow)
+    table = LANGUAGES[language] if isinstance(language, str) else language
+    if not table:
+        return model
+
+    def t(text):
+        return table.get(text, text) if text else text
+
+    data = model.to_dict()
+    data["title"] = t(data["title"])
+    for system in data["systems"]:
+        for field in ("name", "description", "color_name"):
+            system[field] = t(system[field])
+    for endpoint in data["endpoints"]:
+        endpoint["caption"] = t(endpoint["caption"])
+        endpoint["summary"] = t(endpoint["summary"])
+    for edge in data["edges"]:
+        edge["label"] = t(edge["label"])
+    for flow_data in data["flows"]:
+        flow_data["name"] = t(flow_data["name"])
+        flow_data["title"] = t(flow_data["title"])
+        for step in flow_data["steps"]:
+            step["text"] = t(step["text"])
+    return FlowModel.from_dict(data)
+
+
+def _geometries(model, languages):
+    """{idioma: (modelo traducido, (layout, box_lines))}, con un layout por tamaños distintos."""
+    from . import diagrama
+    from .layout import compute_layout
+
+    _, font_box, _ = diagrama._load_fonts()
+    line_height = get_metrics().line_height(font_box)
+    layouts = {}
+    result = {}
+    for language in languages:
+        translated = translate(model, language)
+        with span("measure"):
+            box_lines = diagrama._box_lines(translated, font_box)
+            sizes = diagrama._node_sizes(translated, box_lines, line_height)
+        key = tuple(sizes[node.id] for node in translated.nodes())
+        layout = layouts.get(key)
+        if layout is None:
+            with span("layout"):
+                layout = compute_layout(translated, lambda node: sizes[node.id])
+            layouts[key] = layout
+            count("layouts")
+        result[language] = (translated, (layout, box_lines))
+    return result
+
+
+def _render(model, geometry, variant, preset, backend):
+    from . import diagrama
+
+    scale = variant.dpi / SCREEN_DPI
+    if backend == "svg":
+        stream = io.BytesIO()
+        diagrama._draw_diagram(
+            model, lambda width, height: SVGCanvas(width, height, stream, variant.theme, scale),
+            geometry)
+        return stream.getvalue()
+    img = diagrama._draw_diagram(
+        model, lambda width, height: PILCanvas(width, height, variant.theme, scale), geometry)
+    preset = get_preset(preset)
+    if variant.dpi != SCREEN_DPI:
+        preset = preset._replace(dpi=(variant.dpi, variant.dpi))
+    with span("encode"):
+        return encode(img, preset, diagrama._flat_colors(model, variant.theme))
+
+
+@traced("variants")
+def render_variants(variants, flow=None, preset=None, backend="png"):
+    """Renderiza varias variantes del mismo modelo compartiendo medidas y layout.
+
+    Args:
+        variants (iterable): `Variant` o tuplas (tema, idioma, ppp)
+        flow (None | str | dict | FlowModel): flujos a dibujar
+        preset (str): perfil de codificación de las imágenes raster (ver `codificacion`)
+        backend (str): 'png' o 'svg'
+
+    Returns:
+        dict: {Variant: bytes de la imagen}, en el orden de `variants`
+
+    Raises:
+        ValueError: si una variante, el backend o el perfil no existen.
+    """
+    get_backend(backend)
+    variants = [variant(*item) for item in variants]
+    model = resolve_flow(flow)
+    geometries = _geometries(model, dict.fromkeys(item.language for item in variants))
+    results = {}
+    for item in variants:
+        if item not in results:
+            translated, geometry = geometries[item.language]
+            results[item] = _render(translated, geometry, item, preset, backend)
+    return results
+
+
+def variant_filename(variant, backend="png", preset=None):
+    """Nombre de fichero de una variante, p. ej. 'diagram_expedientes_flow-en-light-96dpi.png'."""
+    suffix = extension(preset) if backend == "png" else get_backend(backend).extension
+    return f"diagram_expedientes_flow-{variant.language}-{variant.theme}-{variant.dpi}dpi{suffix}"
+
+
+def write_variants(output_dir, variants, flow=None, preset=None, backend="png"):
+    """Renderiza las variantes y las escribe en `output_dir`.
+
+    Returns:
+        list: rutas escritas, en el orden de `variants`
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for item, data in render_variants(variants, flow, preset, backend).items():
+        path = os.path.join(output_dir, variant_filename(item, backend, preset))
+        with open(path, "wb") as fh:
+            fh.write(data)
+        count("bytes_written", len(data))
+        paths.append(path)
+    return paths
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""Modo vigilancia: regenera PNG y DOCX al editar el modelo, rehaciendo sólo lo que cambia.
+
+Se sondea la fecha de modificación y el tamaño del fichero de flujos y de las
+fuentes en uso (sin dependencias: `os.stat` cada `POLL_INTERVAL` segundos). Una
+ráfaga de escrituras (el editor guarda, un formateador reescribe...) se agrupa en una
+sola regeneración cuando los ficheros llevan `DEBOUNCE` segundos sin cambiar.
+
+En cada regeneración:
+
+- se recalcula la geometría (medidas de texto cacheadas y layout) y se compara cada
+  caja y cada flecha con las del render anterior por su firma (posición, colores,
+  texto...; ver `diagrama._drawn_items`),
+- las zonas de los elementos que han cambiado (donde estaban y donde están) se
+  redibujan sobre la imagen en memoria con un lienzo recortado, pintando sólo los
+  elementos que las tocan; el resultado es idéntico al render completo,
+- si cambian el tamaño del lienzo, el título o la leyenda, o las zonas cubren más
+  de `FULL_REDRAW_FRACTION` de la imagen, se redibuja todo,
+- con perfiles de paleta sólo se recuantizan las zonas redibujadas, con la paleta
+  del último render completo (`codificacion.IncrementalEncoder`): el PNG puede
+  diferir en algún tono suavizado del que daría `generate_diagram`,
+- el DOCX se rehace con `plantilla.DocxPatcher`: sólo se recomprime
+  `word/document.xml` si cambia el texto y sólo se sustituye la imagen si cambia.
+
+Si el PNG y el texto del documento no cambian no se escribe nada. Un cambio en
+las fuentes vacía las cachés y redibuja todo. Los temas son constantes de
+`temas`: cambiarlos exige reiniciar.
+
+Funciones públicas:
+- Watcher(output_dir, preset, mode): estado del último render y `refresh(model)`
+- dirty_regions(old_items, new_items, step, width, height): zonas a redibujar
+- snapshot(paths), wait_for_change(paths, previous, ...): sondeo con agrupación
+- watch(flow_path, output_dir, preset, mode, ...): bucle de vigilancia (bloqueante)
+- print_update(update): una línea por regeneración
+"""
+from collections import namedtuple
+import logging
+import math
+import os
+import time
+
+from .instrumentacion import count, span, traced
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.25
+DEBOUNCE = 0.2
+# Por encima de esta fracción del lienzo sale más barato redibujarlo entero
+FULL_REDRAW_FRACTION = 0.5
+
+# full: se redibujó todo; regions: zonas redibujadas; image: se escribió el PNG;
+# docx_parts: partes del DOCX regeneradas; sections: secciones del documento que
+# cambiaron; seconds: duración de la regeneración
+Update = namedtuple("Update", "full regions image docx_parts sections seconds")
+
+
+def _merge(rects):
+    """Une los rectángulos que se solapan hasta que ninguno toca a otro."""
+    rects = [tuple(rect) for rect in rects]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for rect in rects:
+            for i, other in enumerate(result):
+                if (rect[0] <= other[2] and other[0] <= rect[2]
+                        and rect[1] <= other[3] and other[1] <= rect[3]):
+                    result[i] = (min(rect[0], other[0]), min(rect[1], other[1]),
+                                 max(rect[2], other[2]), max(rect[3], other[3]))
+                    merged = True
+                    break
+            else:
+                result.append(rect)
+        rects = result
+    return rects
+
+
+def _align(rect, step, width, height):
+    """Rectángulo ampliado a múltiplos de `step` y recortado al lienzo (o None si queda fuera)."""
+    x0 = max(0, math.floor(rect[0] / step) * step)
+    y0 = max(0, math.floor(rect[1] / step) * step)
+    x1 = min(math.ceil(width / step) * step, math.ceil(rect[2] / step) * step)
+    y1 = min(math.ceil(height / step) * step, math.ceil(rect[3] / step) * step)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def dirty_regions(old_items, new_items, step, width, height):
+    """Zonas del lienzo que difieren entre dos renders.
+
+    Args:
+        old_items, new_items (list): [(firma, rectángulo)] de `diagrama._drawn_items`
+        step (int): las zonas se alinean a múltiplos de este paso (`modos.pixel_step`)
+        width, height: tamaño del lienzo (unidades del layout)
+
+    Returns:
+        list: rectángulos (x0, y0, x1, y1) disjuntos que cubren lo que ha cambiado
+    """
+    old_signatures = {signature for signature, _ in old_items}
+    new_signatures = {signature for signature, _ in new_items}
+    changed = [rect for signature, rect in old_items if signature not in new_signatures]
+    changed += [rect for signature, rect in new_items if signature not in old_signatures]
+    aligned = (_align(rect, step, width, height) for rect in changed)
+    # Alinear puede hacer que dos zonas vuelvan a tocarse: se unen otra vez
+    return _merge(_merge(rect for rect in aligned if rect is not None))
+
+
+def _area(rect):
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+def _sections(blocks):
+    """[(título, bloques)]: el documento partido por sus títulos."""
+    from .plantilla import Paragraph
+
+    sections = [("", [])]
+    for block in blocks:
+        if isinstance(block, Paragraph) and (block.style or "").startswith("Heading"):
+            sections.append(("".join(run.text for run in block.runs), []))
+        sections[-1][1].append(block)
+    return [(title, tuple(section)) for title, section in sections]
+
+
+def _changed_sections(old_blocks, new_blocks):
+    """Títulos de las secciones nuevas o modificadas (todas si no hay documento anterior)."""
+    old = set(_sections(old_blocks or []))
+    return [title for title, section in _sections(new_blocks)
+            if section and (title, section) not in old]
+
+
+class Watcher:
+    """Último render (modelo, geometría, imagen, PNG y DOCX) y su regeneración incremental.
+
+    Args:
+        output_dir (str): carpeta de salida (por defecto, `output` dentro del paquete)
+        preset (str): perfil de codificación; tiene que ser PNG (el DOCX lo embebe)
+        mode (str): modo de render (ver `modos`)
+
+    Raises:
+        ValueError: si el perfil o el modo no existen, o el perfil no es PNG.
+    """
+
+    def __init__(self, output_dir=None, preset=None, mode=None):
+        from . import diagrama
+        from .codificacion import IncrementalEncoder, get_preset
+        from .modos import encoding_preset, get_mode
+        from .plantilla import DocxPatcher
+
+        self.mode = get_mode(mode)
+        self.preset = encoding_preset(self.mode, preset)
+        if get_preset(self.preset).format != "PNG":
+            raise ValueError("la vigilancia necesita un perfil PNG (el DOCX embebe la imagen)")
+        self.img_path, self.doc_path = diagrama._output_paths(output_dir, "png", self.preset)
+        self._encoder = IncrementalEncoder(self.preset)
+        self._docx = DocxPatcher()
+        self.model = None
+        self.image = None
+        self.png = None
+        self._items = None
+        self._chrome = None
+        self._blocks = None
+
+    @traced("refresh")
+    def refresh(self, model, full=False):
+        """Regenera PNG y DOCX a partir de `model` rehaciendo sólo lo que ha cambiado.
+
+        Args:
+            model (FlowModel): modelo nuevo
+            full (bool): redibujar toda la imagen (p. ej. si han cambiado las fuentes)
+
+        Returns:
+            Update: qué se ha rehecho
+        """
+        from . import diagrama
+        from .modos import pixel_step
+
+        start = time.perf_counter()
+        _, font_box, _ = diagrama._load_fonts()
+        with span("layout"):
+            geometry = diagrama._geometry(model, font_box)
+        layout = geometry[0]
+        items = diagrama._drawn_items(model, geometry)
+        chrome = diagrama._chrome_signature(model, geometry)
+
+        regions = []
+        full = full or self.image is None or chrome != self._chrome
+        if not full:
+            regions = dirty_regions(self._items, items, pixel_step(self.mode),
+                                    layout.width, layout.height)
+            full = sum(map(_area, regions)) > FULL_REDRAW_FRACTION * layout.width * layout.height
+        pixels = None  # zonas redibujadas, en píxeles de la imagen
+        if full:
+            self.image = diagrama._render_png_image(model, self.mode, geometry)
+            regions = []
+        else:
+            pixels = []
+            for region in regions:
+                with span("region"):
+                    part, (x, y) = diagrama._render_png_region(model, geometry, region,
+                                                               self.mode, items)
+                    self.image.paste(part, (x, y))
+                pixels.append((x, y, x + part.width, y + part.height))
+            count("dirty_regions", len(regions))
+
+        image_changed = full or bool(regions)
+        if image_changed:
+            with span("encode"):
+                self.png = self._encoder.encode(self.image, diagrama._flat_colors(model), pixels)
+            diagrama._write_bytes(self.img_path, self.png)
+
+        blocks = diagrama._document_blocks(model)
+        sections = _changed_sections(self._blocks, blocks)
+        parts = []
+        if image_changed or sections:
+            with span("docx"):
+                data, parts = self._docx.render(blocks, self.png)
+                if parts:
+                    diagrama._write_bytes(self.doc_path, data)
+
+        self.model, self._items, self._chrome, self._blocks = model, items, chrome, blocks
+        return Update(full, len(regions), image_changed, parts, sections,
+                      time.perf_counter() - start)
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def snapshot(paths):
+    """{ruta: (mtime_ns, tamaño) o None si no existe}."""
+    return {path: _stat(path) for path in paths}
+
+
+def _sleep(seconds, stop):
+    """Espera `seconds`; devuelve True si `stop` (threading.Event) se ha activado."""
+    if stop is None:
+        time.sleep(seconds)
+        return False
+    return stop.wait(seconds)
+
+
+def wait_for_change(paths, previous, interval=POLL_INTERVAL, debounce=DEBOUNCE, stop=None):
+    """Espera a que cambie algún fichero y a que luego pasen `debounce` s sin cambios.
+
+    Returns:
+        dict: la nueva instantánea (ver `snapshot`), o None si se activa `stop`
+    """
+    current = previous
+    while current == previous:
+        if _sleep(interval, stop):
+            return None
+        current = snapshot(paths)
+    settled = time.monotonic()
+    while time.monotonic() - settled < debounce:
+        if _sleep(min(interval, debounce), stop):
+            return None
+        latest = snapshot(paths)
+        if latest != current:
+            current, settled = latest, time.monotonic()
+    return current
+
+
+def _font_paths():
+    from . import diagrama
+
+    paths = (getattr(font, "path", None) for font in diagrama._load_fonts())
+    return list(dict.fromkeys(path for path in paths if isinstance(path, str)))
+
+
+def _reset_font_caches():
+    from .capas import clear_layer_cache
+    from .fuentes import invalidate_font_cache
+    from .metricas import get_metrics
+
+    invalidate_font_cache()
+    clear_layer_cache()
+    get_metrics().clear()
+
+
+def _load(flow_path):
+    from .modelo import load_flow
+
+    try:
+        return load_flow(flow_path)
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        # Fichero a medio guardar o modelo inválido: se espera al siguiente cambio
+        logger.warning("No se puede cargar %s: %s", flow_path, exc)
+        return None
+
+
+def watch(flow_path, output_dir=None, preset=None, mode=None, interval=POLL_INTERVAL,
+          debounce=DEBOUNCE, stop=None, report=None):
+    """Vigila `flow_path` y las fuentes y regenera PNG y DOCX en cada cambio.
+
+    Args:
+        flow_path (str): fichero JSON con el modelo de flujos
+        output_dir (str): carpeta de salida
+        preset (str): perfil de codificación PNG (ver `codificacion`)
+        mode (str): modo de render (ver `modos`); 'draft' para la vista previa más rápida
+        interval (float): segundos entre sondeos
+        debounce (float): segundos sin cambios antes de regenerar
+        stop (threading.Event): si se activa, la función termina
+        report (callable): se llama como report(update) tras cada regeneración
+
+    Returns:
+        Watcher: el estado final (al activarse `stop`)
+    """
+    watcher = Watcher(output_dir, preset, mode)
+    font_paths = _font_paths()
+    paths = [flow_path] + font_paths
+    state = snapshot(paths)
+    # Un cambio de fuentes obliga a redibujarlo todo en la siguiente regeneración que
+    # salga bien, aunque llegue junto a un JSON a medio guardar que se ignora
+    fonts_changed = False
+    model = _load(flow_path)
+    if model is not None:
+        update = watcher.refresh(model)
+        if report is not None:
+            report(update)
+    while True:
+        latest = wait_for_change(paths, state, interval, debounce, stop)
+        if latest is None:
+            return watcher
+        if any(latest[path] != state[path] for path in font_paths):
+            _reset_font_caches()
+            fonts_changed = True
+        state = latest
+        model = _load(flow_path)
+        if model is None:
+            continue
+        update = watcher.refresh(model, full=fonts_changed)
+        fonts_changed = False
+        if report is not None:
+            report(update)
+
+
+def print_update(update):
+    """Imprime una línea con lo que se ha rehecho en una regeneración."""
+    if update.full:
+        image = "png: completo"
+    elif update.regions:
+        image = f"png: {update.regions} zona(s)"
+    else:
+        image = "png: sin cambios"
+    docx = ", ".join(update.docx_parts) or "sin cambios"
+    if len(update.sections) > 3:
+        sections = f" [{len(update.sections)} secciones]"
+    else:
+        sections = f" [{'; '.join(update.sections)}]" if update.sections else ""
+    print(f"{time.strftime('%H:%M:%S')} {image}; docx: {docx}{sections} "
+          f"({update.seconds * 1000:.1f} ms)", flush=True)